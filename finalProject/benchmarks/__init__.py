@@ -0,0 +1 @@
+"""Pipeline benchmarks on synthetic OpenAlex-shaped corpora: python -m benchmarks --help"""
@@ -0,0 +1,52 @@
+"""Command line entry point: python -m benchmarks --help"""
+import argparse
+import os
+from datetime import datetime
+
+from benchmarks import runner, startup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic corpora.")
+    parser.add_argument("--scales", nargs="*", default=["1k"],
+                        help="Corpus sizes, e.g. 1k 10k 100k 1M; none runs the startup measurements only")
+    parser.add_argument("--stages", nargs="+", default=runner.BENCHMARK_STAGES, choices=runner.BENCHMARK_STAGES,
+                        help="Stages to time; the stages they depend on run too")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic corpus")
+    parser.add_argument("--timeout", type=float, default=1800, help="Seconds before a stage is killed")
+    parser.add_argument("--workdir", default=os.path.join("benchmarks", "workdir"),
+                        help="Directory for generated corpora and the local buckets")
+    parser.add_argument("--baseline", default=runner.BASELINE_PATH, help="Stored results to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline with this run")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown relative to the baseline before a stage counts as a regression")
+    parser.add_argument("--startup-repeats", type=int, default=5,
+                        help="Cold starts measured per function; 0 skips the startup measurements")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    results = {}
+    if args.startup_repeats:
+        results["startup"] = startup.run_startup(args.startup_repeats)
+    for scale in args.scales:
+        results[scale] = runner.run_scale(scale, args.workdir, args.stages, args.timeout, args.seed)
+
+    results_path = os.path.join(runner.RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    print(f"Results saved to {runner.save_results(results, results_path)}")
+
+    if args.update_baseline:
+        baseline = runner.load_baseline(args.baseline)
+        for scale, stages in results.items():
+            baseline.setdefault("scales", {}).setdefault(scale, {}).update(stages)
+        runner.save_results(baseline["scales"], args.baseline)
+        print(f"Baseline updated at {args.baseline}")
+        return
+
+    regressions = runner.compare(results, runner.load_baseline(args.baseline), args.tolerance)
+    if regressions:
+        raise SystemExit("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Benchmark runner timing every pipeline stage on synthetic corpora.
+
+Each stage runs in its own spawned process against a local bucket directory,
+so its peak RSS is measured in isolation. A stage that fails or exceeds the
+timeout is recorded as such and only the stages depending on it are skipped.
+"""
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import time
+import traceback
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks import startup, synthetic
+from pipeline.stages import STAGES_BY_NAME, load_function_module
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Stages in execution order; fetch seeds the raw bucket from the generated file
+BENCHMARK_STAGES = [
+    "fetch",
+    "preprocess",
+    "citation_graph",
+    "coauthorship",
+    "emerging_topics",
+    "pagerank",
+    "collaboration",
+    "gaps",
+    "descriptions",
+]
+
+# The descriptions stage talks to the Ollama stub with this first-token delay and
+# per-word delay, so it measures the generator's concurrency rather than a model
+STUB_LATENCY = 0.05
+STUB_TOKEN_LATENCY = 0.002
+
+# Regressions smaller than this many seconds are treated as noise
+MIN_REGRESSION_SECONDS = 0.5
+
+
+def _stage_process(stage_name: str, root: str, config: dict, results):
+    """Run one stage in a fresh process and report its wall time and peak RSS."""
+    os.environ.update({
+        "STORAGE_BACKEND": "local",
+        "LOCAL_STORAGE_ROOT": root,
+        "OPENALEX_OFFLINE": "1",
+        "COAUTHORSHIP_BUILD_MODE": "full",
+        "RENDER_MODE": "queue",
+        "MPLBACKEND": "Agg",
+    })
+    try:
+        stage = STAGES_BY_NAME[stage_name]
+        if stage_name == "descriptions":
+            stub = load_function_module("generate_descriptions_topics/ollama_stub.py")
+            _, os.environ["OLLAMA_URL"] = stub.start_stub_server(latency=STUB_LATENCY,
+                                                                 token_latency=STUB_TOKEN_LATENCY)
+        start = time.perf_counter()
+        stage.func(config)
+        wall = time.perf_counter() - start
+        results.put({"status": "ok", "wall_seconds": wall,
+                     "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+    except Exception:
+        results.put({"status": "failed", "error": traceback.format_exc().strip().splitlines()[-1]})
+
+
+def run_stage(stage_name: str, root: str, config: dict, timeout: float) -> dict:
+    """Run a stage in a spawned process, killing it after timeout seconds."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_stage_process, args=(stage_name, root, config, results))
+    started = time.perf_counter()
+    process.start()
+    process.join(timeout)
+
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return {"status": "timeout", "wall_seconds": round(time.perf_counter() - started, 3)}
+    if results.empty():
+        return {"status": "failed", "error": f"exit code {process.exitcode}"}
+    return results.get()
+
+
+def with_dependencies(stages: List[str]) -> List[str]:
+    """Add the stages the selected ones depend on, in execution order."""
+    required = set()
+    pending = list(stages)
+    while pending:
+        name = pending.pop()
+        if name not in required:
+            required.add(name)
+            pending.extend(STAGES_BY_NAME[name].deps)
+    return [name for name in BENCHMARK_STAGES if name in required]
+
+
+def run_scale(scale: str, workdir: str, stages: List[str], timeout: float, seed: int = 0) -> Dict[str, dict]:
+    """Generate a corpus of the given scale and time every stage on it."""
+    n_papers = synthetic.parse_scale(scale)
+    root = os.path.join(workdir, f"buckets_{scale}")
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(root)
+
+    works_file = os.path.join(workdir, f"works_{scale}_seed{seed}.json")
+    if not os.path.exists(works_file):
+        print(f"[bench] generating {n_papers} papers -> {works_file}")
+        synthetic.write_works_file(works_file, n_papers, seed)
+
+    config = {"works_file": works_file, "offline": True, "top_n": 5, "max_depth": 100}
+    results = {}
+    for stage_name in with_dependencies(stages):
+        # Stages outside BENCHMARK_STAGES (the snapshot source) never run here, as with --skip in the pipeline
+        blocked = [dep for dep in STAGES_BY_NAME[stage_name].deps
+                   if dep in BENCHMARK_STAGES and results.get(dep, {}).get("status") != "ok"]
+        if blocked:
+            results[stage_name] = {"status": "skipped", "error": f"after {', '.join(blocked)}"}
+            continue
+
+        result = run_stage(stage_name, root, config, timeout)
+        if result["status"] == "ok":
+            result["wall_seconds"] = round(result["wall_seconds"], 3)
+            result["peak_rss_mb"] = round(result["peak_rss_mb"], 1)
+            result["papers_per_second"] = round(n_papers / max(result["wall_seconds"], 1e-9), 1)
+        results[stage_name] = result
+        print(f"[bench] {scale:>5} {stage_name:<16} {_format(result)}")
+
+    shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def _format(result: dict) -> str:
+    if result["status"] != "ok":
+        return f"{result['status']} {result.get('error', '')}".strip()
+    return (f"{result['wall_seconds']:>9.3f}s  {result['peak_rss_mb']:>8.1f} MB  "
+            f"{result['papers_per_second']:>10.1f} papers/s")
+
+
+def load_baseline(path: str = BASELINE_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Return a description of every stage slower than its baseline by more than the tolerance."""
+    regressions = []
+    for scale, stages in results.items():
+        min_seconds = startup.MIN_REGRESSION_SECONDS if scale == "startup" else MIN_REGRESSION_SECONDS
+        for stage_name, result in stages.items():
+            reference = baseline.get("scales", {}).get(scale, {}).get(stage_name)
+            if not reference or reference.get("status") != "ok":
+                continue
+            if result["status"] != "ok":
+                regressions.append(f"{scale} {stage_name}: {result['status']} (baseline {reference['wall_seconds']}s)")
+                continue
+            slower = result["wall_seconds"] - reference["wall_seconds"]
+            if slower > min_seconds and result["wall_seconds"] > reference["wall_seconds"] * (1 + tolerance):
+                regressions.append(f"{scale} {stage_name}: {result['wall_seconds']}s "
+                                   f"vs baseline {reference['wall_seconds']}s")
+    return regressions
+
+
+def save_results(results: dict, path: str) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "scales": results,
+        }, f, indent=2)
+    return path
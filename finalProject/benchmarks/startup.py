@@ -0,0 +1,87 @@
+"""
+Cold-start measurements of the GCS-triggered functions.
+
+Every storage event in a bucket invokes the functions watching it, and most
+are filtered out straight away ("Skipping non-target file"). For each
+function a fresh interpreter imports the entry module and handles one such
+skipped event; the import time, the skip time and the heavy modules left in
+sys.modules are recorded. The median of several runs is reported.
+"""
+import json
+import statistics
+import subprocess
+import sys
+from typing import Dict
+
+from pipeline.stages import CLOUD_FUNCTIONS_DIR
+
+# (function directory, module, entry point)
+FUNCTIONS = {
+    "coauthorship": ("co_authorship_graph", "coauthorship", "process_gml_file"),
+    "gaps": ("co_authorship_graph_gaps", "co_authorship_graph_gaps", "analyze_coauthorship_gaps"),
+    "collaboration": ("network_collaboration", "network_collaboration", "analyze_collaboration_network"),
+    "render_worker": ("render_worker", "render_worker", "render_job"),
+}
+
+HEAVY_MODULES = ["networkx", "numpy", "scipy", "matplotlib", "sklearn", "community", "pandas", "requests",
+                 "google.cloud.storage", "google.api_core"]
+
+# Startup times are small, so smaller slowdowns already count as regressions
+MIN_REGRESSION_SECONDS = 0.05
+
+_MEASURE = """
+import json, sys, time
+function_dir, module_name, entry_point = sys.argv[1:4]
+sys.path[:0] = [".", function_dir]
+import functions_framework  # loaded by the runtime before the function module
+
+started = time.perf_counter()
+module = __import__(module_name)
+imported = time.perf_counter()
+
+class Event:
+    data = {"bucket": "benchmark", "name": "startup/skipped.txt"}
+
+getattr(module, entry_point)(Event())
+finished = time.perf_counter()
+print(json.dumps({
+    "import_seconds": imported - started,
+    "skip_seconds": finished - imported,
+    "heavy_modules": [name for name in sys.argv[4:] if name in sys.modules],
+}))
+"""
+
+
+def measure_function(function_dir: str, module_name: str, entry_point: str) -> dict:
+    completed = subprocess.run([sys.executable, "-c", _MEASURE, function_dir, module_name, entry_point, *HEAVY_MODULES],
+                               cwd=CLOUD_FUNCTIONS_DIR, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_startup(repeats: int = 5) -> Dict[str, dict]:
+    """Median import and skipped-event times of every triggered function."""
+    results = {}
+    for name, (function_dir, module_name, entry_point) in FUNCTIONS.items():
+        try:
+            samples = [measure_function(function_dir, module_name, entry_point) for _ in range(repeats)]
+        except RuntimeError as e:
+            results[name] = {"status": "failed", "error": str(e)}
+        else:
+            import_seconds = statistics.median(sample["import_seconds"] for sample in samples)
+            skip_seconds = statistics.median(sample["skip_seconds"] for sample in samples)
+            results[name] = {
+                "status": "ok",
+                "wall_seconds": round(import_seconds + skip_seconds, 4),
+                "import_seconds": round(import_seconds, 4),
+                "skip_seconds": round(skip_seconds, 4),
+                "heavy_modules": samples[-1]["heavy_modules"],
+            }
+        result = results[name]
+        if result["status"] == "ok":
+            print(f"[bench] startup {name:<16} {result['import_seconds']:>7.3f}s import  "
+                  f"{result['skip_seconds']:>7.4f}s skip  heavy: {', '.join(result['heavy_modules']) or '-'}")
+        else:
+            print(f"[bench] startup {name:<16} failed {result['error']}")
+    return results
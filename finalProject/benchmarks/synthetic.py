@@ -0,0 +1,211 @@
+"""
+Synthetic OpenAlex-shaped works for benchmarking.
+
+The generated corpus follows the shapes the pipeline is sensitive to:
+
+- a four-level topic taxonomy (4 domains, 26 fields, ~250 subfields,
+  ~4500 topics, as in OpenAlex) with Zipf-distributed topic popularity
+- heavy-tailed authors per paper (log-normal, median 3, occasionally hundreds)
+- heavy-tailed author productivity (Lotka-like), with authors clustered by
+  subfield so the co-authorship graph has community structure
+- a power-law citation in-degree from Pareto-distributed paper
+  attractiveness; about half of the references point outside the corpus,
+  like OpenAlex referenced_works
+
+Works only carry the fields the functions read, and are written as the
+{"results": [...]} document fetch_data stores in the raw bucket, or as an
+OpenAlex snapshot directory of gzipped JSON-lines partitions.
+"""
+import gzip
+import json
+import os
+from typing import Iterator
+
+import numpy as np
+
+DOMAINS = ["Life Sciences", "Social Sciences", "Physical Sciences", "Health Sciences"]
+FIELDS_PER_DOMAIN = [5, 7, 10, 4]
+SUBFIELDS_PER_FIELD = 10
+TOPICS_PER_SUBFIELD = 18
+
+AUTHORS_PER_PAPER_MU = 1.0
+AUTHORS_PER_PAPER_SIGMA = 0.8
+MAX_AUTHORS_PER_PAPER = 200
+AUTHOR_POOL_RATIO = 1.5  # distinct authors per paper
+SAME_SUBFIELD_AUTHORS = 0.85
+MEAN_REFERENCES = 15
+INTERNAL_REFERENCE_SHARE = 0.5
+CITATION_PARETO_SHAPE = 1.5
+TOPIC_ZIPF_EXPONENT = 1.1
+
+
+def parse_scale(scale: str) -> int:
+    """Turn '1k', '10k', '1M' or '2500' into a paper count."""
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    scale = scale.strip().lower()
+    if scale[-1] in multipliers:
+        return int(float(scale[:-1]) * multipliers[scale[-1]])
+    return int(scale)
+
+
+class Taxonomy:
+    """Domain > field > subfield > topic hierarchy with OpenAlex-style IDs."""
+
+    def __init__(self):
+        self.topics = []
+        self.subfield_of_topic = []
+        field_number = subfield_number = topic_number = 0
+        for domain_number, (domain, field_count) in enumerate(zip(DOMAINS, FIELDS_PER_DOMAIN), start=1):
+            domain_ref = {"id": f"https://openalex.org/domains/{domain_number}", "display_name": domain}
+            for _ in range(field_count):
+                field_number += 1
+                field_ref = {"id": f"https://openalex.org/fields/{field_number}",
+                             "display_name": f"{domain} Field {field_number}"}
+                for _ in range(SUBFIELDS_PER_FIELD):
+                    subfield_number += 1
+                    subfield_ref = {"id": f"https://openalex.org/subfields/{subfield_number}",
+                                    "display_name": f"Subfield {subfield_number}"}
+                    for _ in range(TOPICS_PER_SUBFIELD):
+                        topic_number += 1
+                        self.topics.append({
+                            "id": f"https://openalex.org/T{10000 + topic_number}",
+                            "display_name": f"Topic {topic_number}",
+                            "subfield": subfield_ref,
+                            "field": field_ref,
+                            "domain": domain_ref,
+                        })
+                        self.subfield_of_topic.append(subfield_number - 1)
+        self.subfield_count = subfield_number
+        self.subfield_of_topic = np.array(self.subfield_of_topic)
+
+
+def _zipf_weights(n: int, exponent: float, rng: np.random.Generator) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+
+def generate_works(n_papers: int, seed: int = 0) -> Iterator[dict]:
+    """Yield n_papers synthetic works in OpenAlex's JSON shape."""
+    rng = np.random.default_rng(seed)
+    taxonomy = Taxonomy()
+    topic_count = len(taxonomy.topics)
+    topics_of_subfield = [np.flatnonzero(taxonomy.subfield_of_topic == s) for s in range(taxonomy.subfield_count)]
+
+    # Primary topic per paper, plus up to two more from the same subfield
+    topic_weights = _zipf_weights(topic_count, TOPIC_ZIPF_EXPONENT, rng)
+    primary_topics = rng.choice(topic_count, size=n_papers, p=topic_weights)
+    extra_topics = rng.integers(0, 3, size=n_papers)
+
+    # Authors are laid out in one block per subfield, sized by subfield popularity
+    n_authors = max(int(n_papers * AUTHOR_POOL_RATIO), 1)
+    subfield_weights = np.bincount(taxonomy.subfield_of_topic, weights=topic_weights,
+                                   minlength=taxonomy.subfield_count)
+    block_sizes = np.maximum((subfield_weights * n_authors).astype(np.int64), 1)
+    block_starts = np.concatenate([[0], np.cumsum(block_sizes)[:-1]])
+    n_authors = int(block_sizes.sum())
+
+    authors_per_paper = np.clip(np.ceil(rng.lognormal(AUTHORS_PER_PAPER_MU, AUTHORS_PER_PAPER_SIGMA, size=n_papers)),
+                                1, MAX_AUTHORS_PER_PAPER).astype(np.int64)
+
+    # Citation attractiveness is Pareto-distributed, so in-degrees follow a power law
+    attractiveness = rng.pareto(CITATION_PARETO_SHAPE, size=n_papers) + 1
+    citation_p = attractiveness / attractiveness.sum()
+    reference_counts = rng.poisson(MEAN_REFERENCES, size=n_papers)
+    internal_counts = rng.binomial(reference_counts, INTERNAL_REFERENCE_SHARE)
+    internal_targets = rng.choice(n_papers, size=int(internal_counts.sum()), p=citation_p)
+    reference_offsets = np.concatenate([[0], np.cumsum(internal_counts)])
+    in_degree = np.bincount(internal_targets, minlength=n_papers)
+
+    # Recent years dominate, as in a corpus fetched by publication year
+    days_back = np.minimum(rng.exponential(900, size=n_papers).astype(np.int64), 3650)
+    dates = np.datetime64("2025-06-30") - days_back.astype("timedelta64[D]")
+
+    for i in range(n_papers):
+        topic = int(primary_topics[i])
+        subfield = int(taxonomy.subfield_of_topic[topic])
+        topic_ids = [topic]
+        for extra in rng.choice(topics_of_subfield[subfield], size=int(extra_topics[i]), replace=False):
+            if int(extra) != topic:
+                topic_ids.append(int(extra))
+
+        # Productivity within a block is skewed towards its first authors (Lotka-like)
+        count = int(authors_per_paper[i])
+        local = rng.random(count) < SAME_SUBFIELD_AUTHORS
+        in_block = block_starts[subfield] + (block_sizes[subfield] * rng.random(count) ** 2).astype(np.int64)
+        anywhere = (n_authors * rng.random(count) ** 2).astype(np.int64)
+        author_ids = dict.fromkeys(np.where(local, in_block, anywhere).tolist())
+
+        internal = internal_targets[reference_offsets[i]:reference_offsets[i + 1]]
+        external = rng.integers(10 ** 9, 4 * 10 ** 9, size=int(reference_counts[i] - len(internal)))
+        references = dict.fromkeys([f"https://openalex.org/W{100000000 + int(t)}" for t in internal if t != i] +
+                                   [f"https://openalex.org/W{int(t)}" for t in external])
+
+        yield {
+            "id": f"https://openalex.org/W{100000000 + i}",
+            "title": f"Synthetic work {i} on {taxonomy.topics[topic]['display_name']}",
+            "publication_year": int(str(dates[i])[:4]),
+            "publication_date": str(dates[i]),
+            "cited_by_count": int(in_degree[i] * 2 + rng.poisson(1)),
+            "authorships": [
+                {
+                    "author_position": "first" if position == 0 else "middle",
+                    "author": {"id": f"https://openalex.org/A{5000000000 + a}", "display_name": f"Author {a}"},
+                    "institutions": [],
+                }
+                for position, a in enumerate(author_ids)
+            ],
+            "topics": [dict(taxonomy.topics[t], score=round(0.9 - 0.1 * rank, 3)) for rank, t in enumerate(topic_ids)],
+            "concepts": [],
+            "referenced_works": list(references),
+            "related_works": [],
+        }
+
+
+def write_works_file(path: str, n_papers: int, seed: int = 0) -> str:
+    """Stream a synthetic {"results": [...]} document to path."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"meta": {"count": %d, "synthetic": true}, "results": [' % n_papers)
+        for i, work in enumerate(generate_works(n_papers, seed)):
+            if i:
+                f.write(",")
+            f.write(json.dumps(work, separators=(",", ":")))
+        f.write("]}")
+    return path
+
+
+def write_snapshot(directory: str, n_papers: int, seed: int = 0, records_per_file: int = 10_000,
+                   updated_date: str = "2025-06-30") -> str:
+    """Write synthetic works and their authors as an OpenAlex snapshot under directory/data/."""
+    def write_partitions(entity, records):
+        partition_dir = os.path.join(directory, "data", entity, f"updated_date={updated_date}")
+        os.makedirs(partition_dir, exist_ok=True)
+        f = None
+        for i, record in enumerate(records):
+            if i % records_per_file == 0:
+                if f:
+                    f.close()
+                f = gzip.open(os.path.join(partition_dir, f"part_{i // records_per_file:03d}.gz"), "wt",
+                              encoding="utf-8")
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+        if f:
+            f.close()
+
+    authors = {}
+
+    def works():
+        for work in generate_works(n_papers, seed):
+            work["updated_date"] = f"{updated_date}T00:00:00"
+            for authorship in work["authorships"]:
+                authors.setdefault(authorship["author"]["id"], authorship["author"]["display_name"])
+            yield work
+
+    write_partitions("works", works())
+    write_partitions("authors", ({
+        "id": author_id,
+        "display_name": name,
+        "works_count": 1,
+        "last_known_institutions": [{"id": f"https://openalex.org/I{int(author_id[-4:]) % 97}",
+                                     "display_name": f"Institution {int(author_id[-4:]) % 97}"}],
+        "updated_date": f"{updated_date}T00:00:00",
+    } for author_id, name in authors.items()))
+    return directory
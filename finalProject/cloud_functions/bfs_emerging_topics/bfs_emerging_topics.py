@@ -2,31 +2,46 @@ import networkx as nx
 from collections import Counter
 import json
 from datetime import datetime
+from typing import Dict, List, Tuple
 
-# Step 1: Load the citation graph from a GML file
-citation_graph = nx.read_gml('citation_graph_full.gml')
+import numpy as np
+from scipy import sparse
+from scipy.sparse import csgraph
+
+# Levels counted by the emerging topic analyses, keyed by the name of their output file
+LEVELS = ["topics", "subfields", "fields", "domains"]
 
-print(f"Loaded graph with {len(citation_graph.nodes())} nodes and {len(citation_graph.edges())} edges.")
+# Step 1: Load the citation graph from a GML file
+def load_graph(graph_file):
+    """Load the citation graph from a GML file."""
+    citation_graph = nx.read_gml(graph_file)
+    print(f"Loaded graph with {len(citation_graph.nodes())} nodes and {len(citation_graph.edges())} edges.")
+    return citation_graph
 
 # Step 2: Function to compute time-based weight
 def compute_weight(pubdate, most_recent_date):
     """Compute weight based on publication recency (higher for newer papers)."""
     if not pubdate:
         return 1  # Default weight if no date is available
-    
+
     pub_date_obj = datetime.strptime(pubdate, "%Y-%m-%d")
     delta_days = (most_recent_date - pub_date_obj).days
     return max(1, 1 + (3650 - delta_days) / 3650)  # Scale between 1 and ~2.5
 
 # Step 3: Determine the most recent publication date in the graph
-pubdates = [
-    datetime.strptime(citation_graph.nodes[n].get('pubdate', "1900-01-01"), "%Y-%m-%d")
-    for n in citation_graph.nodes if 'pubdate' in citation_graph.nodes[n]
-]
-most_recent_date = max(pubdates) if pubdates else datetime.strptime("1900-01-01", "%Y-%m-%d")
+def find_most_recent_date(graph):
+    """Return the latest 'pubdate' of any node, or 1900-01-01 if none is set."""
+    pubdates = [
+        datetime.strptime(graph.nodes[n].get('pubdate', "1900-01-01"), "%Y-%m-%d")
+        for n in graph.nodes if graph.nodes[n].get('pubdate')
+    ]
+    return max(pubdates) if pubdates else datetime.strptime("1900-01-01", "%Y-%m-%d")
 
 # Step 4: BFS function to collect emerging topics with recency weighting
-def bfs_emerging_topics(graph, max_depth=3):
+def bfs_emerging_topics(graph, max_depth=3, most_recent_date=None):
+    if most_recent_date is None:
+        most_recent_date = find_most_recent_date(graph)
+
     visited = set()  # Keep track of visited nodes
     queue = []  # BFS queue
 
@@ -84,11 +99,149 @@ def bfs_emerging_topics(graph, max_depth=3):
 
     return topic_counts, subfield_counts, field_counts, domain_counts
 
-# Step 5: Run BFS and get emerging topics
-max_depth = 100  # Adjust as needed
+# Step 4 (vectorized): label components and aggregate topics in sparse matrix products.
+# bfs_emerging_topics starts a BFS from every unvisited node, so each paper is
+# counted exactly once whatever max_depth is; the overall counts are the
+# recency-weighted topic counts of all papers.
+def node_topics(graph, node):
+    """Topics of a paper as a list, whether stored as a list, a JSON string or a single GML dict."""
+    topics = graph.nodes[node].get('topics', [])
+    if isinstance(topics, str):
+        topics = json.loads(topics) if topics else []
+    elif isinstance(topics, dict):
+        topics = [topics]
+    return topics
+
+
+def recency_weights(graph, nodes, most_recent_date=None):
+    """compute_weight of every node, computed on day numbers instead of per-node date parsing."""
+    pubdates = [graph.nodes[n].get('pubdate') or "" for n in nodes]
+    dated = np.array([bool(pubdate) for pubdate in pubdates], dtype=bool)
+    days = np.array([pubdate or "1900-01-01" for pubdate in pubdates], dtype="datetime64[D]")
+    if most_recent_date is None:
+        # Same as find_most_recent_date
+        latest = days[dated].max() if dated.any() else np.datetime64("1900-01-01", "D")
+    else:
+        latest = np.datetime64(most_recent_date.date(), "D")
+    delta_days = (latest - days).astype(np.int64)
+    return np.where(dated, np.maximum(1, 1 + (3650 - delta_days) / 3650), 1.0)
+
+
+def citation_matrix(graph, nodes) -> sparse.csr_matrix:
+    """Paper x paper matrix with a 1 where the row paper cites the column paper."""
+    position = {node: i for i, node in enumerate(nodes)}
+    edges = graph.number_of_edges()
+    rows = np.fromiter((position[u] for u, _ in graph.edges()), dtype=np.int64, count=edges)
+    cols = np.fromiter((position[v] for _, v in graph.edges()), dtype=np.int64, count=edges)
+    return sparse.csr_matrix((np.ones(edges, dtype=np.int8), (rows, cols)), shape=(len(nodes), len(nodes)))
+
+
+def topic_incidence(graph, nodes) -> Dict[str, Tuple[List[str], sparse.csr_matrix]]:
+    """Per level, the names in order of first appearance and the paper x name occurrence matrix."""
+    incidence = {}
+    columns = {level: {} for level in LEVELS}
+    entries = {level: ([], []) for level in LEVELS}
+    for row, node in enumerate(nodes):
+        for topic in node_topics(graph, node):
+            names = {
+                "topics": topic["display_name"],
+                "subfields": (topic.get("subfield") or {}).get("display_name"),
+                "fields": (topic.get("field") or {}).get("display_name"),
+                "domains": (topic.get("domain") or {}).get("display_name"),
+            }
+            for level, name in names.items():
+                if name:
+                    rows, cols = entries[level]
+                    rows.append(row)
+                    cols.append(columns[level].setdefault(name, len(columns[level])))
+
+    for level in LEVELS:
+        rows, cols = entries[level]
+        # Repeated (paper, name) entries are summed, as the BFS counts every occurrence
+        matrix = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(nodes), len(columns[level])))
+        incidence[level] = (list(columns[level]), matrix)
+    return incidence
+
+
+def _counts(names, values) -> Counter:
+    return Counter({name: float(value) for name, value in zip(names, values) if value})
+
+
+def component_emerging_topics(graph, most_recent_date=None, top_n=10, min_size=2):
+    """
+    Recency-weighted topic counts over the whole graph and per weakly connected component.
 
-# Run BFS to find emerging topics with recency weighting
-topic_counts, subfield_counts, field_counts, domain_counts = bfs_emerging_topics(citation_graph, max_depth)
+    Args:
+        graph: Citation graph
+        most_recent_date: Reference date of the recency weights; the latest pubdate when omitted
+        top_n: Names kept per level and component
+        min_size: Smallest component, in papers, that is reported
+
+    Returns:
+        (topic_counts, subfield_counts, field_counts, domain_counts) as bfs_emerging_topics returns them,
+        and the components of at least min_size papers, largest first
+    """
+    nodes = list(graph.nodes())
+    weights = recency_weights(graph, nodes, most_recent_date)
+    incidence = topic_incidence(graph, nodes)
+
+    adjacency = citation_matrix(graph, nodes)
+    component_count, labels = csgraph.connected_components(adjacency, directed=True, connection="weak")
+    # Component x paper membership, scaled by the recency weight of each paper
+    membership = sparse.csr_matrix((weights, (labels, np.arange(len(nodes)))), shape=(component_count, len(nodes)))
+
+    overall = tuple(_counts(names, weights @ matrix) for names, matrix in incidence.values())
+
+    sizes = np.bincount(labels, minlength=component_count)
+    reported = [c for c in np.argsort(-sizes, kind="stable") if sizes[c] >= min_size]
+    per_level = {level: (names, (membership @ matrix).tocsr()) for level, (names, matrix) in incidence.items()}
+    components = []
+    for rank, c in enumerate(reported):
+        component = {"component": rank, "papers": int(sizes[c])}
+        for level, (names, counts) in per_level.items():
+            row = counts.getrow(c)
+            top = np.argsort(-row.data, kind="stable")[:top_n]
+            component[level] = {names[row.indices[i]]: float(row.data[i]) for i in top}
+        components.append(component)
+
+    print(f"Aggregated topics of {len(nodes)} papers in {component_count} components")
+    return overall, components
+
+
+def most_recent_papers(graph, n):
+    """The n papers with the latest pubdate, as seeds of seeded_emerging_topics."""
+    dated = [node for node in graph.nodes() if graph.nodes[node].get('pubdate')]
+    return sorted(dated, key=lambda node: graph.nodes[node]['pubdate'], reverse=True)[:n]
+
+
+def seeded_emerging_topics(graph, seeds, max_depth=3, most_recent_date=None):
+    """
+    Recency-weighted topic counts of the papers within max_depth citations of the seeds.
+
+    All seeds are expanded together, one frontier per depth, following the
+    citation direction as bfs_emerging_topics does.
+
+    Returns:
+        (topic_counts, subfield_counts, field_counts, domain_counts) and the number of papers reached
+    """
+    nodes = list(graph.nodes())
+    position = {node: i for i, node in enumerate(nodes)}
+    # Transposed, a product with the frontier indicator yields the papers the frontier cites
+    citations = citation_matrix(graph, nodes).T.tocsr()
+
+    reached = np.zeros(len(nodes), dtype=bool)
+    reached[[position[seed] for seed in seeds]] = True
+    frontier = reached.copy()
+    for _ in range(max_depth):
+        frontier = (citations @ frontier.astype(np.int32)) > 0
+        frontier &= ~reached
+        if not frontier.any():
+            break
+        reached |= frontier
+
+    weights = np.where(reached, recency_weights(graph, nodes, most_recent_date), 0)
+    counts = tuple(_counts(names, weights @ matrix) for names, matrix in topic_incidence(graph, nodes).values())
+    return counts, int(reached.sum())
 
 # Step 6: Save results as JSON
 def save_to_json(filename, data):
@@ -96,9 +249,18 @@ def save_to_json(filename, data):
     with open(filename, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=4, ensure_ascii=False)
 
-save_to_json("topics.json", dict(topic_counts))
-save_to_json("subfields.json", dict(subfield_counts))
-save_to_json("fields.json", dict(field_counts))
-save_to_json("domains.json", dict(domain_counts))
+if __name__ == "__main__":
+    citation_graph = load_graph('citation_graph_full.gml')
+
+    # Step 5: Count emerging topics with recency weighting, overall and per component; equal to
+    # bfs_emerging_topics(citation_graph, max_depth) for any max_depth, without a per-node BFS
+    (topic_counts, subfield_counts, field_counts, domain_counts), components = \
+        component_emerging_topics(citation_graph)
+    save_to_json("components.json", components)
+
+    save_to_json("topics.json", dict(topic_counts))
+    save_to_json("subfields.json", dict(subfield_counts))
+    save_to_json("fields.json", dict(field_counts))
+    save_to_json("domains.json", dict(domain_counts))
 
-print("Saved results to topics.json, subfields.json, fields.json, and domains.json.")
+    print("Saved results to topics.json, subfields.json, fields.json, domains.json and components.json.")
@@ -1,11 +1,29 @@
+import hashlib
 import json
+import os
+import sys
 import requests
 import networkx as nx
 import matplotlib.pyplot as plt
 
+# The shared helpers live next to the function directories
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# Related works fetched so far are logged under ./local_buckets/<ENRICHMENT_BUCKET>/ unless
+# STORAGE_BACKEND says otherwise, so an interrupted run resumes where it stopped
+os.environ.setdefault("STORAGE_BACKEND", "local")
+from common import enrichment_log, layout
+
+ENRICHMENT_BUCKET = os.environ.get("ENRICHMENT_BUCKET", "enrichment")
+# Each input file has its own log, discarded once its graph is written
+RELATED_WORKS_LOG = "related_works/{input_hash}"
+# Fields of a related work kept in the log
+RELATED_WORK_FIELDS = ["id", "title", "publication_date", "topics"]
+
 # Step 1: Load JSON from file
-with open("publications.json", "r", encoding="utf-8") as file:
-    data = json.load(file)  # Parse JSON into a dictionary
+with open("publications.json", "rb") as file:
+    raw = file.read()
+data = json.loads(raw)  # Parse JSON into a dictionary
+input_hash = hashlib.sha256(raw).hexdigest()[:16]
 
 # Extract the 'results' array
 results = data.get("results", [])  # Use .get() to avoid KeyError
@@ -49,6 +67,7 @@ def fetch_publication_details(pub_id):
         return None
 
 # Step 5: Fetch titles for all publications and update the transformed_data
+related_works_log = enrichment_log.EnrichmentLog(ENRICHMENT_BUCKET, RELATED_WORKS_LOG.format(input_hash=input_hash))
 for paper in transformed_data:
     for authorship in paper.get("Authorships"):
         paper["Authors"].append(authorship["author"])
@@ -76,15 +95,24 @@ for paper in transformed_data:
         # Extract the related publication ID
         related_pub_id = related_paper.split('/')[-1]
 
-        # Fetch publication details for each related work
-        publication_details = fetch_publication_details(related_pub_id)
+        # Fetch publication details for each related work, unless an earlier run logged them
+        if related_pub_id not in related_works_log:
+            if related_works_log.expired():
+                related_works_log.flush()
+                sys.exit("Enrichment time budget spent; run again to resume")
+            publication_details = fetch_publication_details(related_pub_id)
+            if publication_details is None:
+                continue
+            related_works_log.record(related_pub_id, {field: publication_details.get(field)
+                                                      for field in RELATED_WORK_FIELDS})
+        publication_details = related_works_log.get(related_pub_id)
 
         authors = []
         for authorship in paper.get("Authorships"):
             authors.append(authorship["author"])
 
         detailed_topics = []
-        for topic in publication_details.get("topics", []):
+        for topic in publication_details.get("topics") or []:
             topic_info = {
                 "id": topic["id"],
                 "display_name": topic["display_name"],
@@ -114,6 +142,8 @@ for paper in transformed_data:
             }
             paper["RelatedPapers"].append(relatedPaper)
 
+related_works_log.flush()
+
 # Now you should have the updated list of related papers with titles
 print(json.dumps(transformed_data, indent=4))
 
@@ -141,7 +171,15 @@ labels = {node: citation_graph.nodes[node].get("title", "No Title Available") fo
 
 # Visualize the graph
 plt.figure(figsize=(12, 8))
-pos = nx.spring_layout(citation_graph, seed=42)  # Layout for positioning nodes
+# Layout for positioning nodes, warm-started from the positions of the previous run
+layout_file = layout.layout_path_for("citation_graph.gml")
+cached_positions = None
+if os.path.exists(layout_file):
+    with open(layout_file, "r", encoding="utf-8") as file:
+        cached_positions = json.load(file)
+pos, _ = layout.warm_start_layout(citation_graph, cached_positions)
+with open(layout_file, "w", encoding="utf-8") as file:
+    json.dump(layout.positions_to_dict(citation_graph, pos), file)
 
 # Draw nodes
 nx.draw_networkx_nodes(citation_graph, pos, node_size=2000, node_color="lightblue")
@@ -169,6 +207,7 @@ clean_attributes(citation_graph)
 
 # Save graph to GML file
 nx.write_gml(citation_graph, "citation_graph.gml")
+enrichment_log.discard(ENRICHMENT_BUCKET, related_works_log.prefix)
 
 # This generates a Viewable Graph
 #plt.title("Citation Graph")
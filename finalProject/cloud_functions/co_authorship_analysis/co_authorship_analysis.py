@@ -0,0 +1,89 @@
+"""
+Combined gap and collaboration analysis of a co-authorship graph.
+
+Deployed instead of the two separate analysis functions, this function
+downloads and parses each new co-authorship graph once. Both analysers run
+over one AnalysisSession, so they share its topic maps, centralities and
+Louvain partition, and their outputs are emitted together under one
+timestamp. The analyser modules are copied next to this file when the
+function is deployed (see "sequence of commands.txt").
+"""
+from datetime import datetime
+import functions_framework
+from common import idempotency, telemetry
+from co_authorship_graph_gaps import CloudGapAnalyzer
+from network_collaboration import CloudCollaborationAnalyzer
+
+# networkx and python-louvain are imported by the session when the graph is loaded
+
+
+def analyze_graph(file_path, source_bucket, gaps_bucket="gaps_analysis",
+                  collaboration_bucket="collaborationanalysis", min_similarity=0.3):
+    """
+    Run the gap and collaboration analyses over one load of the graph.
+    
+    Args:
+        file_path: Path to the GML file in the source bucket
+        source_bucket: Name of the bucket containing the input file
+        gaps_bucket: Name of the bucket to store the gap analysis in
+        collaboration_bucket: Name of the bucket to store the collaboration analysis in
+        min_similarity: Minimum topic similarity of a recommended pair
+    
+    Returns:
+        Tuple of the number of gaps and the number of recommendations
+    """
+    from common.analysis_session import AnalysisSession
+
+    session = AnalysisSession.from_blob(source_bucket, file_path)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    
+    gaps_analyzer = CloudGapAnalyzer(file_path, source_bucket, gaps_bucket)
+    with telemetry.span("gaps"):
+        num_gaps = gaps_analyzer.analyze_gaps(session=session, timestamp=timestamp)
+    
+    collaboration_analyzer = CloudCollaborationAnalyzer(file_path, source_bucket, collaboration_bucket)
+    with telemetry.span("collaboration"):
+        num_recommendations = collaboration_analyzer.analyze_collaborations(
+            min_similarity=min_similarity, session=session, timestamp=timestamp)
+    
+    return num_gaps, num_recommendations
+
+
+@functions_framework.cloud_event
+def analyze_coauthorship_graph(cloud_event):
+    """
+    Cloud Function triggered when a co-authorship GML file is uploaded to GCS.
+    Runs the gap and collaboration analyses over one shared load of the graph.
+    
+    Args:
+        cloud_event: The Cloud Event that triggered this function
+    """
+    data = cloud_event.data
+    bucket_name = data["bucket"]
+    file_path = data["name"]
+    
+    # Only process GML files with "co_authorship" in the name
+    if not file_path.endswith(".gml") or "co_authorship" not in file_path:
+        print(f"Skipping non-target file: gs://{bucket_name}/{file_path}")
+        return
+    
+    # The manifest lives with the gap analysis, the first of the two outputs
+    event = idempotency.check_event(data, "gaps_analysis", "analyze_coauthorship_graph", __file__)
+    if event is None:
+        return
+    
+    print(f"Processing co-authorship analysis for: gs://{bucket_name}/{file_path}")
+    
+    with telemetry.run("analyze_coauthorship_graph", bucket=bucket_name, name=file_path) as run:
+        try:
+            num_gaps, num_recommendations = analyze_graph(file_path, bucket_name)
+            run.attributes["gaps"] = num_gaps
+            run.attributes["recommendations"] = num_recommendations
+            event.mark_processed(gaps=num_gaps, recommendations=num_recommendations, run_id=run.run_id)
+        
+            print(f"Analysis complete. Found {num_gaps} potential gaps and "
+                  f"{num_recommendations} potential collaborations.")
+        
+        except Exception as e:
+            print(f"Error processing file: {e}")
+            raise
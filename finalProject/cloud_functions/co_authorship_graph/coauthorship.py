@@ -1,19 +1,210 @@
-import networkx as nx
-import matplotlib.pyplot as plt
 from collections import defaultdict
-import requests
+import hashlib
 import time
-from typing import Dict, List, Set
+from typing import TYPE_CHECKING, Dict, List, Set
 import os
 import json
-import tempfile
+import io
 import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import functions_framework
-from google.cloud import storage
+from common import enrichment_log, render_queue, storage_backend, telemetry
+
+# networkx, numpy, scipy, requests and the layout/rendering helpers are
+# imported where they are used, so invocations skipped by the trigger filter
+# start without loading them
+if TYPE_CHECKING:
+    import networkx as nx
+    from scipy import sparse
+
+
+OPENALEX_URL = "https://api.openalex.org"
+
+# OpenAlex accepts at most 50 IDs in a single OR filter
+AUTHOR_BATCH_SIZE = 50
+AUTHOR_SELECT_FIELDS = "id,display_name,last_known_institutions"
+
+# Blob in the output bucket holding author records from previous invocations
+AUTHOR_TABLE_PATH = "author_table.json"
+
+# Append-only logs of API enrichment results, read back after a timeout (see common/enrichment_log.py);
+# each build keeps its logs under ENRICHMENT_PREFIX/<build scope>/ until its graph is published
+ENRICHMENT_PREFIX = "enrichment"
+PAPER_AUTHORS_LOG = "paper_authors"
+AUTHOR_RECORDS_LOG = "authors"
+
+# Manifest of papers already folded into the incrementally maintained graph
+MANIFEST_PATH = "incremental/manifest.json"
+# Updates that may fail to process a paper before it is no longer retried
+MAX_PAPER_ATTEMPTS = int(os.environ.get("COAUTHORSHIP_MAX_PAPER_ATTEMPTS", "3"))
+VERSIONED_GRAPH_PATH = "incremental/co_authorship_graph_v{version:04d}.gml"
+
+# Author records shared by all invocations served by this instance, and the
+# generation of each bucket's stored author table they already include
+_author_table: Dict[str, dict] = {}
+_author_table_generations: Dict[str, int] = {}
+AUTHOR_TABLE_SAVE_ATTEMPTS = 5
+
+# Sharded builds keep partial results, checkpoints and shard tasks under shards/<build_id>/
+SHARD_PREFIX = "shards"
+SHARD_COUNT = int(os.environ.get("COAUTHORSHIP_SHARDS", "8"))
+
+# Topic aggregation settings
+TOP_TOPICS_PER_AUTHOR = 5
+TOPIC_CACHE_SIZE = 100_000
+
+
+class LRUCache:
+    """Size-bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        for key in [key for key in self._entries if predicate(key)]:
+            del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Aggregated topics shared by all invocations served by this instance, keyed by
+# (topic scope, author ID); a scope names one corpus, see CoAuthorshipNetwork.topic_scope
+_topic_cache = LRUCache(TOPIC_CACHE_SIZE)
+# Graph version the cached topics of each incremental scope were computed for
+_topic_cache_versions: Dict[str, int] = {}
+
+
+class PaperTopicIndex:
+    """Integer-indexed paper -> topic incidence of a citation graph."""
+
+    def __init__(self):
+        self.paper_index: Dict[str, int] = {}   # Paper ID -> row
+        self.topic_index: Dict[str, int] = {}   # Topic ID -> column
+        self.topic_details: List[dict] = []     # Column -> topic attributes
+        self.indptr = [0]                       # CSR row pointers over topic_ids
+        self.topic_ids = []                     # Topic columns of each paper
+        self._matrix = None
+
+    @classmethod
+    def from_graph(cls, citation_graph: "nx.DiGraph") -> "PaperTopicIndex":
+        """Build the index from the 'topics' attribute of every paper node."""
+        index = cls()
+        for paper_id, paper_data in citation_graph.nodes(data=True):
+            # Bare references are indexed once a later graph carries their attributes
+            if paper_data:
+                index.add_paper(paper_id, paper_data.get('topics', []))
+        return index
+
+    def add_paper(self, paper_id: str, topics):
+        """Register a paper and its topics, ignoring papers already indexed."""
+        if paper_id in self.paper_index:
+            return
+
+        # GML stores a single nested topic as a dict rather than a list, and
+        # fetchinputdata.py serializes the whole list to a JSON string
+        if isinstance(topics, str) and topics.startswith("["):
+            topics = json.loads(topics)
+        if isinstance(topics, dict):
+            topics = [topics]
+        elif not isinstance(topics, list):
+            topics = []
+
+        columns = []
+        for topic in topics:
+            if not isinstance(topic, dict) or not topic.get('id'):
+                continue
+            topic_id = topic['id']
+            if topic_id not in self.topic_index:
+                self.topic_index[topic_id] = len(self.topic_details)
+                self.topic_details.append({
+                    'id': topic_id,
+                    'display_name': topic.get('display_name', ''),
+                    'domain': topic.get('domain', {}),
+                    'field': topic.get('field', {}),
+                    'subfield': topic.get('subfield', {})
+                })
+            if self.topic_index[topic_id] not in columns:
+                columns.append(self.topic_index[topic_id])
+
+        self.paper_index[paper_id] = len(self.indptr) - 1
+        self.topic_ids.extend(columns)
+        self.indptr.append(len(self.topic_ids))
+        self._matrix = None
+
+    def to_dict(self) -> dict:
+        """Serialize the index for storage in the incremental manifest."""
+        return {
+            "papers": list(self.paper_index),
+            "topics": self.topic_details,
+            "indptr": self.indptr,
+            "topic_ids": self.topic_ids,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PaperTopicIndex":
+        """Restore an index serialized with to_dict."""
+        index = cls()
+        index.paper_index = {paper_id: row for row, paper_id in enumerate(data["papers"])}
+        index.topic_details = data["topics"]
+        index.topic_index = {topic["id"]: col for col, topic in enumerate(index.topic_details)}
+        index.indptr = data["indptr"]
+        index.topic_ids = data["topic_ids"]
+        return index
+
+    def matrix(self) -> "sparse.csr_matrix":
+        """Return the paper x topic incidence matrix."""
+        import numpy as np
+        from scipy import sparse
+
+        if self._matrix is None:
+            self._matrix = sparse.csr_matrix(
+                (np.ones(len(self.topic_ids), dtype=np.int32),
+                 np.asarray(self.topic_ids, dtype=np.int32),
+                 np.asarray(self.indptr, dtype=np.int64)),
+                shape=(len(self.indptr) - 1, len(self.topic_details))
+            )
+        return self._matrix
+
+
+def paper_shard(paper_id: str, shard_count: int) -> int:
+    """Shard of a paper ID, stable across processes and instances."""
+    return int.from_bytes(hashlib.md5(paper_id.encode("utf-8")).digest()[:4], "big") % shard_count
+
+
+def shard_build_id(bucket_name: str, blob_name: str, shard_count: int) -> str:
+    """Build ID of a sharded build: one per input generation and shard count, so re-runs resume it."""
+    blob = storage_backend.get_blob(bucket_name, blob_name)
+    blob.reload()
+    return f"{blob.generation}-{shard_count}"
+
+
+def shard_blob(build_id: str, kind: str, shard: int) -> str:
+    """Blob of a shard's 'input', 'task', 'partial' or 'checkpoint' file."""
+    return f"{SHARD_PREFIX}/{build_id}/{kind}-{shard:04d}.json"
 
 
 class CoAuthorshipNetwork:
-    def __init__(self, input_file_path: str, source_bucket: str, output_bucket: str = "coauthorshipgraph"):
+    def __init__(self, input_file_path: str, source_bucket: str, output_bucket: str = "coauthorshipgraph",
+                 max_workers: int = 8):
         """
         Initialize the co-authorship network processor.
         
@@ -21,49 +212,81 @@ class CoAuthorshipNetwork:
             input_file_path: Path to the input file within the source bucket
             source_bucket: Name of the bucket containing the input file
             output_bucket: Name of the bucket to store results
+            max_workers: Number of concurrent author batch requests
         """
+        import networkx as nx
+        import requests
+
         self.input_file_path = input_file_path
         self.source_bucket = source_bucket
         self.output_bucket = output_bucket
+        self.max_workers = max_workers
         self.graph = nx.Graph()  # Undirected graph for co-authorship
-        self.author_data = {}    # Cache for author details
-        self.topic_cache = {}    # Cache for aggregated topics
-        self.temp_input_file = None  # Path to temporary local input file
-        
-    def download_input_file(self):
-        """Download the input GML file from Google Cloud Storage to a temp file."""
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.source_bucket)
-        blob = bucket.blob(self.input_file_path)
+        self.author_data = _author_table  # Cache for author details
+        self.author_table_loaded = False
+        self.author_log = None  # Author records fetched since the author table was last saved
+        self.build_scope = None  # Build the enrichment logs belong to; the input generation unless set
+        self.started = time.monotonic()  # Start of the enrichment time budget
+        self.topic_cache = _topic_cache  # Aggregated topics per (topic scope, author ID)
+        self.topic_scope = None  # Corpus the aggregated topics belong to; None disables the cache
+        self.topic_index = PaperTopicIndex()
+        self.new_author_records = 0
+        self.session = requests.Session()
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=max_workers))
+        self.paper_authors = {}  # Paper ID -> author IDs of every processed paper, [] when it has none
+        self.failed_attempts = {}  # Paper ID -> updates that failed to process it, for papers not in paper_authors
+        # Offline runs read authorships from the 'authors' node attribute and skip enrichment
+        self.offline = os.environ.get("OPENALEX_OFFLINE") == "1"
+        self.manifest_generation = 0  # Generation of the manifest blob this build started from
         
-        # Create a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".gml")
-        self.temp_input_file = temp_file.name
-        temp_file.close()
-        
-        # Download the file
-        blob.download_to_filename(self.temp_input_file)
-        print(f"Downloaded gs://{self.source_bucket}/{self.input_file_path} to {self.temp_input_file}")
-        
-        return self.temp_input_file
-        
-    def load_citation_graph(self) -> nx.DiGraph:
-        """Load citation graph from the downloaded GML file."""
-        print("Loading citation graph from GML...")
-        return nx.read_gml(self.temp_input_file)
+    def input_generation(self) -> int:
+        """Generation of the citation graph blob."""
+        blob = storage_backend.get_blob(self.source_bucket, self.input_file_path)
+        blob.reload()
+        return blob.generation
+
+    def enrichment_prefix(self, log: str = None) -> str:
+        """Folder of one enrichment log of this build, or of all of them."""
+        if self.build_scope is None:
+            self.build_scope = f"graphs/{self.input_generation()}"
+        prefix = f"{ENRICHMENT_PREFIX}/{self.build_scope}"
+        return prefix if log is None else f"{prefix}/{log}"
+
+    def discard_enrichment_logs(self):
+        """Delete this build's enrichment logs once its results are saved."""
+        if not self.offline:
+            enrichment_log.discard(self.output_bucket, self.enrichment_prefix())
+
+    def load_citation_graph(self) -> "nx.DiGraph":
+        """Stream the citation graph GML from Google Cloud Storage and parse it."""
+        import networkx as nx
+
+        print(f"Loading citation graph from gs://{self.source_bucket}/{self.input_file_path}...")
+        # Download and parse overlap while streaming, so they are timed as one span
+        with telemetry.span("load_citation_graph"), \
+                storage_backend.open_blob(self.source_bucket, self.input_file_path, "rb") as f:
+            return nx.read_gml(f)
 
     def fetch_author_details(self, author_id: str) -> dict:
         """Fetch detailed author information from OpenAlex API."""
+        import requests
+
         if author_id in self.author_data:
+            telemetry.count("author_cache.hits")
             return self.author_data[author_id]
+        telemetry.count("author_cache.misses")
 
-        url = f"https://api.openalex.org/authors/{author_id}"
+        url = f"{OPENALEX_URL}/authors/{author_id}"
         print(f"Fetching author details: {url}")
         
         try:
-            response = requests.get(url)
+            with telemetry.timer("openalex.author"):
+                response = self.session.get(url, params={"select": AUTHOR_SELECT_FIELDS})
             if response.status_code == 200:
                 self.author_data[author_id] = response.json()
+                self.new_author_records += 1
+                if self.author_log is not None:
+                    self.author_log.record(author_id, self.author_data[author_id])
                 time.sleep(0.1)  # Rate limiting
                 return self.author_data[author_id]
         except requests.exceptions.RequestException as e:
@@ -71,193 +294,712 @@ class CoAuthorshipNetwork:
         
         return None
 
-    def extract_authors_from_papers(self, citation_graph: nx.DiGraph) -> Dict[str, List[str]]:
-        """Extract author information from paper nodes."""
-        paper_authors = defaultdict(list)
-        author_papers = defaultdict(list)
-        
-        # Assume each paper node has an 'authors' attribute list
-        for node in citation_graph.nodes(data=True):
-            paper_id = node[0]
-            paper_data = node[1]
-            
-            # Extract authors from OpenAlex API for each paper
+    def load_author_table(self):
+        """Merge author records persisted by earlier invocations into the cache."""
+        if self.author_table_loaded:
+            return
+
+        self._merge_stored_author_table()
+
+        if not self.offline:
+            # Records fetched by invocations that timed out before saving the table
+            self.author_log = enrichment_log.EnrichmentLog(
+                self.output_bucket, self.enrichment_prefix(AUTHOR_RECORDS_LOG), self.started)
+            self.author_data.update(self.author_log.results)
+            self.new_author_records += len(self.author_log)
+
+        self.author_table_loaded = True
+
+    def _merge_stored_author_table(self):
+        """Download the stored author table only if its generation changed since this instance last read it."""
+        blob = storage_backend.get_client().bucket(self.output_bucket).get_blob(AUTHOR_TABLE_PATH)
+        generation = blob.generation if blob is not None else 0
+        if _author_table_generations.get(self.output_bucket) == generation:
+            telemetry.count("author_table.unchanged")
+            return
+
+        if blob is not None:
+            stored = json.loads(blob.download_as_bytes())
+            for author_id, record in stored.items():
+                self.author_data.setdefault(author_id, record)
+            print(f"Loaded {len(stored)} authors from gs://{self.output_bucket}/{AUTHOR_TABLE_PATH}")
+        _author_table_generations[self.output_bucket] = generation
+
+    def save_author_table(self):
+        """
+        Persist the author cache so later invocations can reuse it.
+
+        The write only succeeds against the generation this instance last
+        merged; if another instance saved in between, its records are merged
+        in and the save is retried.
+        """
+        if self.offline or not self.new_author_records:
+            return
+
+        for _ in range(AUTHOR_TABLE_SAVE_ATTEMPTS):
+            generation = _author_table_generations.get(self.output_bucket, 0)
             try:
-                paper_url = f"https://api.openalex.org/works/{paper_id}"
-                response = requests.get(paper_url)
-                if response.status_code == 200:
-                    paper_details = response.json()
-                    authors = paper_details.get('authorships', [])
-                    
-                    # Record paper-author relationships
-                    for authorship in authors:
-                        author_id = authorship.get('author', {}).get('id', '').split('/')[-1]
-                        if author_id:
-                            paper_authors[paper_id].append(author_id)
-                            author_papers[author_id].append(paper_id)
-                    
+                blob = storage_backend.write_bytes(self.output_bucket, AUTHOR_TABLE_PATH, json.dumps(self.author_data),
+                                                   content_type="application/json", if_generation_match=generation)
+                break
+            except storage_backend.PreconditionFailed:
+                print(f"gs://{self.output_bucket}/{AUTHOR_TABLE_PATH} changed since it was loaded, merging it")
+                self._merge_stored_author_table()
+        else:
+            print(f"Could not save the author table after {AUTHOR_TABLE_SAVE_ATTEMPTS} attempts; "
+                  f"the enrichment log keeps the new records")
+            return
+
+        _author_table_generations[self.output_bucket] = blob.generation
+        print(f"Saved {len(self.author_data)} authors to gs://{self.output_bucket}/{AUTHOR_TABLE_PATH}")
+        self.new_author_records = 0
+        # The table now holds every logged record
+        if self.author_log is not None:
+            self.author_log.clear()
+
+    def _fetch_author_batch(self, author_ids: List[str]) -> List[dict]:
+        """Resolve up to AUTHOR_BATCH_SIZE authors with a single OR-filter request."""
+        import requests
+
+        params = {
+            "filter": "openalex:" + "|".join(author_ids),
+            "select": AUTHOR_SELECT_FIELDS,
+            "per-page": AUTHOR_BATCH_SIZE,
+        }
+
+        try:
+            with telemetry.timer("openalex.authors_batch"):
+                response = self.session.get(f"{OPENALEX_URL}/authors", params=params)
+            if response.status_code == 200:
                 time.sleep(0.1)  # Rate limiting
-            except Exception as e:
-                print(f"Error fetching paper details for {paper_id}: {e}")
-                
-        return paper_authors, author_papers
+                return response.json().get("results", [])
+            print(f"Error fetching author batch: {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching author batch: {e}")
 
-    def aggregate_topics(self, citation_graph: nx.DiGraph, paper_ids: List[str]) -> List[dict]:
-        """Aggregate topics from all papers by an author."""
-        if tuple(paper_ids) in self.topic_cache:
-            return self.topic_cache[tuple(paper_ids)]
+        return []
 
-        topic_frequency = defaultdict(int)
-        topic_details = {}
+    def fetch_authors_bulk(self, author_ids: List[str]):
+        """Resolve every uncached author in concurrent batches of AUTHOR_BATCH_SIZE."""
+        if self.offline:
+            return
+
+        self.load_author_table()
+
+        unique_ids = list(dict.fromkeys(author_ids))
+        missing = [author_id for author_id in unique_ids if author_id not in self.author_data]
+        telemetry.count("author_cache.hits", len(unique_ids) - len(missing))
+        telemetry.count("author_cache.misses", len(missing))
+        if not missing:
+            return
+
+        batches = [missing[i:i + AUTHOR_BATCH_SIZE] for i in range(0, len(missing), AUTHOR_BATCH_SIZE)]
+        print(f"Fetching {len(missing)} authors in {len(batches)} batches...")
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # One round of concurrent batches at a time, so an expired time budget stops between rounds
+            for start in range(0, len(batches), self.max_workers):
+                if self.author_log.expired():
+                    self.author_log.flush()
+                    raise enrichment_log.EnrichmentIncomplete(
+                        f"{len(batches) - start} of {len(batches)} author batches left")
+                for records in executor.map(self._fetch_author_batch, batches[start:start + self.max_workers]):
+                    for record in records:
+                        author_id = record.get("id", "").split("/")[-1]
+                        if author_id:
+                            self.author_data[author_id] = record
+                            self.new_author_records += 1
+                            self.author_log.record(author_id, record)
+            self.author_log.flush()
+
+    @staticmethod
+    def get_institution_name(details: dict) -> str:
+        """Return the most recent institution of an author record."""
+        institutions = details.get("last_known_institutions") or []
+        if institutions:
+            return institutions[0].get("display_name", "Unknown")
+        # Records cached before field projection carry the deprecated singular field
+        return (details.get("last_known_institution") or {}).get("display_name", "Unknown")
+
+    def extract_authors_from_papers(self, citation_graph: "nx.DiGraph", paper_ids: List[str] = None) -> Dict[str, List[str]]:
+        """Extract author information from paper nodes, optionally restricted to paper_ids."""
+        paper_authors = defaultdict(list)
+        author_papers = defaultdict(list)
         
-        for paper_id in paper_ids:
-            if paper_id in citation_graph:
-                paper_data = citation_graph.nodes[paper_id]
-                topics = paper_data.get('topics', [])
-                
-                # Handle both string and list representations of topics
-                if isinstance(topics, str) and topics == "_networkx_list_start":
+        if self.offline:
+            return self.extract_authors_from_attributes(citation_graph, paper_ids)
+
+        import requests
+
+        paper_ids = list(citation_graph.nodes() if paper_ids is None else paper_ids)
+        # Authorships fetched by earlier invocations are logged, so only the remaining papers are requested
+        with enrichment_log.EnrichmentLog(self.output_bucket, self.enrichment_prefix(PAPER_AUTHORS_LOG),
+                                          self.started) as log:
+            for paper_id in paper_ids:
+                if paper_id in log:
+                    telemetry.count("paper_log.hits")
                     continue
-                    
-                for topic in topics:
-                    if isinstance(topic, dict):
-                        topic_id = topic.get('id', '')
-                        if topic_id:
-                            topic_frequency[topic_id] += 1
-                            if topic_id not in topic_details:
-                                topic_details[topic_id] = {
-                                    'id': topic_id,
-                                    'display_name': topic.get('display_name', ''),
-                                    'domain': topic.get('domain', {}),
-                                    'field': topic.get('field', {}),
-                                    'subfield': topic.get('subfield', {})
-                                }
-
-        # Sort topics by frequency and keep top 5
-        top_topics = sorted(topic_frequency.items(), key=lambda x: x[1], reverse=True)[:5]
-        aggregated_topics = [topic_details[topic_id] for topic_id, _ in top_topics]
-        
-        self.topic_cache[tuple(paper_ids)] = aggregated_topics
-        return aggregated_topics
+                if log.expired():
+                    raise enrichment_log.EnrichmentIncomplete(
+                        f"{sum(paper_id not in log for paper_id in paper_ids)} of {len(paper_ids)} papers left")
+
+                # Extract authors from OpenAlex API for each paper
+                try:
+                    paper_url = f"https://api.openalex.org/works/{paper_id}"
+                    with telemetry.timer("openalex.work"):
+                        response = requests.get(paper_url)
+                    if response.status_code == 200:
+                        paper_details = response.json()
+                        authors = paper_details.get('authorships', [])
+                        author_ids = [authorship.get('author', {}).get('id', '').split('/')[-1]
+                                      for authorship in authors]
+                        log.record(paper_id, [author_id for author_id in author_ids if author_id])
+
+                    time.sleep(0.1)  # Rate limiting
+                except Exception as e:
+                    print(f"Error fetching paper details for {paper_id}: {e}")
+
+        # Record paper-author relationships; papers whose request failed are left out so they are retried
+        for paper_id in paper_ids:
+            if paper_id not in log:
+                continue
+            paper_authors[paper_id] = list(log.get(paper_id))
+            for author_id in paper_authors[paper_id]:
+                author_papers[author_id].append(paper_id)
+
+        return paper_authors, author_papers
+
+    def extract_authors_from_attributes(self, citation_graph: "nx.DiGraph", paper_ids: List[str] = None) -> Dict[str, List[str]]:
+        """Extract paper-author relationships from the 'authors' node attribute without API calls."""
+        paper_authors = defaultdict(list)
+        author_papers = defaultdict(list)
+        # Author records seeded from a snapshot take precedence over the bare names below
+        self.load_author_table()
+
+        for paper_id in (citation_graph.nodes() if paper_ids is None else paper_ids):
+            # Bare references carry no attributes yet; they are processed once a later graph has them
+            if 'authors' not in citation_graph.nodes[paper_id]:
+                continue
+            authors = citation_graph.nodes[paper_id]['authors']
+            if isinstance(authors, str):
+                authors = json.loads(authors) if authors.startswith("[") else []
+            elif isinstance(authors, dict):
+                authors = [authors]
+
+            # Papers without authors are recorded too, so they count as processed
+            paper_authors[paper_id] = []
+            for author in authors:
+                author_id = author.get('id', '').split('/')[-1]
+                if author_id:
+                    paper_authors[paper_id].append(author_id)
+                    author_papers[author_id].append(paper_id)
+                    # Offline runs have no enrichment, so keep the name we already have
+                    self.author_data.setdefault(author_id, {'display_name': author.get('display_name', 'Unknown')})
+
+        return paper_authors, author_papers
+
+    def aggregate_topics(self, author_papers: Dict[str, List[str]]) -> Dict[str, List[dict]]:
+        """
+        Aggregate the top topics of every author in one vectorized pass.
+
+        Builds a sparse author x paper incidence matrix, multiplies it with the
+        paper x topic matrix of the topic index and keeps the most frequent
+        topics of each row. Results are memoised per author ID.
+
+        Args:
+            author_papers: Mapping of author ID to the IDs of their papers
+
+        Returns:
+            Mapping of author ID to its aggregated topic details
+        """
+        import numpy as np
+        from scipy import sparse
+
+        aggregated = {}
+        pending = []
+        for author_id in author_papers:
+            cached = None if self.topic_scope is None else self.topic_cache.get((self.topic_scope, author_id))
+            if cached is None:
+                pending.append(author_id)
+            else:
+                aggregated[author_id] = cached
+
+        telemetry.count("topic_cache.hits", len(aggregated))
+        telemetry.count("topic_cache.misses", len(pending))
+        if not pending:
+            return aggregated
+
+        # Author x paper incidence, one entry per authorship
+        rows, cols = [], []
+        for row, author_id in enumerate(pending):
+            for paper_id in author_papers[author_id]:
+                paper_idx = self.topic_index.paper_index.get(paper_id)
+                if paper_idx is not None:
+                    rows.append(row)
+                    cols.append(paper_idx)
+
+        incidence = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(pending), len(self.topic_index.paper_index))
+        )
+        counts = (incidence @ self.topic_index.matrix()).tocsr()
+        counts.sort_indices()
+
+        for row, author_id in enumerate(pending):
+            start, end = counts.indptr[row], counts.indptr[row + 1]
+            topic_ids = counts.indices[start:end]
+            frequencies = counts.data[start:end]
+
+            if len(frequencies) > TOP_TOPICS_PER_AUTHOR:
+                top = np.argpartition(-frequencies, TOP_TOPICS_PER_AUTHOR - 1)[:TOP_TOPICS_PER_AUTHOR]
+                topic_ids, frequencies = topic_ids[top], frequencies[top]
+
+            # Most frequent first, ties broken by first appearance in the corpus
+            order = np.lexsort((topic_ids, -frequencies))
+            topics = [self.topic_index.topic_details[topic_idx] for topic_idx in topic_ids[order]]
+
+            if self.topic_scope is not None:
+                self.topic_cache.put((self.topic_scope, author_id), topics)
+            aggregated[author_id] = topics
+
+        return aggregated
 
     def build_graph(self):
         """Construct the co-authorship network from citation graph."""
         print("Building co-authorship network...")
         
-        # Download input file
-        self.download_input_file()
-        
-        # Load citation graph
+        # Load citation graph; topics cached for the same input generation are reused
+        if self.topic_scope is None:
+            self.topic_scope = f"{self.source_bucket}/{self.input_file_path}@{self.input_generation()}:{self.offline}"
         citation_graph = self.load_citation_graph()
         
         # Extract author information
-        paper_authors, author_papers = self.extract_authors_from_papers(citation_graph)
+        with telemetry.span("extract_authors", papers=citation_graph.number_of_nodes()):
+            paper_authors, author_papers = self.extract_authors_from_papers(citation_graph)
+
+        # Precompute paper -> topic IDs and aggregate topics for all authors
+        with telemetry.span("aggregate_topics", authors=len(author_papers)):
+            self.topic_index = PaperTopicIndex.from_graph(citation_graph)
+            author_topics = self.aggregate_topics(author_papers)
+        
+        self.paper_authors = dict(paper_authors)
         
         # Track collaborations
+        with telemetry.span("count_collaborations"):
+            collaborations = self.count_collaborations(paper_authors)
+
+        # Resolve all author details up front
+        with telemetry.span("fetch_authors"):
+            self.fetch_authors_bulk(list(author_papers))
+            self.save_author_table()
+
+        with telemetry.span("build", authors=len(author_papers), collaborations=len(collaborations)):
+            # Add nodes for each author
+            for author_id in author_papers:
+                self.add_author_node(author_id, author_topics[author_id], len(author_papers[author_id]))
+
+            # Add weighted edges for collaborations
+            for (author1, author2), weight in collaborations.items():
+                self.graph.add_edge(author1, author2, weight=weight)
+
+    def split_shards(self, build_id: str, shards: List[int], shard_count: int):
+        """
+        Parse the citation graph once and write the papers of each listed shard as its input.
+
+        Each paper keeps its position in the citation graph, so the reduce step
+        can restore the order build_graph visits papers and topics in.
+        """
+        citation_graph = self.load_citation_graph()
+        inputs = {shard: [] for shard in shards}
+        with telemetry.span("split_shards", papers=citation_graph.number_of_nodes(), shards=len(shards)):
+            for position, (paper_id, paper_data) in enumerate(citation_graph.nodes(data=True)):
+                shard = paper_shard(paper_id, shard_count)
+                if shard in inputs:
+                    inputs[shard].append([position, paper_id, {key: paper_data[key] for key in ('authors', 'topics')
+                                                               if key in paper_data}])
+            for shard, papers in inputs.items():
+                storage_backend.write_bytes(self.output_bucket, shard_blob(build_id, "input", shard),
+                                            json.dumps({"papers": papers}), content_type="application/json")
+
+    def load_shard_input(self, build_id: str, shard: int) -> "nx.DiGraph":
+        """Graph of a shard's papers, in citation graph order, with their position as attribute."""
+        import networkx as nx
+
+        papers = json.loads(storage_backend.read_bytes(self.output_bucket, shard_blob(build_id, "input", shard)))
+        shard_graph = nx.DiGraph()
+        for position, paper_id, paper_data in papers["papers"]:
+            shard_graph.add_node(paper_id, position=position, **paper_data)
+        return shard_graph
+
+    def build_shard(self, build_id: str, shard: int, shard_count: int) -> dict:
+        """
+        Map step of a sharded build: extract the authorships and collaborations of one shard's papers.
+
+        The partial result is written before the checkpoint, so a shard with a
+        checkpoint never needs to run again.
+
+        Returns:
+            The shard's checkpoint
+        """
+        self.build_scope = f"{SHARD_PREFIX}/{build_id}/shard-{shard:04d}"
+        with telemetry.span("load_shard_input", shard=shard):
+            shard_graph = self.load_shard_input(build_id, shard)
+
+        with telemetry.span("extract_authors", shard=shard, papers=shard_graph.number_of_nodes()):
+            paper_authors, author_papers = self.extract_authors_from_papers(shard_graph)
+
+        with telemetry.span("count_collaborations", shard=shard):
+            collaborations = self.count_collaborations(paper_authors)
+
+        # Shards resolve their own authors; the reduce step merges the records into the author table
+        with telemetry.span("fetch_authors", shard=shard):
+            self.fetch_authors_bulk(list(author_papers))
+
+        partial = {
+            "papers": [[paper_data["position"], paper_id, paper_data.get("topics", [])]
+                       for paper_id, paper_data in shard_graph.nodes(data=True)],
+            "paper_authors": dict(paper_authors),
+            "collaborations": [[author1, author2, weight] for (author1, author2), weight in collaborations.items()],
+            "authors": {author_id: self.author_data[author_id] for author_id in author_papers
+                        if author_id in self.author_data},
+        }
+        storage_backend.write_bytes(self.output_bucket, shard_blob(build_id, "partial", shard), json.dumps(partial),
+                                    content_type="application/json")
+
+        checkpoint = {
+            "shard": shard,
+            "shard_count": shard_count,
+            "papers": shard_graph.number_of_nodes(),
+            "authors": len(author_papers),
+            "collaborations": len(collaborations),
+            "partial": shard_blob(build_id, "partial", shard),
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        storage_backend.write_bytes(self.output_bucket, shard_blob(build_id, "checkpoint", shard),
+                                    json.dumps(checkpoint), content_type="application/json")
+        # The partial holds everything the shard's logs recorded
+        self.discard_enrichment_logs()
+        print(f"Shard {shard + 1}/{shard_count} of build {build_id} done: {shard_graph.number_of_nodes()} papers, "
+              f"{len(collaborations)} collaborations")
+        return checkpoint
+
+    def missing_shards(self, build_id: str, shard_count: int, kind: str = "checkpoint") -> List[int]:
+        """Shards of a build that have no checkpoint (or no file of another kind) yet."""
+        prefix = f"{SHARD_PREFIX}/{build_id}/{kind}-"
+        present = {blob.name for blob in storage_backend.get_client().list_blobs(self.output_bucket, prefix=prefix)}
+        return [shard for shard in range(shard_count) if shard_blob(build_id, kind, shard) not in present]
+
+    def plan_shards(self, build_id: str, shard_count: int, output_folder: str = None) -> List[int]:
+        """
+        Prepare the shards of a build that have no checkpoint yet.
+
+        Writes the input of every such shard that lacks one and, when
+        output_folder is given, a task that triggers a shard worker.
+
+        Returns:
+            The shards still to run
+        """
+        shards = self.missing_shards(build_id, shard_count)
+        without_input = sorted(set(shards) & set(self.missing_shards(build_id, shard_count, "input")))
+        if without_input:
+            self.split_shards(build_id, without_input, shard_count)
+
+        if output_folder is not None:
+            for shard in shards:
+                task = {
+                    "build_id": build_id,
+                    "shard": shard,
+                    "shard_count": shard_count,
+                    "output_folder": output_folder,
+                }
+                storage_backend.write_bytes(self.output_bucket, shard_blob(build_id, "task", shard),
+                                            json.dumps(task), content_type="application/json")
+        print(f"Planned {len(shards)} of {shard_count} shards of build {build_id}")
+        return shards
+
+    def reduce_shards(self, build_id: str, shard_count: int):
+        """Reduce step of a sharded build: merge every shard's partial result into the graph."""
+        missing = self.missing_shards(build_id, shard_count)
+        if missing:
+            raise RuntimeError(f"Shards {missing} of build {build_id} have no checkpoint; re-run them first")
+
+        # The shard scopes lie below the build's, so publishing the graph discards any they left behind
+        self.build_scope = f"{SHARD_PREFIX}/{build_id}"
+        self.load_author_table()
+        papers = []
+        paper_authors = {}
+        collaborations = defaultdict(int)
+        with telemetry.span("merge_shards", shards=shard_count):
+            for shard in range(shard_count):
+                partial = json.loads(storage_backend.read_bytes(self.output_bucket,
+                                                                shard_blob(build_id, "partial", shard)))
+                papers.extend(partial["papers"])
+                paper_authors.update(partial["paper_authors"])
+                for author1, author2, weight in partial["collaborations"]:
+                    collaborations[(author1, author2)] += weight
+                for author_id, record in partial["authors"].items():
+                    if author_id not in self.author_data:
+                        self.author_data[author_id] = record
+                        self.new_author_records += 1
+
+        self.topic_scope = f"{SHARD_PREFIX}/{build_id}:{self.offline}"
+        # Papers, topics and authors are visited in citation graph order, as in build_graph
+        papers.sort(key=lambda paper: paper[0])
+        author_papers = defaultdict(list)
+        for _, paper_id, _ in papers:
+            for author_id in paper_authors.get(paper_id, []):
+                author_papers[author_id].append(paper_id)
+
+        with telemetry.span("aggregate_topics", authors=len(author_papers)):
+            self.topic_index = PaperTopicIndex()
+            for _, paper_id, topics in papers:
+                self.topic_index.add_paper(paper_id, topics)
+            author_topics = self.aggregate_topics(author_papers)
+
+        self.paper_authors = paper_authors
+        self.save_author_table()
+
+        with telemetry.span("build", authors=len(author_papers), collaborations=len(collaborations)):
+            for author_id in author_papers:
+                self.add_author_node(author_id, author_topics[author_id], len(author_papers[author_id]))
+            for (author1, author2), weight in collaborations.items():
+                self.graph.add_edge(author1, author2, weight=weight)
+
+    def claim_reduce(self, build_id: str) -> bool:
+        """Claim the reduce step of a build; only the first shard worker to finish the build gets it."""
+        try:
+            storage_backend.write_bytes(self.output_bucket, f"{SHARD_PREFIX}/{build_id}/reduce.json",
+                                        json.dumps({"claimed_at": time.strftime("%Y-%m-%dT%H:%M:%S")}),
+                                        content_type="application/json", if_generation_match=0)
+            return True
+        except storage_backend.PreconditionFailed:
+            return False
+
+    @staticmethod
+    def count_collaborations(paper_authors: Dict[str, List[str]]) -> Dict[tuple, int]:
+        """Count co-authored papers for every unordered author pair."""
         collaborations = defaultdict(int)
-        
-        # Build collaboration data
         for paper_id, authors in paper_authors.items():
             for i, author1 in enumerate(authors):
                 for author2 in authors[i+1:]:
                     collaborations[(min(author1, author2), max(author1, author2))] += 1
+        return collaborations
 
-        # Add nodes for each author
-        for author_id in author_papers:
-            details = self.fetch_author_details(author_id)
-            
-            # Add node with attributes
-            self.graph.add_node(
-                author_id,
-                label=details.get('display_name', 'Unknown') if details else 'Unknown',
-                institution=details.get('last_known_institution', {}).get('display_name', 'Unknown') if details else 'Unknown',
-                topics=self.aggregate_topics(citation_graph, author_papers[author_id]),
-                pub_count=len(author_papers[author_id])
-            )
+    def add_author_node(self, author_id: str, topics: List[dict], pub_count: int):
+        """Add an author node, or refresh its attributes if it already exists."""
+        details = self.author_data.get(author_id)
+        self.graph.add_node(
+            author_id,
+            label=details.get('display_name', 'Unknown') if details else 'Unknown',
+            institution=self.get_institution_name(details) if details else 'Unknown',
+            topics=topics,
+            pub_count=pub_count
+        )
+
+    def load_manifest(self) -> dict:
+        """Load the incremental build manifest, or None before the first incremental build."""
+        blob = storage_backend.get_client().bucket(self.output_bucket).get_blob(MANIFEST_PATH)
+        if blob is None:
+            self.manifest_generation = 0
+            return None
+
+        self.manifest_generation = blob.generation
+        return json.loads(blob.download_as_bytes())
+
+    def save_manifest(self, version: int, graph_path: str):
+        """
+        Record the papers folded into graph version `version`.
+
+        The upload is conditional on the manifest generation read at the start
+        of the build, so a concurrent build fails instead of losing papers.
+        """
+        manifest = {
+            "version": version,
+            "graph_path": graph_path,
+            "paper_authors": self.paper_authors,
+            "failed_attempts": self.failed_attempts,
+            "topic_index": self.topic_index.to_dict(),
+        }
+        storage_backend.write_bytes(self.output_bucket, MANIFEST_PATH, json.dumps(manifest),
+                                    content_type="application/json",
+                                    if_generation_match=self.manifest_generation)
+        print(f"Manifest v{version} saved to gs://{self.output_bucket}/{MANIFEST_PATH}")
+
+    def load_graph_version(self, graph_path: str):
+        """Load a previously saved co-authorship graph from the output bucket."""
+        import networkx as nx
+
+        with storage_backend.open_blob(self.output_bucket, graph_path, "rb") as f:
+            self.graph = nx.read_gml(f)
+
+        # GML keeps the author ID as node label, so restore display names from the author table
+        self.load_author_table()
+        for author_id, node_data in self.graph.nodes(data=True):
+            details = self.author_data.get(author_id)
+            node_data['label'] = details.get('display_name', 'Unknown') if details else 'Unknown'
+
+    def update_graph(self) -> int:
+        """
+        Fold only the papers not yet listed in the manifest into the latest graph.
+
+        Falls back to a full build when no manifest exists. Authors and edge
+        weights of existing nodes are updated in place and the result is
+        written as a new graph version.
+
+        Returns:
+            The version number of the written graph
+        """
+        manifest = self.load_manifest()
 
-        # Add weighted edges for collaborations
-        for (author1, author2), weight in collaborations.items():
-            self.graph.add_edge(author1, author2, weight=weight)
+        # Topics cached by this instance carry over between versions it built itself; after a
+        # version built elsewhere the changed authors are unknown, so the scope starts over
+        self.topic_scope = f"incremental/{self.output_bucket}:{self.offline}"
+        if manifest is None or _topic_cache_versions.get(self.topic_scope) != manifest["version"]:
+            self.topic_cache.invalidate_where(lambda key: key[0] == self.topic_scope)
+
+        if manifest is None:
+            print("No incremental manifest found, building full co-authorship network...")
+            self.build_graph()
+            version = 1
+        else:
+            version = manifest["version"] + 1
+            citation_graph = self.load_citation_graph()
+
+            self.paper_authors = manifest["paper_authors"]
+            self.failed_attempts = manifest.get("failed_attempts", {})
+            self.topic_index = PaperTopicIndex.from_dict(manifest["topic_index"])
+            new_papers = [paper_id for paper_id in citation_graph.nodes() if paper_id not in self.paper_authors]
+            bare = 0
+            if self.offline:
+                # Bare references have no authors to read until a later graph carries their attributes
+                bare = sum(not citation_graph.nodes[paper_id] for paper_id in new_papers)
+                new_papers = [paper_id for paper_id in new_papers if citation_graph.nodes[paper_id]]
+            given_up = sum(self.failed_attempts.get(paper_id, 0) >= MAX_PAPER_ATTEMPTS for paper_id in new_papers)
+            new_papers = [paper_id for paper_id in new_papers
+                          if self.failed_attempts.get(paper_id, 0) < MAX_PAPER_ATTEMPTS]
+            print(f"{len(new_papers)} of {citation_graph.number_of_nodes()} papers are new since v{manifest['version']}"
+                  f" ({bare} bare references wait for their attributes, {given_up} failed papers are no longer retried)")
+
+            self.load_graph_version(manifest["graph_path"])
+
+            if new_papers:
+                new_paper_authors, new_author_papers = self.extract_authors_from_papers(citation_graph, new_papers)
+                for paper_id in new_papers:
+                    if citation_graph.nodes[paper_id]:
+                        self.topic_index.add_paper(paper_id, citation_graph.nodes[paper_id].get('topics', []))
+                    # Papers whose fetch failed stay out of the manifest and are retried by the next
+                    # updates, until MAX_PAPER_ATTEMPTS of them have failed
+                    if paper_id in new_paper_authors:
+                        self.paper_authors[paper_id] = new_paper_authors[paper_id]
+                        self.failed_attempts.pop(paper_id, None)
+                    else:
+                        self.failed_attempts[paper_id] = self.failed_attempts.get(paper_id, 0) + 1
+                failed = [paper_id for paper_id in new_papers if paper_id not in new_paper_authors]
+                abandoned = [paper_id for paper_id in failed if self.failed_attempts[paper_id] >= MAX_PAPER_ATTEMPTS]
+                if len(failed) > len(abandoned):
+                    print(f"{len(failed) - len(abandoned)} new papers could not be processed yet "
+                          f"and are left for the next update")
+                if abandoned:
+                    print(f"Giving up on {len(abandoned)} papers after {MAX_PAPER_ATTEMPTS} failed attempts: "
+                          f"{', '.join(abandoned[:10])}{' ...' if len(abandoned) > 10 else ''}")
+
+                # Full paper lists of every author touched by the delta
+                affected = set(new_author_papers)
+                author_papers = defaultdict(list)
+                for paper_id, authors in self.paper_authors.items():
+                    for author_id in authors:
+                        if author_id in affected:
+                            author_papers[author_id].append(paper_id)
+
+                self.fetch_authors_bulk([a for a in affected if a not in self.graph])
+                self.save_author_table()
+
+                self.topic_cache.invalidate([(self.topic_scope, author_id) for author_id in affected])
+                author_topics = self.aggregate_topics(author_papers)
+                for author_id in affected:
+                    self.add_author_node(author_id, author_topics[author_id], len(author_papers[author_id]))
+
+                for (author1, author2), weight in self.count_collaborations(new_paper_authors).items():
+                    if self.graph.has_edge(author1, author2):
+                        self.graph.edges[author1, author2]['weight'] += weight
+                    else:
+                        self.graph.add_edge(author1, author2, weight=weight)
+
+        graph_path = VERSIONED_GRAPH_PATH.format(version=version)
+        self.save_graph(graph_path)
+        self.save_manifest(version, graph_path)
+        _topic_cache_versions[self.topic_scope] = version
+        return version
 
     def save_graph(self, output_path: str):
         """Save the graph in GML format to Google Cloud Storage."""
+        import networkx as nx
+
         print(f"Saving graph to gs://{self.output_bucket}/{output_path}...")
         
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".gml") as temp_file:
-            nx.write_gml(self.graph, temp_file.name)
-            temp_file_path = temp_file.name
-        
-        try:
-            # Upload to GCS
-            storage_client = storage.Client()
-            bucket = storage_client.bucket(self.output_bucket)
-            blob = bucket.blob(output_path)
-            
-            blob.upload_from_filename(temp_file_path)
-            print(f"Graph saved to gs://{self.output_bucket}/{output_path}")
-            
-        finally:
-            # Clean up temporary file
-            os.remove(temp_file_path)
-            print(f"Deleted temporary file {temp_file_path}")
+        # Serialize in memory; large graphs are uploaded as parallel composite parts
+        with telemetry.span("serialize_graph"):
+            buffer = io.BytesIO()
+            nx.write_gml(self.graph, buffer)
+        with telemetry.span("upload_graph", bytes=buffer.getbuffer().nbytes):
+            storage_backend.write_bytes(self.output_bucket, output_path, buffer.getvalue(), content_type="text/plain")
+        print(f"Graph saved to gs://{self.output_bucket}/{output_path}")
+
+    def visualize_graph(self, output_path: str, layout_path: str = None, previous_layout_path: str = None):
+        """
+        Generate and save visualization to Google Cloud Storage.
+
+        Args:
+            output_path: Blob of the PNG in the output bucket
+            layout_path: Blob caching the node positions; reused when the graph is unchanged
+            previous_layout_path: Positions of an earlier graph version to warm-start from
+        """
+        from common import layout, rendering
 
-    def visualize_graph(self, output_path: str):
-        """Generate and save visualization to Google Cloud Storage."""
         print("Generating visualization...")
         
-        # Clear any existing plots
-        plt.clf()
-        plt.close('all')
-        
-        # Create new figure
-        fig = plt.figure(figsize=(15, 10))
-        
-        # Position nodes using force-directed layout
-        pos = nx.spring_layout(self.graph, k=1, iterations=50)
-        
-        # Calculate node sizes based on publication count
-        node_sizes = [self.graph.nodes[node]["pub_count"] * 100 for node in self.graph.nodes()]
-        
-        # Calculate edge widths based on collaboration weight
-        edge_widths = [self.graph.edges[edge]["weight"] for edge in self.graph.edges()]
-        
-        # Draw the network
-        nx.draw_networkx_nodes(self.graph, pos, node_size=node_sizes, 
-                         node_color="lightblue", alpha=0.6)
-        nx.draw_networkx_edges(self.graph, pos, width=edge_widths, 
-                         alpha=0.5, edge_color="gray")
+        # Position nodes using force-directed layout, cached next to the graph
+        if layout_path:
+            pos = layout.cached_layout(self.graph, self.output_bucket, layout_path, previous_layout_path)
+        else:
+            pos = layout.force_layout(self.graph)
         
-        # Add labels for larger nodes only (more publications)
-        labels = {node: self.graph.nodes[node]["label"] 
-                for node in self.graph.nodes()
-                if self.graph.nodes[node]["pub_count"] > 5}
-        nx.draw_networkx_labels(self.graph, pos, labels, font_size=8)
-        
-        plt.title("Co-authorship Network")
-        plt.axis("off")
-        
-        # Create a temporary file for the visualization
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            temp_file_path = temp_file.name
-        
-        # Save to temporary file
-        plt.savefig(temp_file_path, dpi=300, bbox_inches="tight")
-        plt.close(fig)
-        
-        try:
-            # Upload to GCS
-            storage_client = storage.Client()
-            bucket = storage_client.bucket(self.output_bucket)
-            blob = bucket.blob(output_path)
-            
-            blob.upload_from_filename(temp_file_path)
-            print(f"Visualization saved to gs://{self.output_bucket}/{output_path}")
-            
-        finally:
-            # Clean up temporary file
-            os.remove(temp_file_path)
-            print(f"Deleted temporary file {temp_file_path}")
+        # Draw the network and render it into memory
+        with telemetry.span("render"):
+            fig = rendering.draw_coauthorship_network(self.graph, pos)
+            png = rendering.figure_to_png(fig, dpi=300)
+
+        # Upload to GCS
+        storage_backend.write_bytes(self.output_bucket, output_path, png, content_type="image/png")
+        print(f"Visualization saved to gs://{self.output_bucket}/{output_path}")
+
+    def enqueue_visualization(self, output_path: str, graph_path: str, layout_path: str,
+                              previous_layout_path: str = None):
+        """
+        Hand the visualization to the render worker instead of drawing it here.
+
+        Args:
+            output_path: Blob of the PNG in the output bucket
+            graph_path: Blob of the saved graph in the output bucket
+            layout_path: Blob caching the node positions
+            previous_layout_path: Positions of an earlier graph version to warm-start from
+        """
+        from common import rendering
+
+        # The GML file does not keep display names, so pass those of the labelled authors along
+        top_k = render_queue.DEFAULT_OPTIONS["top_k_labels"]
+        prolific = [node for node in self.graph.nodes() if self.graph.nodes[node]["pub_count"] > 5]
+        labelled = rendering.top_k(prolific, lambda node: self.graph.nodes[node]["pub_count"], top_k)
+
+        render_queue.enqueue_render(
+            "coauthorship",
+            output=render_queue.blob_ref(self.output_bucket, output_path),
+            graph=render_queue.blob_ref(self.output_bucket, graph_path),
+            layout=render_queue.blob_ref(self.output_bucket, layout_path),
+            previous_layout=(render_queue.blob_ref(self.output_bucket, previous_layout_path)
+                             if previous_layout_path else None),
+            labels={node: self.graph.nodes[node]["label"] for node in labelled},
+        )
             
     def save_network_stats(self, output_path: str):
         """Save network statistics as JSON to Google Cloud Storage."""
@@ -269,18 +1011,46 @@ class CoAuthorshipNetwork:
         }
         
         # Upload to GCS
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.output_bucket)
-        blob = bucket.blob(output_path)
-        
-        blob.upload_from_string(json.dumps(stats, indent=4), content_type="application/json")
+        storage_backend.write_bytes(self.output_bucket, output_path, json.dumps(stats, indent=4),
+                                    content_type="application/json")
         print(f"Statistics saved to gs://{self.output_bucket}/{output_path}")
-        
-    def cleanup(self):
-        """Clean up temporary files."""
-        if self.temp_input_file and os.path.exists(self.temp_input_file):
-            os.remove(self.temp_input_file)
-            print(f"Deleted temporary input file {self.temp_input_file}")
+
+
+def publish_graph(network: CoAuthorshipNetwork, graph_path: str, stats_path: str, png_path: str,
+                  previous_graph_path: str = None, save: bool = True):
+    """
+    Save a built network with its statistics and visualization to the output bucket.
+    
+    Args:
+        network: The built network
+        graph_path: Blob of the graph; saved here unless save is False (update_graph saves its versions)
+        stats_path: Blob of the network statistics
+        png_path: Blob of the visualization
+        previous_graph_path: Earlier graph version whose layout warm-starts this one
+        save: Whether to save the graph
+    """
+    # Loads numpy and scipy, which skipped events never need
+    from common import layout
+
+    if save:
+        network.save_graph(graph_path)
+    network.save_network_stats(stats_path)
+    previous_layout = layout.layout_path_for(previous_graph_path) if previous_graph_path else None
+
+    # Results are published; the PNG is rendered by the render worker unless RENDER_MODE=inline
+    if render_queue.render_mode() == "queue":
+        with telemetry.span("enqueue_render"):
+            network.enqueue_visualization(png_path, graph_path, layout.layout_path_for(graph_path), previous_layout)
+    else:
+        network.visualize_graph(png_path, layout.layout_path_for(graph_path), previous_layout)
+
+    # Print basic network statistics
+    print("\nNetwork Statistics:")
+    print(f"Number of authors: {network.graph.number_of_nodes()}")
+    print(f"Number of collaborations: {network.graph.number_of_edges()}")
+    print(f"Average collaborations per author: {2 * network.graph.number_of_edges() / network.graph.number_of_nodes():.2f}")
+
+    network.discard_enrichment_logs()
 
 
 @functions_framework.cloud_event
@@ -302,38 +1072,103 @@ def process_gml_file(cloud_event):
         return
     
     print(f"Processing GML file: gs://{bucket_name}/{file_path}")
+
+    # "incremental" folds only unseen papers into the latest versioned graph;
+    # "sharded" hands the papers to shard workers, see process_coauthorship_shard
+    build_mode = os.environ.get("COAUTHORSHIP_BUILD_MODE", "full")
     
-    try:
-        # Extract folder name for output
-        base_name = os.path.basename(file_path)
-        output_folder = re.sub(r"\s+", "_", base_name.replace(".gml", ""))
-        
-        # Initialize and build the network
-        network = CoAuthorshipNetwork(
-            input_file_path=file_path,
-            source_bucket=bucket_name,
-            output_bucket="coauthorshipgraph"
-        )
-        
-        # Build the co-authorship network
-        network.build_graph()
+    with telemetry.run("process_gml_file", bucket=bucket_name, name=file_path, build_mode=build_mode) as run:
+        try:
+            # Extract folder name for output
+            base_name = os.path.basename(file_path)
+            output_folder = re.sub(r"\s+", "_", base_name.replace(".gml", ""))
         
-        # Save results to output bucket
-        network.save_graph(f"{output_folder}/co_authorship_graph.gml")
-        network.visualize_graph(f"{output_folder}/co_authorship_network.png")
-        network.save_network_stats(f"{output_folder}/network_stats.json")
+            # Initialize and build the network
+            network = CoAuthorshipNetwork(
+                input_file_path=file_path,
+                source_bucket=bucket_name,
+                output_bucket="coauthorshipgraph"
+            )
         
-        # Print basic network statistics
-        print("\nNetwork Statistics:")
-        print(f"Number of authors: {network.graph.number_of_nodes()}")
-        print(f"Number of collaborations: {network.graph.number_of_edges()}")
-        print(f"Average collaborations per author: {2 * network.graph.number_of_edges() / network.graph.number_of_nodes():.2f}")
+            if build_mode == "sharded":
+                build_id = shard_build_id(bucket_name, file_path, SHARD_COUNT)
+                run.attributes["shards"] = len(network.plan_shards(build_id, SHARD_COUNT, output_folder))
+                return
+            
+            if build_mode == "incremental":
+                # Update the co-authorship network with new papers only
+                version = network.update_graph()
+                graph_path = VERSIONED_GRAPH_PATH.format(version=version)
+                previous_graph = VERSIONED_GRAPH_PATH.format(version=version - 1) if version > 1 else None
+                stats_path = f"incremental/network_stats_v{version:04d}.json"
+                png_path = f"incremental/co_authorship_network_v{version:04d}.png"
+            else:
+                # Build the co-authorship network
+                network.build_graph()
+                graph_path = f"{output_folder}/co_authorship_graph.gml"
+                stats_path = f"{output_folder}/network_stats.json"
+                png_path = f"{output_folder}/co_authorship_network.png"
+                previous_graph = None
+
+            publish_graph(network, graph_path, stats_path, png_path, previous_graph, save=build_mode != "incremental")
+            run.attributes.update(authors=network.graph.number_of_nodes(),
+                                  collaborations=network.graph.number_of_edges())
         
-    except Exception as e:
-        print(f"Error processing file: {e}")
-        raise
+        except enrichment_log.EnrichmentIncomplete as e:
+            # Failing has the event retried, and the retry resumes from the logged results
+            print(f"Enrichment time budget spent, resuming on retry: {e}")
+            raise
+        except Exception as e:
+            print(f"Error processing file: {e}")
+            raise
+
+
+@functions_framework.cloud_event
+def process_coauthorship_shard(cloud_event):
+    """
+    Cloud Function triggered when a shard task is written to the co-authorship bucket.
+    Runs the shard and, when it completes the build, reduces all shards into the graph.
+    
+    Args:
+        cloud_event: The Cloud Event that triggered this function
+    """
+    data = cloud_event.data
+    bucket_name = data["bucket"]
+    file_path = data["name"]
+    
+    # Only shard tasks start work; partials, checkpoints and graphs land in the same bucket
+    if not file_path.startswith(f"{SHARD_PREFIX}/") or "/task-" not in file_path:
+        print(f"Skipping non-task file: gs://{bucket_name}/{file_path}")
+        return
+    
+    task = json.loads(storage_backend.read_bytes(bucket_name, file_path))
+    build_id, shard_count = task["build_id"], task["shard_count"]
+    
+    with telemetry.run("process_coauthorship_shard", bucket=bucket_name, name=file_path, shard=task["shard"]) as run:
+        try:
+            # Shards read their input from the build folder, not from the citation graph
+            network = CoAuthorshipNetwork(
+                input_file_path=None,
+                source_bucket=None,
+                output_bucket=bucket_name
+            )
+            network.build_shard(build_id, task["shard"], shard_count)
+            
+            # The worker finishing the last shard reduces the build
+            if network.missing_shards(build_id, shard_count) or not network.claim_reduce(build_id):
+                return
+            
+            with telemetry.span("reduce", shards=shard_count):
+                network.reduce_shards(build_id, shard_count)
+            output_folder = task["output_folder"]
+            publish_graph(network, f"{output_folder}/co_authorship_graph.gml", f"{output_folder}/network_stats.json",
+                          f"{output_folder}/co_authorship_network.png")
+            run.attributes.update(authors=network.graph.number_of_nodes(),
+                                  collaborations=network.graph.number_of_edges())
         
-    finally:
-        # Clean up temporary files
-        if 'network' in locals():
-            network.cleanup()
+        except enrichment_log.EnrichmentIncomplete as e:
+            print(f"Enrichment time budget spent, resuming on retry: {e}")
+            raise
+        except Exception as e:
+            print(f"Error processing shard: {e}")
+            raise
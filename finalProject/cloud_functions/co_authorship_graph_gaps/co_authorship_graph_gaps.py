@@ -1,65 +1,40 @@
-import matplotlib.pyplot as plt
-import networkx as nx
-import community
 import json
 import os
 from itertools import combinations
 from datetime import datetime
 import functions_framework
-from google.cloud import storage
-import tempfile
+from common import idempotency, render_queue, storage_backend, telemetry
+import io
+
+# networkx, python-louvain and the layout/rendering/export helpers are imported
+# where they are used, so invocations skipped by the trigger filter start
+# without loading them
+
+# Outputs of the network visualization: "png", "webgl" (binary buffers for an interactive viewer) or both
+EXPORT_FORMATS = [fmt.strip() for fmt in os.environ.get("GAPS_EXPORT_FORMATS", "png").split(",") if fmt.strip()]
 
 class CoAuthorshipGapAnalyzer:
-    def __init__(self, gml_path):
-        """Load the GML graph with enhanced label handling"""
-        self.G = nx.read_gml(gml_path, label='id')
-        
-        # Create bidirectional label<->ID mapping
-        label_to_id = {}
-        for node in self.G.nodes():
-            label = self.G.nodes[node].get('label', str(node))
-            label_to_id[label] = node
-        self.G.graph['label_to_id'] = label_to_id
-        self.G.graph['id_to_label'] = {v: k for k, v in label_to_id.items()}
-        
-        # Preprocess topics and subfields
-        topic_map = {}
-        subfield_map = {}
-        for node in self.G.nodes():
-            topics = self.G.nodes[node].get('topics', [])
-            topic_ids = set()
-            subfields = set()
-            for topic in topics:
-                if 'id' in topic:
-                    topic_ids.add(topic['id'])
-                if 'subfield' in topic:
-                    subfields.add(topic['subfield']['display_name'])
-            topic_map[node] = topic_ids
-            subfield_map[node] = subfields
+    def __init__(self, gml_path=None, session=None):
+        """Load the GML graph (a path or binary file object), or reuse the graph of an AnalysisSession"""
+        from common.analysis_session import AnalysisSession
+
+        self.session = session if session is not None else AnalysisSession(gml_path)
+        self.G = self.session.G
         
-        self.G.graph['topic_map'] = topic_map
-        self.G.graph['subfield_map'] = subfield_map
+        # Bidirectional label<->ID mapping and preprocessed topics and subfields
+        self.G.graph['label_to_id'] = self.session.label_to_id
+        self.G.graph['id_to_label'] = self.session.id_to_label
+        self.G.graph['topic_map'] = self.session.topic_map
+        self.G.graph['subfield_map'] = self.session.subfield_map
         
         # Initialize communities
         self.communities = self.detect_communities()
 
     def detect_communities(self):
         """Apply Louvain community detection and compute cluster topics."""
-        partition = community.best_partition(self.G)    
-        communities = {}
-        for node, comm in partition.items():
-            communities.setdefault(comm, []).append(node)
-        
-        # Compute cluster topics
-        cluster_topics = {}
-        for comm, nodes in communities.items():
-            topics = set()
-            for node in nodes:
-                topics.update(self.G.graph['topic_map'][node])
-            cluster_topics[comm] = topics
-        self.G.graph['partition'] = partition
-        self.G.graph['cluster_topics'] = cluster_topics
-        return communities
+        self.G.graph['partition'] = self.session.partition
+        self.G.graph['cluster_topics'] = self.session.cluster_topics
+        return self.session.communities
 
     def find_inter_cluster_gaps(self):
         """Identify gaps between communities with overlapping topics."""
@@ -186,7 +161,7 @@ class CoAuthorshipGapAnalyzer:
 
     def find_centrality_gaps(self, percentile=25):
         """Identify authors with low betweenness but multi-cluster topic overlap."""
-        betweenness = nx.betweenness_centrality(self.G)
+        betweenness = self.session.betweenness
         threshold = sorted(betweenness.values())[len(betweenness)*percentile//100]
         gaps = []
         
@@ -220,24 +195,18 @@ class CoAuthorshipGapAnalyzer:
                     })
         return gaps
 
-    def visualize_network(self, gaps, output_path):
-        """Visualize network with proper colormap usage and strategic labeling."""
-        plt.figure(figsize=(25, 25))
-        
-        # Create layout and community coloring
-        pos = nx.spring_layout(self.G, k=0.2, iterations=50)
-        partition = self.G.graph['partition']
-        
-        # Get colormap and generate colors
-        cmap = plt.colormaps['tab20']
-        num_colors = len(cmap.colors)  # Get number of colors in the colormap
-        node_colors = [cmap(partition[node] % num_colors) for node in self.G.nodes()]
-        
-        # Draw base network
-        nx.draw_networkx_nodes(self.G, pos, node_size=80, node_color=node_colors, alpha=0.8)
-        nx.draw_networkx_edges(self.G, pos, alpha=0.05)
-        
-        # Label important nodes
+    def node_key(self, node):
+        """Stable key of a node (its author ID) under which layouts are cached."""
+        return str(self.G.nodes[node].get('label', node))
+
+    def compute_layout(self, graph=None):
+        """Place communities first, then the authors within each community."""
+        from common import layout
+
+        return layout.community_layout(graph if graph is not None else self.G, self.G.graph['partition'])
+
+    def gap_label_nodes(self, gaps):
+        """Nodes of the authors named in the gaps: isolated and central authors, their suggested collaborators."""
         label_nodes = set()
         for gap in gaps:
             try:
@@ -269,40 +238,43 @@ class CoAuthorshipGapAnalyzer:
             except KeyError as e:
                 print(f"Warning: Missing mapping for {e}, skipping...")
         
-        # Clean and draw labels
-        label_nodes = {n for n in label_nodes if n is not None}
-        labels = {n: self.G.nodes[n]['label'] for n in label_nodes}
-        nx.draw_networkx_labels(self.G, pos, labels, 
-                              font_size=9, 
-                              font_weight='bold', 
-                              font_family='sans-serif',
-                              alpha=0.9,
-                              bbox=dict(facecolor='white', 
-                                      edgecolor='none', 
-                                      alpha=0.7,
-                                      boxstyle='round,pad=0.2'))
-        
-        # Highlight isolated nodes
-        isolated = [n for n in self.G.nodes() if self.G.degree(n) == 0]
-        nx.draw_networkx_nodes(self.G, pos, nodelist=isolated, 
-                              node_size=200, 
-                              node_color='red', 
-                              edgecolors='black',
-                              linewidths=2)
+        return {n for n in label_nodes if n is not None}
+
+    def visualize_network(self, gaps, output_path, pos=None):
+        """Visualize network with proper colormap usage and strategic labeling."""
+        from common import rendering
+
+        # Create layout and community coloring
+        if pos is None:
+            pos = self.compute_layout()
         
-        plt.title("Collaboration Network with Key Gaps Highlighted", fontsize=16)
-        plt.axis('off')
-        plt.savefig(output_path, bbox_inches='tight', dpi=300)
-        plt.close()
+        fig = rendering.draw_gap_network(self.G, pos, self.G.graph['partition'], self.gap_label_nodes(gaps))
+        rendering.save_figure(fig, output_path, bbox_inches='tight', dpi=300)
+
+    def export_webgl(self, gaps, pos, bucket_name, prefix):
+        """Write positions, edges, communities and gap flags as WebGL buffers under gs://bucket_name/prefix/."""
+        from common import webgl_export
+
+        return webgl_export.export_graph(self.G, pos, bucket_name, prefix,
+                                         partition=self.G.graph['partition'],
+                                         highlight=self.gap_label_nodes(gaps),
+                                         key=self.node_key)
 
     def analyze_all_gaps(self):
         """Run all gap detection algorithms and return combined results."""
+        detectors = [
+            self.find_inter_cluster_gaps,
+            self.find_isolated_authors,
+            self.find_topical_gaps,
+            self.find_underconnected_subfields,
+            self.find_centrality_gaps,
+        ]
         gaps = []
-        gaps += self.find_inter_cluster_gaps()
-        gaps += self.find_isolated_authors()
-        gaps += self.find_topical_gaps()
-        gaps += self.find_underconnected_subfields()
-        gaps += self.find_centrality_gaps()
+        for detector in detectors:
+            with telemetry.span(f"detector.{detector.__name__}") as attributes:
+                found = detector()
+                attributes["gaps"] = len(found)
+            gaps += found
         return gaps
 
 
@@ -319,39 +291,32 @@ class CloudGapAnalyzer:
         self.input_file_path = input_file_path
         self.source_bucket = source_bucket
         self.output_bucket = output_bucket
-        self.temp_input_file = None
-        
-    def download_input_file(self):
-        """Download the input GML file from Google Cloud Storage to a temp file."""
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.source_bucket)
-        blob = bucket.blob(self.input_file_path)
-        
-        # Create a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".gml")
-        self.temp_input_file = temp_file.name
-        temp_file.close()
-        
-        # Download the file
-        blob.download_to_filename(self.temp_input_file)
-        print(f"Downloaded gs://{self.source_bucket}/{self.input_file_path} to {self.temp_input_file}")
+
+    def analyze_gaps(self, session=None, timestamp=None):
+        """
+        Run the gap analysis and save results to GCS.
         
-        return self.temp_input_file
+        Args:
+            session: AnalysisSession of the input graph shared with other analyses; loaded here when omitted
+            timestamp: Timestamp used in the output names, shared by outputs emitted together
+        """
+        from common import layout
+        from common.analysis_session import AnalysisSession
 
-    def analyze_gaps(self):
-        """Run the gap analysis and save results to GCS."""
         print("Analyzing co-authorship gaps...")
         
-        # Initialize the analyzer with the downloaded graph
-        analyzer = CoAuthorshipGapAnalyzer(self.temp_input_file)
+        # Initialize the analyzer by streaming the graph from GCS
+        if session is None:
+            session = AnalysisSession.from_blob(self.source_bucket, self.input_file_path)
+        analyzer = CoAuthorshipGapAnalyzer(session=session)
         
         # Generate all gaps
         gaps = analyzer.analyze_all_gaps()
         
         # Create timestamp for file naming
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # Save results to JSON in a temporary file
+        # Serialize results to JSON
         json_data = {
             "generated_at": datetime.now().isoformat(),
             "analysis_type": "co_authorship_gap_analysis",
@@ -359,46 +324,57 @@ class CloudGapAnalyzer:
             "gaps": gaps
         }
         
-        # Create temp file for JSON results
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as temp_json:
-            temp_json_path = temp_json.name
-            json.dump(json_data, temp_json, indent=2)
-        
-        # Create temp file for visualization
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_viz:
-            temp_viz_path = temp_viz.name
-        
-        # Create visualization
-        analyzer.visualize_network(gaps, temp_viz_path)
-        
-        # Upload results to GCS
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.output_bucket)
-        
         # Determine output folder name from input file
         output_folder = os.path.basename(self.input_file_path).replace(".gml", "")
         
         # Upload JSON results
-        json_blob = bucket.blob(f"{output_folder}/gaps_{timestamp}.json")
-        json_blob.upload_from_filename(temp_json_path)
-        print(f"Results saved to gs://{self.output_bucket}/{output_folder}/gaps_{timestamp}.json")
-        
-        # Upload visualization
-        viz_blob = bucket.blob(f"{output_folder}/network_{timestamp}.png")
-        viz_blob.upload_from_filename(temp_viz_path)
-        print(f"Visualization saved to gs://{self.output_bucket}/{output_folder}/network_{timestamp}.png")
-        
-        # Clean up temporary files
-        os.remove(temp_json_path)
-        os.remove(temp_viz_path)
+        json_path = f"{output_folder}/gaps_{timestamp}.json"
+        with telemetry.span("upload_results"):
+            storage_backend.write_bytes(self.output_bucket, json_path, json.dumps(json_data, indent=2),
+                                        content_type="application/json")
+        print(f"Results saved to gs://{self.output_bucket}/{json_path}")
+        
+        viz_path = f"{output_folder}/network_{timestamp}.png"
+        webgl_prefix = f"{output_folder}/network_{timestamp}_webgl"
+        # Community layouts are cached apart from the co-authorship graph's force layout
+        layout_path = layout.layout_path_for(f"{output_folder}/{os.path.basename(self.input_file_path)}", "communities")
+        if render_queue.render_mode() == "queue":
+            # The worker reads the graph by author ID, so key the payload on those
+            with telemetry.span("enqueue_render"):
+                render_queue.enqueue_render(
+                    "gaps",
+                    output=render_queue.blob_ref(self.output_bucket, viz_path),
+                    graph=render_queue.blob_ref(self.source_bucket, self.input_file_path),
+                    layout=render_queue.blob_ref(self.output_bucket, layout_path),
+                    data=render_queue.blob_ref(self.output_bucket, json_path),
+                    partition={analyzer.node_key(n): c for n, c in analyzer.G.graph['partition'].items()},
+                    label_nodes=sorted(analyzer.node_key(n) for n in analyzer.gap_label_nodes(gaps)),
+                    options={"formats": EXPORT_FORMATS},
+                    webgl_prefix=webgl_prefix,
+                )
+            return len(gaps)
+        
+        # Reuse the community layout of an unchanged graph; any other graph is laid out afresh
+        pos = layout.cached_layout(analyzer.G, self.output_bucket, layout_path,
+                                   key=analyzer.node_key, compute=analyzer.compute_layout, warm=False)
+        
+        if "webgl" in EXPORT_FORMATS:
+            with telemetry.span("export_webgl"):
+                analyzer.export_webgl(gaps, pos, self.output_bucket, webgl_prefix)
+        
+        if "png" in EXPORT_FORMATS:
+            # Render the visualization into memory
+            with telemetry.span("render"):
+                viz_buffer = io.BytesIO()
+                analyzer.visualize_network(gaps, viz_buffer, pos)
+            
+            # Upload visualization
+            with telemetry.span("upload_visualization"):
+                storage_backend.write_bytes(self.output_bucket, viz_path, viz_buffer.getvalue(),
+                                            content_type="image/png")
+            print(f"Visualization saved to gs://{self.output_bucket}/{viz_path}")
         
         return len(gaps)
-        
-    def cleanup(self):
-        """Clean up temporary files."""
-        if self.temp_input_file and os.path.exists(self.temp_input_file):
-            os.remove(self.temp_input_file)
-            print(f"Deleted temporary input file {self.temp_input_file}")
 
 
 @functions_framework.cloud_event
@@ -419,29 +395,31 @@ def analyze_coauthorship_gaps(cloud_event):
         print(f"Skipping non-target file: gs://{bucket_name}/{file_path}")
         return
     
+    output_bucket = "gaps_analysis"
+
+    # Duplicate deliveries and re-uploads of unchanged content stop here, before any download
+    event = idempotency.check_event(data, output_bucket, "analyze_coauthorship_gaps", __file__)
+    if event is None:
+        return
+    
     print(f"Processing co-authorship gap analysis for: gs://{bucket_name}/{file_path}")
     
-    try:
-        # Initialize the cloud analyzer
-        analyzer = CloudGapAnalyzer(
-            input_file_path=file_path,
-            source_bucket=bucket_name,
-            output_bucket="gaps_analysis"
-        )
-        
-        # Download the input file
-        analyzer.download_input_file()
-        
-        # Run the analysis
-        num_gaps = analyzer.analyze_gaps()
-        
-        print(f"Analysis complete. Found {num_gaps} potential gaps in the collaboration network.")
-        
-    except Exception as e:
-        print(f"Error processing file: {e}")
-        raise
-        
-    finally:
-        # Clean up temporary files
-        if 'analyzer' in locals():
-            analyzer.cleanup()
\ No newline at end of file
+    with telemetry.run("analyze_coauthorship_gaps", bucket=bucket_name, name=file_path) as run:
+        try:
+            # Initialize the cloud analyzer
+            analyzer = CloudGapAnalyzer(
+                input_file_path=file_path,
+                source_bucket=bucket_name,
+                output_bucket=output_bucket
+            )
+        
+            # Run the analysis
+            num_gaps = analyzer.analyze_gaps()
+            run.attributes["gaps"] = num_gaps
+            event.mark_processed(gaps=num_gaps, run_id=run.run_id)
+        
+            print(f"Analysis complete. Found {num_gaps} potential gaps in the collaboration network.")
+        
+        except Exception as e:
+            print(f"Error processing file: {e}")
+            raise
@@ -0,0 +1,7 @@
+"""
+Helpers shared by the cloud functions.
+
+The package is copied next to each function's entry point when the function
+is deployed (see "sequence of commands.txt"), and put on sys.path by the
+local pipeline runner.
+"""
@@ -0,0 +1,152 @@
+"""
+Shared in-memory state of one co-authorship graph.
+
+The gap and collaboration analysers read the same co-authorship GML and
+derive overlapping structures from it. An AnalysisSession parses the graph
+once and computes each structure the first time an analyser asks for it:
+topic maps, topic hierarchies, degree and betweenness centrality, and the
+Louvain partition with its communities. Analysers built on the same session
+share all of them, so running both over one graph costs one download, one
+parse and one betweenness computation.
+"""
+from functools import cached_property
+from typing import TYPE_CHECKING, Dict, List, Set
+
+from common import storage_backend, telemetry
+
+# networkx and python-louvain are imported where they are used
+if TYPE_CHECKING:
+    import networkx as nx
+
+
+def topic_hierarchy(node_data: Dict) -> Dict[str, Set[str]]:
+    """Extract hierarchical topic information (domain, field and subfield names) from a node."""
+    hierarchy = {
+        "domain": set(),
+        "field": set(),
+        "subfield": set()
+    }
+
+    topics = node_data.get("topics")
+    if not isinstance(topics, list):
+        return hierarchy
+
+    for topic in topics:
+        if not isinstance(topic, dict):
+            continue
+        for level in ("domain", "field", "subfield"):
+            if level in topic and isinstance(topic[level], dict):
+                hierarchy[level].add(topic[level].get("display_name", "").lower())
+
+    return hierarchy
+
+
+class AnalysisSession:
+    def __init__(self, gml_file):
+        """
+        Parse a co-authorship graph for the analysers.
+
+        Args:
+            gml_file: Path or binary file object of the co-authorship GML
+        """
+        import networkx as nx
+
+        # Nodes are keyed by their GML id; the 'label' attribute holds the author ID
+        with telemetry.span("parse_graph"):
+            self.G = nx.read_gml(gml_file, label='id')
+
+        self.label_to_id = {}
+        for node in self.G.nodes():
+            label = self.G.nodes[node].get('label', str(node))
+            self.label_to_id[label] = node
+        self.id_to_label = {v: k for k, v in self.label_to_id.items()}
+
+    @classmethod
+    def from_blob(cls, bucket_name: str, blob_name: str) -> "AnalysisSession":
+        """Stream the graph from gs://bucket_name/blob_name and parse it."""
+        with storage_backend.open_blob(bucket_name, blob_name, "rb") as f:
+            session = cls(f)
+        print(f"Loaded gs://{bucket_name}/{blob_name}")
+        return session
+
+    def by_label(self, values: Dict) -> Dict:
+        """Re-key a per-node mapping by author ID."""
+        return {self.id_to_label[node]: value for node, value in values.items()}
+
+    @cached_property
+    def topic_map(self) -> Dict[int, Set[str]]:
+        """Topic IDs of every author."""
+        return {
+            node: {topic['id'] for topic in self.G.nodes[node].get('topics', []) if 'id' in topic}
+            for node in self.G.nodes()
+        }
+
+    @cached_property
+    def subfield_map(self) -> Dict[int, Set[str]]:
+        """Subfield names of every author."""
+        return {
+            node: {topic['subfield']['display_name'] for topic in self.G.nodes[node].get('topics', [])
+                   if 'subfield' in topic}
+            for node in self.G.nodes()
+        }
+
+    @cached_property
+    def topic_hierarchies(self) -> Dict[int, Dict[str, Set[str]]]:
+        """Domain, field and subfield names of every author."""
+        return {node: topic_hierarchy(self.G.nodes[node]) for node in self.G.nodes()}
+
+    @cached_property
+    def degree_centrality(self) -> Dict[int, float]:
+        import networkx as nx
+
+        return nx.degree_centrality(self.G)
+
+    @cached_property
+    def betweenness(self) -> Dict[int, float]:
+        import networkx as nx
+
+        with telemetry.span("betweenness", nodes=self.G.number_of_nodes()):
+            return nx.betweenness_centrality(self.G)
+
+    @cached_property
+    def partition(self) -> Dict[int, int]:
+        """Louvain community of every author."""
+        import community
+
+        with telemetry.span("detect_communities", nodes=self.G.number_of_nodes()) as attributes:
+            partition = community.best_partition(self.G)
+            attributes["communities"] = len(set(partition.values()))
+        return partition
+
+    @cached_property
+    def communities(self) -> Dict[int, List[int]]:
+        """Authors of every community."""
+        communities = {}
+        for node, comm in self.partition.items():
+            communities.setdefault(comm, []).append(node)
+        return communities
+
+    @cached_property
+    def cluster_topics(self) -> Dict[int, Set[str]]:
+        """Union of the topic IDs of every community."""
+        cluster_topics = {}
+        for comm, nodes in self.communities.items():
+            topics = set()
+            for node in nodes:
+                topics.update(self.topic_map[node])
+            cluster_topics[comm] = topics
+        return cluster_topics
+
+    @cached_property
+    def author_graph(self) -> "nx.Graph":
+        """
+        The graph keyed by author ID, as read_gml returns it with the default label.
+
+        The copy shares the node attributes' values with the session graph.
+        """
+        import networkx as nx
+
+        graph = nx.relabel_nodes(self.G, self.id_to_label, copy=True)
+        for node in graph.nodes():
+            graph.nodes[node].pop('label', None)
+        return graph
@@ -0,0 +1,189 @@
+"""
+Append-only checkpoint log for long API enrichment loops.
+
+Loops that call OpenAlex once per paper or author record each result in a
+log under gs://<bucket>/<prefix>/. GCS objects cannot be appended to, so
+results are buffered and written as a new NDJSON segment every
+CHECKPOINT_EVERY records or CHECKPOINT_SECONDS seconds; a log is the
+concatenation of its segments in name order. When an invocation times out,
+only the results since the last segment are lost: the next invocation reads
+the segments back and continues with the IDs that are not logged yet.
+
+ENRICHMENT_TIME_BUDGET (seconds, unset for no limit) bounds how long one
+invocation enriches. Once it is spent, expired() turns true, the loop
+stops and the caller raises EnrichmentIncomplete, so the job is spread over
+several bounded invocations (retries of the same event) instead of running
+into the function timeout. Logs holding more than COMPACT_SEGMENTS segments
+are rewritten as one when loaded.
+
+A log belongs to one build (e.g. enrichment/<build>/paper_authors), so it
+only replays results of the same job, and is discarded once the build's
+output is saved. Compaction writes the merged segment before deleting the
+segments it read, and a reader that finds a segment gone lists the log
+again, so concurrent invocations of the same build can share it.
+"""
+import json
+import os
+import time
+import uuid
+from typing import Dict, Iterator, List
+
+from common import storage_backend, telemetry
+
+CHECKPOINT_EVERY = int(os.environ.get("ENRICHMENT_CHECKPOINT_EVERY", "500"))
+CHECKPOINT_SECONDS = float(os.environ.get("ENRICHMENT_CHECKPOINT_SECONDS", "30"))
+COMPACT_SEGMENTS = int(os.environ.get("ENRICHMENT_COMPACT_SEGMENTS", "50"))
+
+
+def time_budget() -> float:
+    """Seconds one invocation may spend enriching, or None for no limit."""
+    budget = os.environ.get("ENRICHMENT_TIME_BUDGET")
+    return float(budget) if budget else None
+
+
+class EnrichmentIncomplete(Exception):
+    """Raised when the time budget ran out before every ID was enriched; the logged results are kept."""
+
+
+class EnrichmentLog:
+    def __init__(self, bucket_name: str, prefix: str, started: float = None):
+        """
+        Open the log under gs://bucket_name/prefix/ and read back the results it holds.
+
+        Args:
+            bucket_name: Bucket holding the log segments
+            prefix: Folder of the log, e.g. 'enrichment/paper_authors'
+            started: time.monotonic() at which the invocation's time budget started; now when omitted
+        """
+        self.bucket_name = bucket_name
+        self.prefix = prefix.rstrip("/")
+        self.started = time.monotonic() if started is None else started
+        self.budget = time_budget()
+        self.results: Dict[str, object] = {}
+        self.pending: List[dict] = []
+        self.segments: List[str] = []  # Segments read or written by this instance
+        self.last_flush = time.monotonic()
+        self.load()
+
+    def _segment_name(self) -> str:
+        # Nanosecond timestamps keep segments in write order; the suffix separates concurrent writers
+        return f"{self.prefix}/{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.ndjson"
+
+    def _read_segment(self, name: str) -> Iterator[dict]:
+        for line in storage_backend.read_bytes(self.bucket_name, name).decode("utf-8").splitlines():
+            if line.strip():
+                yield json.loads(line)
+
+    def load(self):
+        """Read every segment; later entries for an ID replace earlier ones."""
+        with telemetry.span("load_enrichment_log", prefix=self.prefix):
+            while True:
+                self.segments = _segment_names(self.bucket_name, self.prefix)
+                results = {}
+                try:
+                    for name in self.segments:
+                        for entry in self._read_segment(name):
+                            results[entry["id"]] = entry["result"]
+                    break
+                except storage_backend.NotFound:
+                    # Compacted or discarded by another invocation; a compacted copy was written first
+                    telemetry.count("enrichment_log.relists")
+            self.results.update(results)
+        if self.segments:
+            print(f"Resuming from {len(self.results)} results logged in gs://{self.bucket_name}/{self.prefix}/")
+        if len(self.segments) > COMPACT_SEGMENTS:
+            self.compact()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.results
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def get(self, key: str, default=None):
+        return self.results.get(key, default)
+
+    def record(self, key: str, result):
+        """Log the result of one ID, writing a segment when enough results or time have accumulated."""
+        self.results[key] = result
+        self.pending.append({"id": key, "result": result})
+        if len(self.pending) >= CHECKPOINT_EVERY or time.monotonic() - self.last_flush >= CHECKPOINT_SECONDS:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered results as a new segment."""
+        self.last_flush = time.monotonic()
+        if not self.pending:
+            return
+        name = self._segment_name()
+        storage_backend.write_bytes(self.bucket_name, name,
+                                    "".join(json.dumps(entry) + "\n" for entry in self.pending),
+                                    content_type="application/x-ndjson")
+        telemetry.count("enrichment_log.records", len(self.pending))
+        self.segments.append(name)
+        self.pending = []
+
+    def expired(self) -> bool:
+        """True once the invocation's time budget is spent."""
+        return self.budget is not None and time.monotonic() - self.started >= self.budget
+
+    def compact(self):
+        """
+        Rewrite the segments read so far as a single segment.
+
+        The merged segment is written before any segment is deleted, and only
+        segments this instance read or wrote are deleted, so segments written
+        concurrently by other invocations survive.
+        """
+        self.flush()
+        old_segments = self.segments
+        self.pending = [{"id": key, "result": result} for key, result in self.results.items()]
+        self.segments = []
+        self.flush()
+        self._delete(old_segments)
+        print(f"Compacted {len(old_segments)} segments of gs://{self.bucket_name}/{self.prefix}/")
+
+    def clear(self):
+        """
+        Delete the segments this instance read or wrote, once their results are persisted elsewhere.
+
+        Segments written concurrently by other invocations are left in place.
+        """
+        self.flush()
+        self._delete(self.segments)
+        self.segments = []
+
+    def _delete(self, names: List[str]):
+        _delete_blobs(self.bucket_name, names)
+
+    def __enter__(self) -> "EnrichmentLog":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Results logged before an error or an expired budget are kept for the next invocation
+        self.flush()
+
+
+def _segment_names(bucket_name: str, prefix: str) -> List[str]:
+    blobs = storage_backend.get_client().list_blobs(bucket_name, prefix=f"{prefix}/")
+    return sorted(blob.name for blob in blobs if blob.name.endswith(".ndjson"))
+
+
+def _delete_blobs(bucket_name: str, names: List[str]):
+    bucket = storage_backend.get_client().bucket(bucket_name)
+    for name in names:
+        blob = bucket.get_blob(name)
+        if blob is None:
+            continue
+        try:
+            blob.delete()
+        except storage_backend.NotFound:
+            pass  # Deleted concurrently
+
+
+def discard(bucket_name: str, prefix: str):
+    """Delete every segment under prefix, e.g. the logs of a build whose output is saved."""
+    names = _segment_names(bucket_name, prefix.rstrip("/"))
+    _delete_blobs(bucket_name, names)
+    if names:
+        print(f"Discarded {len(names)} enrichment log segments under gs://{bucket_name}/{prefix}/")
@@ -0,0 +1,157 @@
+"""
+Idempotency manifest for GCS-triggered functions.
+
+Storage events are delivered at least once, and a re-upload of an
+unchanged file fires a new one. Before downloading its input a function
+looks the object up in a manifest in its output bucket,
+idempotency/<function>.json, which maps bucket/name to the generation and
+MD5 hash last analysed and the code version that analysed them. An event
+for the same generation, or for a new generation with the same content, is
+a duplicate and costs one manifest read (plus a metadata lookup when the
+event carries no generation or hash).
+
+Records are added only after the analysis succeeded, so failed invocations
+are retried normally. Manifest updates are conditional on the generation
+that was read, so concurrent invocations do not drop each other's records.
+IDEMPOTENCY_CHECK=0 disables the check.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from common import storage_backend, telemetry
+
+MANIFEST_PREFIX = "idempotency"
+MAX_UPDATE_ATTEMPTS = 5
+
+
+def enabled() -> bool:
+    return os.environ.get("IDEMPOTENCY_CHECK", "1") != "0"
+
+
+def code_version(source_path: str) -> str:
+    """Deployed revision, or the hash of the function's source when run outside Cloud Functions."""
+    revision = os.environ.get("K_REVISION") or os.environ.get("X_GOOGLE_FUNCTION_VERSION")
+    if revision:
+        return revision
+    with open(source_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class ProcessedEvents:
+    def __init__(self, bucket_name: str, function_name: str, version: str):
+        """
+        Manifest of the input objects a function has already analysed.
+
+        Args:
+            bucket_name: Bucket holding the manifest (the function's output bucket)
+            function_name: Name of the function, used in the manifest path
+            version: Code version; records written by other versions do not count as processed
+        """
+        self.bucket_name = bucket_name
+        self.manifest_path = f"{MANIFEST_PREFIX}/{function_name}.json"
+        self.version = version
+
+    @staticmethod
+    def identify(event_data: dict) -> dict:
+        """
+        Bucket, name, generation and MD5 hash of the object an event refers to.
+
+        GCS events carry generation and md5Hash; other callers only pass
+        bucket and name, in which case the blob metadata is looked up.
+        Returns None when the object no longer exists.
+        """
+        identity = {
+            "bucket": event_data["bucket"],
+            "name": event_data["name"],
+            "generation": event_data.get("generation"),
+            "md5": event_data.get("md5Hash"),
+        }
+        if identity["generation"] is None or identity["md5"] is None:
+            blob = storage_backend.get_client().bucket(identity["bucket"]).get_blob(identity["name"])
+            if blob is None:
+                return None
+            identity["generation"] = blob.generation
+            identity["md5"] = blob.md5_hash
+        identity["generation"] = str(identity["generation"])
+        return identity
+
+    @staticmethod
+    def _key(identity: dict) -> str:
+        return f"{identity['bucket']}/{identity['name']}"
+
+    def _load(self):
+        """Return the manifest and the generation it was read at (0 when it does not exist yet)."""
+        blob = storage_backend.get_client().bucket(self.bucket_name).get_blob(self.manifest_path)
+        if blob is None:
+            return {"objects": {}}, 0
+        return json.loads(blob.download_as_bytes()), blob.generation
+
+    def is_processed(self, identity: dict) -> bool:
+        """True when this generation, or identical content, was already analysed by this code version."""
+        record = self._load()[0]["objects"].get(self._key(identity))
+        if not record or record.get("version") != self.version:
+            return False
+        return record["generation"] == identity["generation"] or (
+            identity["md5"] is not None and record.get("md5") == identity["md5"])
+
+    def mark_processed(self, identity: dict, **details):
+        """Record a successful analysis of the object, retrying when another invocation updated the manifest."""
+        for attempt in range(MAX_UPDATE_ATTEMPTS):
+            manifest, generation = self._load()
+            manifest["objects"][self._key(identity)] = {
+                "generation": identity["generation"],
+                "md5": identity["md5"],
+                "version": self.version,
+                "processed_at": datetime.now().isoformat(),
+                **details,
+            }
+            try:
+                storage_backend.write_bytes(self.bucket_name, self.manifest_path, json.dumps(manifest, indent=2),
+                                            content_type="application/json", if_generation_match=generation)
+                return
+            except storage_backend.PreconditionFailed:
+                print(f"Manifest gs://{self.bucket_name}/{self.manifest_path} changed, retrying ({attempt + 1})")
+        print(f"Could not record gs://{self._key(identity)} in the idempotency manifest")
+
+
+class PendingEvent:
+    """An event that has to be processed; mark_processed() records it once the analysis succeeded."""
+
+    def __init__(self, ledger: ProcessedEvents = None, identity: dict = None):
+        self.ledger = ledger
+        self.identity = identity
+
+    def mark_processed(self, **details):
+        if self.ledger is not None:
+            self.ledger.mark_processed(self.identity, **details)
+
+
+def check_event(event_data: dict, output_bucket: str, function_name: str, source_path: str):
+    """
+    Look an event up before any download.
+
+    Args:
+        event_data: Data of the storage event
+        output_bucket: Bucket the function writes its results (and the manifest) to
+        function_name: Name of the function, used in the manifest path
+        source_path: Source file of the function, hashed as its code version outside Cloud Functions
+
+    Returns:
+        A PendingEvent, or None when the event is a duplicate or its object is gone
+    """
+    if not enabled():
+        return PendingEvent()
+
+    ledger = ProcessedEvents(output_bucket, function_name, code_version(source_path))
+    identity = ledger.identify(event_data)
+    if identity is None:
+        print(f"Skipping event for missing object: gs://{event_data['bucket']}/{event_data['name']}")
+        return None
+    if ledger.is_processed(identity):
+        telemetry.count("idempotency.duplicates")
+        print(f"Skipping already analysed object: gs://{identity['bucket']}/{identity['name']} "
+              f"(generation {identity['generation']})")
+        return None
+    return PendingEvent(ledger, identity)
@@ -0,0 +1,297 @@
+"""
+Force-directed graph layouts for the visualization paths.
+
+force_layout is a Fruchterman-Reingold layout on sparse adjacency matrices:
+attraction is evaluated per edge and repulsion per node pair for small
+graphs, or against the mass centroids of a uniform grid once the graph has
+more than EXACT_REPULSION_LIMIT nodes. An iteration therefore costs
+O(edges + nodes * cells) instead of nx.spring_layout's O(nodes^2).
+community_layout places communities first and then lays out each community
+on its own, which keeps large clustered graphs readable.
+
+Positions are cached next to the graph they belong to (layout_path_for) and
+keyed on stable node keys. cached_layout reuses them when the graph is
+unchanged and warm-starts from them when only a few nodes were added, so
+a small update costs a handful of low-temperature iterations. Views laid
+out with another algorithm keep their own cache (layout_path_for's kind)
+and turn warm starts off, so their figures never depend on which layout
+happened to be cached first.
+"""
+import hashlib
+import json
+from typing import Callable, Dict, Hashable, List
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+
+EXACT_REPULSION_LIMIT = 2000
+MAX_GRID_SIZE = 32
+NODE_CHUNK_SIZE = 1024
+
+# Share of unseen nodes up to which a cached layout is refined instead of recomputed
+WARM_START_MAX_NEW = 0.2
+WARM_START_ITERATIONS = 15
+WARM_START_TEMPERATURE = 0.02
+
+
+def _repulsion_from(pos: np.ndarray, sources: np.ndarray, mass: np.ndarray, k: float) -> np.ndarray:
+    """
+    Repulsion k^2 * mass / d on every position from every (weighted) source,
+    evaluated in row chunks to bound memory.
+    """
+    disp = np.empty_like(pos)
+    sx, sy = sources[:, 0], sources[:, 1]
+    for start in range(0, len(pos), NODE_CHUNK_SIZE):
+        x = pos[start:start + NODE_CHUNK_SIZE, 0:1]
+        y = pos[start:start + NODE_CHUNK_SIZE, 1:2]
+        dx, dy = x - sx, y - sy
+        # sum(w * (p - s)) = p * sum(w) - w @ s
+        w = (k * k) * mass / np.maximum(dx * dx + dy * dy, 1e-4)
+        total = w.sum(axis=1, keepdims=True)
+        disp[start:start + NODE_CHUNK_SIZE] = np.hstack([x * total - w @ sx[:, None], y * total - w @ sy[:, None]])
+    return disp
+
+
+def _repulsion_exact(pos: np.ndarray, k: float) -> np.ndarray:
+    """Pairwise repulsion between all nodes (a node exerts no force on itself)."""
+    return _repulsion_from(pos, pos, np.ones(len(pos)), k)
+
+
+def _repulsion_grid(pos: np.ndarray, k: float) -> np.ndarray:
+    """Repulsion from the mass centroids of a uniform grid, excluding each node itself."""
+    n = len(pos)
+    grid_size = int(np.clip(np.sqrt(n / 10), 4, MAX_GRID_SIZE))
+    low = pos.min(axis=0)
+    span = np.maximum(pos.max(axis=0) - low, 1e-9)
+    cells_xy = np.minimum((grid_size * (pos - low) / span).astype(np.int64), grid_size - 1)
+    cell_of = cells_xy[:, 0] * grid_size + cells_xy[:, 1]
+
+    _, cell_index = np.unique(cell_of, return_inverse=True)
+    mass = np.bincount(cell_index).astype(float)
+    centroids = np.stack([
+        np.bincount(cell_index, weights=pos[:, 0]),
+        np.bincount(cell_index, weights=pos[:, 1]),
+    ], axis=1) / mass[:, None]
+
+    # Contributions of all cells, then the own cell is swapped for one without the node
+    disp = _repulsion_from(pos, centroids, mass, k)
+
+    own_mass = mass[cell_index]
+    own_delta = pos - centroids[cell_index]
+    disp -= own_delta * (own_mass * k * k / np.maximum((own_delta ** 2).sum(axis=1), 1e-4))[:, None]
+
+    rest = own_mass - 1
+    rest_centroid = (centroids[cell_index] * own_mass[:, None] - pos) / np.maximum(rest, 1)[:, None]
+    rest_delta = pos - rest_centroid
+    disp += rest_delta * (rest * k * k / np.maximum((rest_delta ** 2).sum(axis=1), 1e-4))[:, None]
+    return disp
+
+
+def force_layout(graph: nx.Graph, initial: Dict[Hashable, np.ndarray] = None, iterations: int = 50,
+                 seed: int = 42, weight: str = "weight", temperature: float = 0.1) -> Dict[Hashable, np.ndarray]:
+    """
+    Compute a Fruchterman-Reingold layout.
+
+    Args:
+        graph: Graph to lay out; directed graphs are treated as undirected
+        initial: Starting positions for some or all nodes; the rest start at random
+        iterations: Number of force iterations
+        seed: Seed for the random starting positions
+        weight: Edge attribute scaling attraction, missing values count as 1
+        temperature: Largest step a node may take in the first iteration
+
+    Returns:
+        Dictionary mapping each node to an (x, y) array
+    """
+    nodes = list(graph.nodes())
+    n = len(nodes)
+    if n == 0:
+        return {}
+    if n == 1:
+        return {nodes[0]: np.zeros(2)}
+
+    rng = np.random.default_rng(seed)
+    pos = rng.random((n, 2))
+    if initial:
+        for i, node in enumerate(nodes):
+            if node in initial:
+                pos[i] = initial[node]
+
+    adjacency = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=weight, format="coo")
+    adjacency = sparse.coo_array(adjacency + adjacency.T)
+    rows, cols, weights = adjacency.row, adjacency.col, adjacency.data.astype(float)
+
+    k = np.sqrt(1.0 / n) * max(np.ptp(pos, axis=0).max(), 1.0)
+    repulsion = _repulsion_exact if n <= EXACT_REPULSION_LIMIT else _repulsion_grid
+    step = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        disp = repulsion(pos, k)
+
+        # Attraction d^2 / k along every edge (each undirected edge appears in both directions)
+        delta = pos[rows] - pos[cols]
+        dist = np.sqrt(np.maximum((delta ** 2).sum(axis=1), 1e-4))
+        pull = delta * (weights * dist / k)[:, None]
+        disp[:, 0] -= np.bincount(rows, weights=pull[:, 0], minlength=n)
+        disp[:, 1] -= np.bincount(rows, weights=pull[:, 1], minlength=n)
+
+        # Move every node by at most the current temperature
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= step
+
+    return dict(zip(nodes, pos))
+
+
+def community_layout(graph: nx.Graph, partition: Dict[Hashable, int], iterations: int = 50,
+                     seed: int = 42) -> Dict[Hashable, np.ndarray]:
+    """
+    Lay out communities relative to each other, then every community on its own.
+
+    Args:
+        graph: Graph to lay out
+        partition: Community number of each node, e.g. from community.best_partition
+        iterations: Number of force iterations per layout
+        seed: Seed for the random starting positions
+
+    Returns:
+        Dictionary mapping each node to an (x, y) array
+    """
+    members: Dict[int, List[Hashable]] = {}
+    for node in graph.nodes():
+        members.setdefault(partition.get(node, -1), []).append(node)
+
+    # Quotient graph whose edge weights count the links between communities
+    quotient = nx.Graph()
+    quotient.add_nodes_from(members)
+    for u, v in graph.edges():
+        cu, cv = partition.get(u, -1), partition.get(v, -1)
+        if cu != cv:
+            previous = quotient.get_edge_data(cu, cv, {"weight": 0})["weight"]
+            quotient.add_edge(cu, cv, weight=previous + 1)
+
+    centers = force_layout(quotient, iterations=iterations, seed=seed)
+    spread = np.sqrt(len(members))
+    largest = max(len(nodes) for nodes in members.values())
+
+    pos = {}
+    for comm, nodes in members.items():
+        local = force_layout(graph.subgraph(nodes), iterations=iterations, seed=seed)
+        coords = np.array(list(local.values()))
+        coords -= coords.mean(axis=0)
+        radius = np.abs(coords).max() or 1.0
+        scale = 0.4 * np.sqrt(len(nodes) / largest) / radius
+        for node, xy in zip(local, coords):
+            pos[node] = centers[comm] * spread + xy * scale
+    return pos
+
+
+def layout_path_for(graph_path: str, kind: str = None) -> str:
+    """Blob name of the cached layout belonging to a graph blob; kind names layouts of another algorithm."""
+    base = graph_path[:-4] if graph_path.endswith(".gml") else graph_path
+    return f"{base}.{kind}.layout.json" if kind else f"{base}.layout.json"
+
+
+def graph_fingerprint(graph: nx.Graph, key: Callable[[Hashable], str] = str, weight: str = "weight") -> str:
+    """Hash of the node keys, edges and edge weights; equal fingerprints share a layout."""
+    digest = hashlib.sha256()
+    for node_key in sorted(key(node) for node in graph.nodes()):
+        digest.update(node_key.encode("utf-8") + b"\0")
+    edges = sorted(
+        tuple(sorted((key(u), key(v)))) + (float(data.get(weight, 1)),)
+        for u, v, data in graph.edges(data=True)
+    )
+    for u, v, w in edges:
+        digest.update(f"{u}\0{v}\0{w}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def positions_to_dict(graph: nx.Graph, pos: Dict[Hashable, np.ndarray], key: Callable[[Hashable], str] = str) -> dict:
+    """Serializable form of a layout, keyed on stable node keys."""
+    return {
+        "fingerprint": graph_fingerprint(graph, key),
+        "positions": {key(node): [round(float(x), 6), round(float(y), 6)] for node, (x, y) in pos.items()},
+    }
+
+
+def warm_start_layout(graph: nx.Graph, cached: dict, key: Callable[[Hashable], str] = str,
+                      compute: Callable[[nx.Graph], Dict[Hashable, np.ndarray]] = None, warm: bool = True):
+    """
+    Derive a layout from cached positions.
+
+    Unchanged graphs reuse the cached positions as they are. When at most
+    WARM_START_MAX_NEW of the nodes are unseen, new nodes start at the mean
+    of their placed neighbours and the layout is refined for a few
+    low-temperature iterations. Otherwise, or when warm is False, the
+    layout is recomputed.
+
+    Returns:
+        (positions, how) where how is "reused", "warm" or "computed"
+    """
+    compute = compute or force_layout
+    if not cached:
+        return compute(graph), "computed"
+
+    known = cached.get("positions", {})
+    if cached.get("fingerprint") == graph_fingerprint(graph, key):
+        return {node: np.array(known[key(node)]) for node in graph.nodes()}, "reused"
+
+    if not warm:
+        return compute(graph), "computed"
+
+    initial = {node: np.array(known[key(node)]) for node in graph.nodes() if key(node) in known}
+    unseen = [node for node in graph.nodes() if node not in initial]
+    if not initial or len(unseen) > WARM_START_MAX_NEW * graph.number_of_nodes():
+        return compute(graph), "computed"
+
+    rng = np.random.default_rng(0)
+    coords = np.array(list(initial.values()))
+    low, high = coords.min(axis=0), coords.max(axis=0)
+    jitter = 0.01 * max(np.ptp(coords, axis=0).max(), 1e-3)
+    for node in unseen:
+        placed = [initial[nb] for nb in nx.all_neighbors(graph, node) if nb in initial]
+        start = np.mean(placed, axis=0) if placed else rng.uniform(low, high)
+        initial[node] = start + rng.normal(0, jitter, 2)
+
+    pos = force_layout(graph, initial=initial, iterations=WARM_START_ITERATIONS,
+                       temperature=WARM_START_TEMPERATURE * max(np.ptp(coords, axis=0).max(), 1e-3))
+    return pos, "warm"
+
+
+def cached_layout(graph: nx.Graph, bucket_name: str, layout_path: str, previous_path: str = None,
+                  key: Callable[[Hashable], str] = str, save: bool = True,
+                  compute: Callable[[nx.Graph], Dict[Hashable, np.ndarray]] = None,
+                  warm: bool = True) -> Dict[Hashable, np.ndarray]:
+    """
+    Return a layout for the graph, reusing or warm-starting from cached positions.
+
+    Args:
+        graph: Graph to lay out
+        bucket_name: Bucket holding the cached layout
+        layout_path: Blob of the graph's cached layout
+        previous_path: Blob of an earlier version's layout to warm-start from
+        key: Maps a node to the stable key positions are stored under
+        save: Write the resulting layout to layout_path
+        compute: Full layout used when the cache cannot be used, default force_layout
+        warm: Refine cached positions of a slightly changed graph; when False only an unchanged graph reuses them
+    """
+    from common import storage_backend, telemetry
+
+    cached, cached_path = None, None
+    for path in (layout_path, previous_path):
+        if path and storage_backend.get_blob(bucket_name, path).exists():
+            with storage_backend.open_blob(bucket_name, path, "rb") as f:
+                cached, cached_path = json.load(f), path
+            break
+
+    with telemetry.span("layout", nodes=graph.number_of_nodes()) as attributes:
+        pos, how = warm_start_layout(graph, cached, key, compute, warm)
+        attributes["how"] = how
+    telemetry.count(f"layout_cache.{'hits' if how == 'reused' else 'misses'}")
+    print(f"Layout for {graph.number_of_nodes()} nodes {how}")
+
+    if save and (how != "reused" or cached_path != layout_path):
+        storage_backend.write_bytes(bucket_name, layout_path, json.dumps(positions_to_dict(graph, pos, key)),
+                                    content_type="application/json")
+    return pos
@@ -0,0 +1,239 @@
+"""
+Chunked, compressed storage for raw OpenAlex works.
+
+Instead of one JSON document, works are written as compressed NDJSON chunks
+of RAW_CHUNK_RECORDS records, next to a small index:
+
+    <prefix>/<content hash>/chunk-00000.ndjson.gz
+    <prefix>/<content hash>/chunk-00001.ndjson.gz
+    <prefix>/index.json
+
+The index lists every chunk with its record offset and count, the first,
+last, smallest and largest work ID it holds, its compressed and raw sizes
+and its SHA-256, plus the non-result keys of the API response (e.g. meta).
+Chunks keep the order of the works, so a reader that concatenates them sees
+the original results; it can also stream them one at a time, parse them in
+parallel, or read only the chunks whose ID range may hold the works it
+looks up. The index is written last and chunk folders are named after
+their content, so readers never see a partial write and rewriting
+unchanged works leaves every blob identical.
+
+Chunks are gzip-compressed; RAW_COMPRESSION=zstd uses zstandard instead.
+zstandard is optional (it is not in the functions' requirements): without
+it writers fall back to gzip, and the index records the compression the
+chunks actually use. Readers given the name of the legacy document
+(e.g. openalex_works.json) use the chunked copy when it exists.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List
+
+from common import storage_backend, telemetry
+
+FORMAT_VERSION = 1
+CHUNK_RECORDS = int(os.environ.get("RAW_CHUNK_RECORDS", "5000"))
+COMPRESSION = os.environ.get("RAW_COMPRESSION", "gzip")
+READ_WORKERS = 8
+
+SUFFIXES = {"gzip": ".ndjson.gz", "zstd": ".ndjson.zst"}
+
+
+def prefix_for(blob_name: str) -> str:
+    """Prefix of the chunked copy of a legacy JSON document, e.g. openalex_works.json -> openalex_works."""
+    return blob_name[:-len(".json")] if blob_name.endswith(".json") else blob_name
+
+
+def index_blob(prefix: str) -> str:
+    return f"{prefix}/index.json"
+
+
+def _zstandard():
+    """The zstandard module, or None when it is not installed."""
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def _available_compression(compression: str) -> str:
+    """The requested compression, or gzip when it is zstd and zstandard is missing."""
+    if compression == "zstd" and _zstandard() is None:
+        print("zstandard is not installed, compressing raw chunks with gzip instead")
+        return "gzip"
+    return compression
+
+
+def _compress(data: bytes, compression: str) -> bytes:
+    if compression == "zstd":
+        return _zstandard().ZstdCompressor(level=3).compress(data)
+    # A fixed mtime keeps the bytes of identical chunks identical
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def _decompressing_reader(stream, compression: str):
+    if compression == "zstd":
+        zstandard = _zstandard()
+        if zstandard is None:
+            raise RuntimeError("These chunks are zstd-compressed; reading them requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(stream)
+    return gzip.GzipFile(fileobj=stream, mode="rb")
+
+
+def _id_range(records: List[dict]) -> dict:
+    ids = [record.get("id") or "" for record in records]
+    return {"first_id": ids[0], "last_id": ids[-1], "min_id": min(ids), "max_id": max(ids)}
+
+
+def write_works(bucket_name: str, prefix: str, works_data: dict, chunk_records: int = None,
+                compression: str = None) -> dict:
+    """
+    Write works as compressed NDJSON chunks and their index.
+
+    Args:
+        bucket_name: Destination bucket
+        prefix: Folder of the chunks and the index, e.g. 'openalex_works'
+        works_data: Works in the {"results": [...]} shape of an OpenAlex response
+        chunk_records: Records per chunk; RAW_CHUNK_RECORDS when omitted
+        compression: 'gzip' or 'zstd'; RAW_COMPRESSION when omitted. zstd falls back
+            to gzip when zstandard is not installed
+
+    Returns:
+        The index
+    """
+    chunk_records = chunk_records or CHUNK_RECORDS
+    compression = compression or COMPRESSION
+    if compression not in SUFFIXES:
+        raise ValueError(f"Compression must be one of {sorted(SUFFIXES)}, not {compression!r}")
+    compression = _available_compression(compression)
+
+    results = works_data.get("results", [])
+    batches = [results[i:i + chunk_records] for i in range(0, len(results), chunk_records)]
+
+    def encode(batch):
+        raw = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch).encode("utf-8")
+        return raw, _compress(raw, compression)
+
+    with telemetry.span("compress_chunks", chunks=len(batches), compression=compression):
+        # zlib and zstd release the GIL, so chunks compress in parallel
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+            encoded = list(executor.map(encode, batches))
+
+    chunks = []
+    offset = 0
+    for number, (batch, (raw, compressed)) in enumerate(zip(batches, encoded)):
+        chunks.append({
+            "number": number,
+            "record_offset": offset,
+            "records": len(batch),
+            **_id_range(batch),
+            "bytes": len(compressed),
+            "raw_bytes": len(raw),
+            "sha256": hashlib.sha256(compressed).hexdigest(),
+        })
+        offset += len(batch)
+
+    content_hash = hashlib.sha256("".join(chunk["sha256"] for chunk in chunks).encode()).hexdigest()[:16]
+    for chunk in chunks:
+        chunk["name"] = f"{prefix}/{content_hash}/chunk-{chunk['number']:05d}{SUFFIXES[compression]}"
+
+    with telemetry.span("upload_chunks", chunks=len(chunks)):
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+            list(executor.map(lambda item: storage_backend.write_bytes(
+                bucket_name, item[0]["name"], item[1][1], content_type="application/octet-stream"),
+                zip(chunks, encoded)))
+
+    index = {
+        "format_version": FORMAT_VERSION,
+        "compression": compression,
+        "record_count": offset,
+        "bytes": sum(chunk["bytes"] for chunk in chunks),
+        "raw_bytes": sum(chunk["raw_bytes"] for chunk in chunks),
+        "response": {key: value for key, value in works_data.items() if key != "results"},
+        "chunks": chunks,
+    }
+    previous = read_index(bucket_name, prefix)
+    # Readers switch to the new chunks only once all of them exist
+    storage_backend.write_bytes(bucket_name, index_blob(prefix), json.dumps(index, indent=2),
+                                content_type="application/json")
+
+    # Chunks of the replaced version are no longer referenced
+    if previous is not None:
+        current = {chunk["name"] for chunk in chunks}
+        bucket = storage_backend.get_client().bucket(bucket_name)
+        for chunk in previous["chunks"]:
+            if chunk["name"] not in current:
+                blob = bucket.get_blob(chunk["name"])
+                if blob is not None:
+                    blob.delete()
+
+    print(f"Wrote {offset} works to gs://{bucket_name}/{prefix}/ in {len(chunks)} {compression} chunks "
+          f"({index['bytes']} bytes, {index['raw_bytes']} uncompressed)")
+    return index
+
+
+def read_index(bucket_name: str, prefix: str) -> dict:
+    """Index of a chunked copy, or None when there is none."""
+    blob = storage_backend.get_client().bucket(bucket_name).get_blob(index_blob(prefix))
+    if blob is None:
+        return None
+    return json.loads(blob.download_as_bytes())
+
+
+def iter_chunk(bucket_name: str, chunk: dict, compression: str) -> Iterator[dict]:
+    """Stream the records of one chunk."""
+    with storage_backend.open_blob(bucket_name, chunk["name"], "rb") as f, \
+            io.TextIOWrapper(_decompressing_reader(f, compression), encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_works(bucket_name: str, prefix: str, index: dict = None) -> Iterator[dict]:
+    """Stream every work in order, holding one chunk's buffer at a time."""
+    index = index or read_index(bucket_name, prefix)
+    for chunk in index["chunks"]:
+        yield from iter_chunk(bucket_name, chunk, index["compression"])
+
+
+def _read_chunks(bucket_name: str, chunks: List[dict], compression: str, workers: int = None) -> List[List[dict]]:
+    with ThreadPoolExecutor(max_workers=workers or READ_WORKERS) as executor:
+        return list(executor.map(lambda chunk: list(iter_chunk(bucket_name, chunk, compression)), chunks))
+
+
+def load_works(bucket_name: str, blob_name: str, workers: int = None) -> dict:
+    """
+    Read works in the {"results": [...]} shape of an OpenAlex response.
+
+    Args:
+        bucket_name: Bucket holding the works
+        blob_name: Legacy document name (e.g. 'openalex_works.json') or chunk prefix;
+            the chunked copy is read when it exists, the document otherwise
+        workers: Chunks downloaded and parsed concurrently
+
+    Returns:
+        The works, in their original order
+    """
+    index = read_index(bucket_name, prefix_for(blob_name))
+    if index is None:
+        with storage_backend.open_blob(bucket_name, blob_name, "rb") as f:
+            return json.load(f)
+
+    with telemetry.span("load_raw_chunks", chunks=len(index["chunks"]), records=index["record_count"]):
+        results = [record for batch in _read_chunks(bucket_name, index["chunks"], index["compression"], workers)
+                   for record in batch]
+    return {**index["response"], "results": results}
+
+
+def lookup_works(bucket_name: str, prefix: str, work_ids: Iterable[str]) -> Dict[str, dict]:
+    """Works with the given IDs, reading only the chunks whose ID range may contain them."""
+    index = read_index(bucket_name, prefix)
+    wanted = set(work_ids)
+    chunks = [chunk for chunk in index["chunks"]
+              if any(chunk["min_id"] <= work_id <= chunk["max_id"] for work_id in wanted)]
+    return {record["id"]: record for batch in _read_chunks(bucket_name, chunks, index["compression"])
+            for record in batch if record.get("id") in wanted}
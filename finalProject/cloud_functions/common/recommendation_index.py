@@ -0,0 +1,296 @@
+"""
+Prebuilt indexes for on-demand collaborator and topic queries.
+
+The collaboration analysis writes, next to its results, flat little-endian
+arrays under gs://<bucket>/index/<graph>/<version>/:
+
+    centrality.f32                combined degree/betweenness score per author
+    neighbors.indptr.u32          CSR row offsets of the co-author lists
+    neighbors.u32                 co-author indices
+    author_topics.indptr.u32      CSR row offsets of the topics of every author
+    author_topics.u32             topic indices
+    topic_authors.indptr.u32      CSR row offsets of the author postings of every topic
+    topic_authors.u32             author indices, most central first
+    authors.json                  author ID, institution and publication count in index order
+    topics.json                   topic ID and display name in index order
+    manifest.json                 counts and the list of arrays
+
+index/<graph>/latest.json, written last, points at the newest version. The
+query function downloads a version once per instance and memory-maps the
+arrays, so a query touches only the rows it needs. Local copies are
+assembled in a temporary directory and renamed into place under the
+generation of their manifest, so files another reader has mapped are never
+overwritten, not even when a version is rebuilt under the same name.
+"""
+import json
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List
+
+from common import storage_backend
+
+# numpy is imported where it is used
+if TYPE_CHECKING:
+    import numpy as np
+
+    from common.analysis_session import AnalysisSession
+
+FORMAT_VERSION = 1
+INDEX_PREFIX = "index"
+INDEX_CACHE_DIR = os.environ.get("INDEX_CACHE_DIR", "/tmp/recommendation_index")
+QUERY_CACHE_SIZE = int(os.environ.get("INDEX_QUERY_CACHE_SIZE", "4096"))
+
+ARRAYS = {
+    "centrality": ("centrality.f32", "<f4"),
+    "neighbors_indptr": ("neighbors.indptr.u32", "<u4"),
+    "neighbors": ("neighbors.u32", "<u4"),
+    "author_topics_indptr": ("author_topics.indptr.u32", "<u4"),
+    "author_topics": ("author_topics.u32", "<u4"),
+    "topic_authors_indptr": ("topic_authors.indptr.u32", "<u4"),
+    "topic_authors": ("topic_authors.u32", "<u4"),
+}
+
+
+def index_prefix(graph_name: str) -> str:
+    return f"{INDEX_PREFIX}/{graph_name}"
+
+
+def _csr(rows: List[List[int]]):
+    import numpy as np
+
+    indptr = np.zeros(len(rows) + 1, dtype="<u4")
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    indices = np.fromiter((i for row in rows for i in row), dtype="<u4", count=int(indptr[-1]))
+    return indptr, indices
+
+
+def build_index(session: "AnalysisSession", bucket_name: str, graph_name: str, version: str = None) -> str:
+    """
+    Write the query indexes of a co-authorship graph to gs://bucket_name/index/graph_name/version/.
+
+    Args:
+        session: Loaded co-authorship graph
+        bucket_name: Destination bucket
+        graph_name: Name of the graph, e.g. 'co_authorship_graph'
+        version: Folder of this build; a timestamp when omitted
+
+    Returns:
+        Blob name of the version's manifest
+    """
+    import numpy as np
+
+    G = session.G
+    version = version or datetime.now().strftime("%Y%m%d_%H%M%S")
+    prefix = f"{index_prefix(graph_name)}/{version}"
+
+    nodes = list(G.nodes())
+    position = {node: i for i, node in enumerate(nodes)}
+
+    # Same weighting as CollaborationAnalyzer.analyze_network_structure
+    centrality = np.array([0.6 * session.degree_centrality.get(node, 0) + 0.4 * session.betweenness.get(node, 0)
+                           for node in nodes], dtype="<f4")
+
+    topics = {}
+    for node in nodes:
+        for topic in G.nodes[node].get("topics", []):
+            if "id" in topic:
+                topics.setdefault(topic["id"], topic.get("display_name", topic["id"]))
+    topic_position = {topic_id: i for i, topic_id in enumerate(topics)}
+
+    author_topics = [sorted(topic_position[topic_id] for topic_id in session.topic_map[node]) for node in nodes]
+    topic_authors = [[] for _ in topics]
+    for i, row in enumerate(author_topics):
+        for t in row:
+            topic_authors[t].append(i)
+    # Postings are ordered most central first, so top authors of a topic are a prefix
+    topic_authors = [sorted(row, key=lambda i: -centrality[i]) for row in topic_authors]
+    neighbors = [sorted(position[other] for other in G.neighbors(node)) for node in nodes]
+
+    arrays = {"centrality": centrality}
+    arrays["neighbors_indptr"], arrays["neighbors"] = _csr(neighbors)
+    arrays["author_topics_indptr"], arrays["author_topics"] = _csr(author_topics)
+    arrays["topic_authors_indptr"], arrays["topic_authors"] = _csr(topic_authors)
+
+    for name, array in arrays.items():
+        filename, dtype = ARRAYS[name]
+        storage_backend.write_bytes(bucket_name, f"{prefix}/{filename}", array.astype(dtype, copy=False).tobytes(),
+                                    content_type="application/octet-stream")
+
+    authors = [{"id": G.nodes[node].get("label", str(node)),
+                "institution": G.nodes[node].get("institution", "Unknown"),
+                "pub_count": G.nodes[node].get("pub_count", 0)} for node in nodes]
+    storage_backend.write_bytes(bucket_name, f"{prefix}/authors.json", json.dumps(authors),
+                                content_type="application/json")
+    storage_backend.write_bytes(bucket_name, f"{prefix}/topics.json",
+                                json.dumps([{"id": topic_id, "display_name": name} for topic_id, name in topics.items()]),
+                                content_type="application/json")
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "generated_at": datetime.now().isoformat(),
+        "version": version,
+        "author_count": len(nodes),
+        "topic_count": len(topics),
+        "byte_order": "little",
+        "arrays": {name: filename for name, (filename, _) in ARRAYS.items()},
+    }
+    manifest_path = f"{prefix}/manifest.json"
+    storage_backend.write_bytes(bucket_name, manifest_path, json.dumps(manifest, indent=2),
+                                content_type="application/json")
+
+    # Readers switch to the new version only once all of its files exist
+    storage_backend.write_bytes(bucket_name, f"{index_prefix(graph_name)}/latest.json",
+                                json.dumps({"version": version, "manifest": manifest_path}),
+                                content_type="application/json")
+    print(f"Query index saved to gs://{bucket_name}/{manifest_path}")
+    return manifest_path
+
+
+def latest_version(bucket_name: str, graph_name: str) -> str:
+    """Version the latest.json pointer of a graph names."""
+    return json.loads(storage_backend.read_bytes(bucket_name, f"{index_prefix(graph_name)}/latest.json"))["version"]
+
+
+class RecommendationIndex:
+    def __init__(self, directory: str):
+        """
+        Memory-map an index version downloaded to a local directory.
+
+        Args:
+            directory: Local copy of gs://<bucket>/index/<graph>/<version>/
+        """
+        import numpy as np
+
+        with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        with open(os.path.join(directory, "authors.json"), "r", encoding="utf-8") as f:
+            self.authors = json.load(f)
+        with open(os.path.join(directory, "topics.json"), "r", encoding="utf-8") as f:
+            self.topics = json.load(f)
+        self.version = self.manifest["version"]
+
+        for name, (filename, dtype) in ARRAYS.items():
+            path = os.path.join(directory, filename)
+            # np.memmap cannot map empty files
+            array = np.memmap(path, dtype=dtype, mode="r") if os.path.getsize(path) else np.zeros(0, dtype=dtype)
+            setattr(self, name, array)
+
+        self.author_position = {author["id"]: i for i, author in enumerate(self.authors)}
+        # Topics are looked up by full ID, short ID (e.g. T10803) or display name
+        self.topic_position = {}
+        for i, topic in enumerate(self.topics):
+            for key in (topic["id"], topic["id"].rsplit("/", 1)[-1], topic["display_name"]):
+                self.topic_position.setdefault(key.lower(), i)
+
+        # Per-instance caches, dropped with the index when a new version is loaded
+        self.recommend_collaborators = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._recommend_collaborators)
+        self.top_authors = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._top_authors)
+
+    @classmethod
+    def download(cls, bucket_name: str, graph_name: str, version: str) -> "RecommendationIndex":
+        """Download an index version to INDEX_CACHE_DIR, unless already there, and memory-map it."""
+        prefix = f"{index_prefix(graph_name)}/{version}"
+        manifest = storage_backend.get_blob(bucket_name, f"{prefix}/manifest.json")
+        manifest.reload()
+        directory = os.path.join(INDEX_CACHE_DIR, graph_name, version, str(manifest.generation))
+        if os.path.isdir(directory):
+            return cls(directory)
+
+        # Only complete copies are renamed into place, and a directory in place is never written again
+        parent = os.path.dirname(directory)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".download-", dir=parent)
+        try:
+            for filename in [filename for filename, _ in ARRAYS.values()] + ["authors.json", "topics.json"]:
+                storage_backend.get_blob(bucket_name, f"{prefix}/{filename}").download_to_filename(
+                    os.path.join(staging, filename))
+            manifest.download_to_filename(os.path.join(staging, "manifest.json"))
+            os.rename(staging, directory)
+        except OSError:
+            # Another process renamed its copy into place first
+            if not os.path.isdir(directory):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return cls(directory)
+
+    @staticmethod
+    def _row(indptr: "np.ndarray", indices: "np.ndarray", i: int) -> "np.ndarray":
+        return indices[indptr[i]:indptr[i + 1]]
+
+    def _topic_names(self, topic_indices) -> List[str]:
+        return [self.topics[t]["display_name"] for t in topic_indices]
+
+    def _recommend_collaborators(self, author_id: str, k: int = 10) -> List[Dict]:
+        """
+        Authors sharing topics with author_id who are not yet co-authors, best first.
+
+        Candidates are scored like the batch recommendations, without the random
+        noise: 0.7 * topic Jaccard similarity + 0.3 * mean centrality of the pair.
+        """
+        import numpy as np
+
+        author = self.author_position[author_id]
+        topics = self._row(self.author_topics_indptr, self.author_topics, author)
+        if not len(topics):
+            return []
+
+        postings = [self._row(self.topic_authors_indptr, self.topic_authors, t) for t in topics]
+        candidates, shared = np.unique(np.concatenate(postings), return_counts=True)
+
+        excluded = np.isin(candidates, self._row(self.neighbors_indptr, self.neighbors, author)) | (candidates == author)
+        candidates, shared = candidates[~excluded], shared[~excluded]
+        if not len(candidates):
+            return []
+
+        topic_counts = np.diff(self.author_topics_indptr)[candidates]
+        similarity = shared / (len(topics) + topic_counts - shared)
+        network_score = (self.centrality[candidates] + self.centrality[author]) / 2
+        scores = 0.7 * similarity + 0.3 * network_score
+
+        top = np.argsort(-scores, kind="stable")[:k]
+        author_topics = set(topics.tolist())
+        recommendations = []
+        for i in top:
+            candidate = int(candidates[i])
+            shared_topics = author_topics.intersection(
+                self._row(self.author_topics_indptr, self.author_topics, candidate).tolist())
+            recommendations.append({
+                **self.authors[candidate],
+                "topic_similarity_score": round(float(similarity[i]), 3),
+                "network_score": round(float(network_score[i]), 3),
+                "combined_score": round(float(scores[i]), 3),
+                "shared_topics": self._topic_names(sorted(shared_topics)),
+            })
+        return recommendations
+
+    def _top_authors(self, topic: str, k: int = 10) -> List[Dict]:
+        """The k most central authors working on a topic."""
+        t = self.topic_position[topic.lower()]
+        return [{**self.authors[i], "centrality": round(float(self.centrality[i]), 6)}
+                for i in self._row(self.topic_authors_indptr, self.topic_authors, t)[:k].tolist()]
+
+    def topic(self, topic: str) -> Dict:
+        return self.topics[self.topic_position[topic.lower()]]
+
+
+class IndexCache:
+    """Most recently used index versions of an instance, shared by warm invocations."""
+
+    def __init__(self, max_versions: int = 2):
+        self.max_versions = max_versions
+        self.indexes = OrderedDict()
+
+    def get(self, bucket_name: str, graph_name: str, version: str) -> RecommendationIndex:
+        key = (bucket_name, graph_name, version)
+        if key in self.indexes:
+            self.indexes.move_to_end(key)
+        else:
+            self.indexes[key] = RecommendationIndex.download(bucket_name, graph_name, version)
+            while len(self.indexes) > self.max_versions:
+                self.indexes.popitem(last=False)
+        return self.indexes[key]
@@ -0,0 +1,78 @@
+"""
+Queue of visualization jobs processed by the render_worker function.
+
+With RENDER_MODE=queue (the default) the analysis functions publish their
+JSON results and only enqueue a render job: a small JSON blob under jobs/ in
+RENDER_JOBS_BUCKET naming the graph, layout and data blobs, the output PNG
+and the level-of-detail options. The render worker is triggered by the job
+blob, writes a low-dpi preview followed by the full PNG, and moves the job to
+done/. RENDER_MODE=inline renders inside the analysis function as before.
+"""
+import json
+import os
+import uuid
+from datetime import datetime
+
+from common import storage_backend
+
+RENDER_JOBS_BUCKET = os.environ.get("RENDER_JOBS_BUCKET", "serverlessfinalproject-render-jobs")
+JOBS_PREFIX = "jobs/"
+DONE_PREFIX = "done/"
+FAILED_PREFIX = "failed/"
+
+# Level of detail applied by the worker unless a job overrides it
+DEFAULT_OPTIONS = {
+    "dpi": int(os.environ.get("RENDER_DPI", 300)),
+    "preview_dpi": int(os.environ.get("RENDER_PREVIEW_DPI", 72)),
+    "max_nodes": int(os.environ.get("RENDER_MAX_NODES", 20000)),
+    "top_k_labels": int(os.environ.get("RENDER_TOP_K_LABELS", 100)),
+}
+
+
+def render_mode() -> str:
+    """'queue' to hand rendering to the worker, 'inline' to render in the analysis function."""
+    return os.environ.get("RENDER_MODE", "queue")
+
+
+def blob_ref(bucket_name: str, blob_name: str) -> dict:
+    return {"bucket": bucket_name, "name": blob_name}
+
+
+def preview_path(output_path: str) -> str:
+    """Blob name of the low-dpi preview written before the full PNG."""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}_preview{ext or '.png'}"
+
+
+def enqueue_render(kind: str, output: dict, graph: dict = None, layout: dict = None, data: dict = None,
+                   options: dict = None, **payload) -> str:
+    """
+    Write a render job and return its blob name.
+
+    Args:
+        kind: Renderer to use: 'coauthorship', 'gaps' or 'collaboration'
+        output: Blob reference of the PNG to write
+        graph: Blob reference of the GML graph to draw
+        layout: Blob reference of cached positions to reuse
+        data: Blob reference of the analysis results to draw
+        options: Level-of-detail overrides of DEFAULT_OPTIONS
+        **payload: Small renderer-specific values stored in the job (labels, partition, ...)
+    """
+    created = datetime.now()
+    job_id = f"{created.strftime('%Y%m%d_%H%M%S_%f')}_{uuid.uuid4().hex[:8]}"
+    job = {
+        "job_id": job_id,
+        "kind": kind,
+        "created_at": created.isoformat(),
+        "output": output,
+        "graph": graph,
+        "layout": layout,
+        "data": data,
+        "options": {**DEFAULT_OPTIONS, **(options or {})},
+        **payload,
+    }
+
+    job_path = f"{JOBS_PREFIX}{kind}/{job_id}.json"
+    storage_backend.write_bytes(RENDER_JOBS_BUCKET, job_path, json.dumps(job), content_type="application/json")
+    print(f"Render job queued at gs://{RENDER_JOBS_BUCKET}/{job_path}")
+    return job_path
@@ -0,0 +1,202 @@
+"""
+Matplotlib renderers shared by the analysis functions and the render worker.
+
+Each draw_* function returns a figure; figure_to_png rasterizes it. The
+level-of-detail options bound the cost on large graphs:
+
+    max_nodes     draw only the highest-degree nodes (plus highlighted ones)
+    top_k_labels  label at most this many nodes
+    dpi           resolution of the final PNG
+    preview_dpi   resolution of the quick preview rendered first (0 disables it)
+
+None means "no limit", which reproduces the full-detail plots. Matplotlib is
+imported on the first draw, so callers that only need the helpers (top_k,
+lod_subgraph) do not pay for it.
+"""
+import io
+from typing import Callable, Dict, Hashable, Iterable, List
+
+import networkx as nx
+import numpy as np
+
+FULL_DETAIL = {"dpi": 300, "preview_dpi": 0, "max_nodes": None, "top_k_labels": None}
+
+
+def _pyplot():
+    """Import pyplot with the non-interactive Agg backend."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def lod_subgraph(graph: nx.Graph, max_nodes: int = None, keep: Iterable[Hashable] = ()) -> nx.Graph:
+    """Induced subgraph of the max_nodes highest-degree nodes, always including `keep`."""
+    if not max_nodes or graph.number_of_nodes() <= max_nodes:
+        return graph
+
+    keep = [node for node in keep if node in graph]
+    degrees = np.fromiter((degree for _, degree in graph.degree()), dtype=float, count=graph.number_of_nodes())
+    nodes = list(graph.nodes())
+    budget = max(max_nodes - len(keep), 0)
+    top = [nodes[i] for i in np.argsort(-degrees, kind="stable")[:budget]]
+    return graph.subgraph(set(top) | set(keep))
+
+
+def top_k(nodes: Iterable[Hashable], score: Callable[[Hashable], float], k: int = None) -> List[Hashable]:
+    """The k best-scoring nodes, or all of them when k is None."""
+    ranked = sorted(nodes, key=score, reverse=True)
+    return ranked if k is None else ranked[:k]
+
+
+def save_figure(fig, output, **savefig_kwargs):
+    """Save a figure to a path or file object and close it."""
+    fig.savefig(output, **savefig_kwargs)
+    _pyplot().close(fig)
+
+
+def figure_to_png(fig, dpi: int, bbox_inches: str = "tight") -> bytes:
+    """Rasterize a figure into PNG bytes and close it."""
+    buffer = io.BytesIO()
+    save_figure(fig, buffer, format="png", dpi=dpi, bbox_inches=bbox_inches)
+    return buffer.getvalue()
+
+
+def draw_coauthorship_network(graph: nx.Graph, pos: Dict, names: Dict[Hashable, str] = None,
+                              options: dict = None):
+    """
+    Co-authorship network: node size by publication count, edge width by collaboration weight.
+
+    Args:
+        graph: Co-authorship graph with 'pub_count' node and 'weight' edge attributes
+        pos: Node positions
+        names: Display names of the nodes to label; defaults to authors with more than 5 publications
+        options: Level-of-detail options, see module docstring
+    """
+    plt = _pyplot()
+    options = {**FULL_DETAIL, **(options or {})}
+
+    if names is None:
+        names = {node: graph.nodes[node].get("label", str(node))
+                 for node in graph.nodes() if graph.nodes[node].get("pub_count", 0) > 5}
+    labelled = top_k(names, lambda node: graph.nodes[node].get("pub_count", 0) if node in graph else 0,
+                     options["top_k_labels"])
+    graph = lod_subgraph(graph, options["max_nodes"], keep=labelled)
+
+    fig = plt.figure(figsize=(15, 10))
+
+    # Calculate node sizes based on publication count
+    node_sizes = [graph.nodes[node].get("pub_count", 1) * 100 for node in graph.nodes()]
+
+    # Calculate edge widths based on collaboration weight
+    edge_widths = [graph.edges[edge].get("weight", 1) for edge in graph.edges()]
+
+    # Draw the network
+    nx.draw_networkx_nodes(graph, pos, node_size=node_sizes, node_color="lightblue", alpha=0.6)
+    nx.draw_networkx_edges(graph, pos, width=edge_widths, alpha=0.5, edge_color="gray")
+
+    # Add labels for larger nodes only (more publications)
+    nx.draw_networkx_labels(graph, pos, {node: names[node] for node in labelled if node in graph}, font_size=8)
+
+    plt.title("Co-authorship Network")
+    plt.axis("off")
+    return fig
+
+
+def draw_gap_network(graph: nx.Graph, pos: Dict, partition: Dict[Hashable, int],
+                     label_nodes: Iterable[Hashable] = (), labels: Dict[Hashable, str] = None,
+                     options: dict = None):
+    """
+    Collaboration network coloured by community, with gap-related authors labelled
+    and isolated authors highlighted.
+
+    Args:
+        graph: Co-authorship graph
+        pos: Node positions
+        partition: Community number of each node
+        label_nodes: Nodes involved in the detected gaps
+        labels: Text per labelled node, defaults to the node's 'label' attribute
+        options: Level-of-detail options, see module docstring
+    """
+    plt = _pyplot()
+    options = {**FULL_DETAIL, **(options or {})}
+
+    label_nodes = top_k({node for node in label_nodes if node in graph}, graph.degree, options["top_k_labels"])
+    isolated = [node for node in graph.nodes() if graph.degree(node) == 0]
+    graph = lod_subgraph(graph, options["max_nodes"], keep=label_nodes)
+    isolated = [node for node in isolated if node in graph]
+
+    fig = plt.figure(figsize=(25, 25))
+
+    # Get colormap and generate colors
+    cmap = plt.colormaps['tab20']
+    num_colors = len(cmap.colors)  # Get number of colors in the colormap
+    node_colors = [cmap(partition.get(node, 0) % num_colors) for node in graph.nodes()]
+
+    # Draw base network
+    nx.draw_networkx_nodes(graph, pos, node_size=80, node_color=node_colors, alpha=0.8)
+    nx.draw_networkx_edges(graph, pos, alpha=0.05)
+
+    # Draw labels of the gap-related authors
+    if labels is None:
+        labels = {node: graph.nodes[node].get('label', str(node)) for node in label_nodes}
+    nx.draw_networkx_labels(graph, pos, {node: labels.get(node, str(node)) for node in label_nodes},
+                            font_size=9,
+                            font_weight='bold',
+                            font_family='sans-serif',
+                            alpha=0.9,
+                            bbox=dict(facecolor='white',
+                                      edgecolor='none',
+                                      alpha=0.7,
+                                      boxstyle='round,pad=0.2'))
+
+    # Highlight isolated nodes
+    nx.draw_networkx_nodes(graph, pos, nodelist=isolated,
+                           node_size=200,
+                           node_color='red',
+                           edgecolors='black',
+                           linewidths=2)
+
+    plt.title("Collaboration Network with Key Gaps Highlighted", fontsize=16)
+    plt.axis('off')
+    return fig
+
+
+def draw_collaboration_scores(potential_pairs: List[Dict], options: dict = None):
+    """
+    Scatter plot of topic similarity against network score for recommended pairs.
+
+    Args:
+        potential_pairs: Recommendations with topic_similarity_score, network_score and combined_score
+        options: Level-of-detail options; max_nodes caps the number of plotted pairs
+    """
+    plt = _pyplot()
+    options = {**FULL_DETAIL, **(options or {})}
+
+    # Pairs are sorted by combined score, so a cap keeps the strongest ones
+    if options["max_nodes"]:
+        potential_pairs = potential_pairs[:options["max_nodes"]]
+
+    fig = plt.figure(figsize=(12, 8))
+
+    # Create a scatter plot of topic similarity vs network score
+    similarities = [pair["topic_similarity_score"] for pair in potential_pairs]
+    network_scores = [pair["network_score"] for pair in potential_pairs]
+    combined_scores = [pair["combined_score"] for pair in potential_pairs]
+
+    plt.scatter(similarities, network_scores, c=combined_scores,
+                cmap='viridis', alpha=0.6)
+
+    plt.colorbar(label='Combined Score')
+    plt.xlabel('Topic Similarity Score')
+    plt.ylabel('Network Score')
+    plt.title('Potential Collaborations Analysis')
+
+    # Add a trend line
+    if len(set(similarities)) > 1:
+        z = np.polyfit(similarities, network_scores, 1)
+        p = np.poly1d(z)
+        plt.plot(similarities, p(similarities), "r--", alpha=0.8)
+
+    plt.tight_layout()
+    return fig
@@ -0,0 +1,380 @@
+"""
+Storage backend shared by the cloud functions.
+
+By default functions talk to Google Cloud Storage. Setting
+STORAGE_BACKEND=local makes them read and write a directory tree instead,
+laid out as LOCAL_STORAGE_ROOT/<bucket>/<blob>, so the whole pipeline can run
+without network access. Both backends expose the google-cloud-storage
+Client/Bucket/Blob API, and one client per backend is pooled for the
+lifetime of the instance so warm invocations skip the auth handshake.
+
+Use open_blob for streaming reads and writes, and write_bytes for payloads
+that may be large: above COMPOSITE_THRESHOLD they are uploaded as parallel
+parts and composed server-side. Bytes moved through these helpers are counted
+in the current telemetry run.
+"""
+import hashlib
+import io
+import math
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from common import telemetry
+
+
+class _LocalPreconditionFailed(Exception):
+    """Raised when an if_generation_match precondition does not hold."""
+
+
+def __getattr__(name):
+    # google.api_core is only imported once a caller needs its exception type
+    if name == "PreconditionFailed":
+        return _precondition_failed()
+    if name == "NotFound":
+        return _not_found()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _precondition_failed():
+    """The exception GCS raises for a failed precondition, or a stand-in without google-cloud-storage."""
+    try:
+        from google.api_core.exceptions import PreconditionFailed
+        return PreconditionFailed
+    except ImportError:
+        return _LocalPreconditionFailed
+
+
+def _not_found():
+    """The exception GCS raises for a missing blob; local blobs raise FileNotFoundError."""
+    if os.environ.get("STORAGE_BACKEND") == "local":
+        return FileNotFoundError
+    try:
+        from google.api_core.exceptions import NotFound
+        return NotFound
+    except ImportError:
+        return FileNotFoundError
+
+
+# Parallel composite upload settings
+COMPOSITE_THRESHOLD = int(os.environ.get("STORAGE_COMPOSITE_THRESHOLD", 64 * 1024 * 1024))
+COMPOSITE_MIN_PART_SIZE = 16 * 1024 * 1024
+COMPOSITE_MAX_PARTS = 32  # GCS compose accepts at most 32 sources
+COMPOSITE_WORKERS = 8
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client():
+    """Return the pooled storage client for the configured backend."""
+    backend = os.environ.get("STORAGE_BACKEND", "gcs")
+    key = (backend, os.environ.get("LOCAL_STORAGE_ROOT", "local_buckets") if backend == "local" else None)
+
+    with _clients_lock:
+        if key not in _clients:
+            if backend == "local":
+                _clients[key] = LocalClient(key[1])
+            else:
+                from google.cloud import storage
+                _clients[key] = storage.Client()
+        return _clients[key]
+
+
+def get_blob(bucket_name: str, blob_name: str):
+    """Return a blob handle of the configured backend."""
+    return get_client().bucket(bucket_name).blob(blob_name)
+
+
+class _CountingStream(io.RawIOBase):
+    """Raw stream over a blob file object that counts the bytes passing through it."""
+
+    def __init__(self, stream, counter: str):
+        self._stream = stream
+        self._counter = counter
+
+    def readable(self) -> bool:
+        return self._stream.readable()
+
+    def writable(self) -> bool:
+        return self._stream.writable()
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        telemetry.count(self._counter, len(data))
+        return len(data)
+
+    def write(self, data) -> int:
+        written = self._stream.write(data)
+        telemetry.count(self._counter, len(data) if written is None else written)
+        return len(data) if written is None else written
+
+    def close(self):
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+def open_blob(bucket_name: str, blob_name: str, mode: str = "rb", content_type: str = None):
+    """Open a blob as a streaming file object ('r', 'rb', 'w' or 'wb')."""
+    blob = get_blob(bucket_name, blob_name)
+    binary_mode = mode.replace("b", "") + "b"
+    if "w" in mode and content_type:
+        stream = blob.open(binary_mode, content_type=content_type)
+    else:
+        stream = blob.open(binary_mode)
+
+    if "w" in mode:
+        telemetry.count("storage.writes")
+        stream = io.BufferedWriter(_CountingStream(stream, "storage.bytes_written"))
+    else:
+        telemetry.count("storage.reads")
+        stream = io.BufferedReader(_CountingStream(stream, "storage.bytes_read"))
+    return stream if "b" in mode else io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def read_bytes(bucket_name: str, blob_name: str) -> bytes:
+    """Download a whole blob into memory."""
+    data = get_blob(bucket_name, blob_name).download_as_bytes()
+    telemetry.count("storage.reads")
+    telemetry.count("storage.bytes_read", len(data))
+    return data
+
+
+def write_bytes(bucket_name: str, blob_name: str, data, content_type: str = None, if_generation_match=None):
+    """
+    Upload an in-memory payload.
+
+    Payloads of at least COMPOSITE_THRESHOLD bytes are split into parts that
+    are uploaded concurrently and composed into the destination blob.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    telemetry.count("storage.writes")
+    telemetry.count("storage.bytes_written", len(data))
+
+    blob = get_blob(bucket_name, blob_name)
+    if len(data) < COMPOSITE_THRESHOLD or if_generation_match is not None:
+        blob.upload_from_string(data, content_type=content_type, if_generation_match=if_generation_match)
+        return blob
+
+    part_size = max(COMPOSITE_MIN_PART_SIZE, math.ceil(len(data) / COMPOSITE_MAX_PARTS))
+    bucket = get_client().bucket(bucket_name)
+    parts = [bucket.blob(f"{blob_name}.part-{i:04d}") for i in range(math.ceil(len(data) / part_size))]
+
+    def upload_part(index):
+        view = memoryview(data)[index * part_size:(index + 1) * part_size]
+        parts[index].upload_from_file(io.BytesIO(view), content_type=content_type)
+
+    try:
+        with ThreadPoolExecutor(max_workers=COMPOSITE_WORKERS) as executor:
+            list(executor.map(upload_part, range(len(parts))))
+        blob.content_type = content_type
+        blob.compose(parts)
+    finally:
+        for part in parts:
+            try:
+                part.delete()
+            except Exception as e:
+                print(f"Could not delete composite part {part.name}: {e}")
+
+    return blob
+
+
+_local_thread_lock = threading.Lock()
+
+
+@contextmanager
+def _local_write_lock(root: str):
+    """Exclusive lock over conditional writes under a local root, across threads and processes."""
+    import fcntl
+
+    os.makedirs(root, exist_ok=True)
+    with _local_thread_lock, open(os.path.join(root, ".conditional-writes.lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class _LocalWriter(io.BufferedWriter):
+    """Buffered writer that moves its temp file over the blob path on close."""
+
+    def __init__(self, blob: "LocalBlob"):
+        os.makedirs(os.path.dirname(blob.path), exist_ok=True)
+        self._blob = blob
+        self._temp_path = f"{blob.path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        super().__init__(io.FileIO(self._temp_path, "w"))
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        previous = self._blob._current_generation()
+        os.replace(self._temp_path, self._blob.path)
+
+        # The generation is the mtime, which the kernel only advances once per clock tick;
+        # every write must change it, or a stale if_generation_match would still hold
+        if previous is not None:
+            stat = os.stat(self._blob.path)
+            if stat.st_mtime_ns <= previous:
+                os.utime(self._blob.path, ns=(stat.st_atime_ns, previous + 1))
+        self._blob._generation = self._blob._current_generation()
+
+
+class LocalBlob:
+    """A file under LOCAL_STORAGE_ROOT exposing the subset of the GCS Blob API the functions use."""
+
+    def __init__(self, bucket: "LocalBucket", name: str):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.path, name)
+        self.content_type = None
+        self._generation = None  # Generation as of the last metadata load, download or upload
+
+    def _current_generation(self) -> int:
+        return os.stat(self.path).st_mtime_ns if os.path.exists(self.path) else None
+
+    @property
+    def generation(self) -> int:
+        """
+        Generation (mtime_ns) as of the last get_blob, reload, download or upload,
+        like a GCS Blob's metadata; a handle that loaded none reads it from the file.
+        """
+        return self._generation if self._generation is not None else self._current_generation()
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else None
+
+    @property
+    def md5_hash(self) -> str:
+        if not os.path.exists(self.path):
+            return None
+        digest = hashlib.md5()
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def reload(self):
+        if not self.exists():
+            raise FileNotFoundError(self.path)
+        self._generation = self._current_generation()
+
+    def open(self, mode: str = "r", content_type: str = None, encoding: str = "utf-8", **kwargs):
+        if mode in ("r", "rb"):
+            return open(self.path, mode, **({} if mode == "rb" else {"encoding": encoding}))
+        if mode in ("w", "wb"):
+            writer = _LocalWriter(self)
+            return writer if mode == "wb" else io.TextIOWrapper(writer, encoding=encoding)
+        raise ValueError(f"Unsupported mode {mode!r}")
+
+    def download_as_bytes(self) -> bytes:
+        with open(self.path, "rb") as f:
+            # Writes replace the file, so the open handle's mtime is the generation of the bytes read
+            self._generation = os.fstat(f.fileno()).st_mtime_ns
+            return f.read()
+
+    def download_as_string(self) -> bytes:
+        return self.download_as_bytes()
+
+    def download_as_text(self, encoding: str = "utf-8") -> str:
+        return self.download_as_bytes().decode(encoding)
+
+    def download_to_filename(self, filename: str):
+        shutil.copyfile(self.path, filename)
+
+    @contextmanager
+    def _conditional(self, if_generation_match):
+        """
+        Hold the root's lock while checking if_generation_match and writing.
+
+        GCS checks the precondition and writes atomically; the lock gives
+        worker processes sharing LOCAL_STORAGE_ROOT the same guarantee.
+        """
+        if if_generation_match is None:
+            yield
+            return
+
+        with _local_write_lock(self.bucket.client.root):
+            current = self._current_generation() or 0
+            if current != if_generation_match:
+                raise _precondition_failed()(
+                    f"{self.path}: generation {current} does not match {if_generation_match}"
+                )
+            yield
+
+    def _write(self, data: bytes, if_generation_match=None):
+        with self._conditional(if_generation_match), self.open("wb") as f:
+            f.write(data)
+
+    def upload_from_string(self, data, content_type: str = None, if_generation_match=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._write(data, if_generation_match)
+
+    def upload_from_file(self, file_obj, content_type: str = None, if_generation_match=None):
+        with self._conditional(if_generation_match), self.open("wb") as f:
+            shutil.copyfileobj(file_obj, f)
+
+    def upload_from_filename(self, filename: str, content_type: str = None, if_generation_match=None):
+        with open(filename, "rb") as f:
+            self.upload_from_file(f, content_type=content_type, if_generation_match=if_generation_match)
+
+    def compose(self, sources, if_generation_match=None):
+        with self._conditional(if_generation_match), self.open("wb") as f:
+            for source in sources:
+                with open(source.path, "rb") as part:
+                    shutil.copyfileobj(part, f)
+
+    def delete(self):
+        os.remove(self.path)
+
+
+class LocalBucket:
+    """A directory standing in for a GCS bucket."""
+
+    def __init__(self, client: "LocalClient", name: str):
+        self.client = client
+        self.name = name
+        self.path = os.path.join(client.root, name)
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def get_blob(self, name: str) -> LocalBlob:
+        blob = self.blob(name)
+        blob._generation = blob._current_generation()
+        return blob if blob._generation is not None else None
+
+    def list_blobs(self, prefix: str = ""):
+        if not os.path.isdir(self.path):
+            return []
+        blobs = []
+        for directory, _, files in os.walk(self.path):
+            for filename in files:
+                name = os.path.relpath(os.path.join(directory, filename), self.path).replace(os.sep, "/")
+                if name.startswith(prefix) and ".tmp-" not in name:
+                    blobs.append(LocalBlob(self, name))
+        return sorted(blobs, key=lambda blob: blob.name)
+
+
+class LocalClient:
+    """Drop-in replacement for storage.Client backed by a local directory."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+
+    def bucket(self, name: str) -> LocalBucket:
+        return LocalBucket(self, name)
+
+    def list_blobs(self, bucket_name: str, prefix: str = ""):
+        return self.bucket(bucket_name).list_blobs(prefix=prefix)
@@ -0,0 +1,268 @@
+"""
+Lightweight performance telemetry for the cloud functions.
+
+An invocation is wrapped in run(), which opens the root span and, when it
+ends, writes a metrics file to TELEMETRY_BUCKET under
+telemetry/<function>/<run_id>.json. Inside a run:
+
+    with telemetry.span("detect_communities"):    # timed, nested, logged as JSON
+        ...
+    with telemetry.timer("openalex.authors"):      # call count and latency only
+        response = session.get(...)
+    telemetry.count("author_cache.hits", 12)       # free-form counters
+
+Storage reads and writes are counted by storage_backend. Span events are
+printed as one JSON object per line, which Cloud Logging parses into
+structured entries; TELEMETRY_JSON_LOGS=0 turns them off.
+
+PROFILER=cprofile (or pyinstrument, when installed) profiles the whole run
+and stores the profile next to the metrics file.
+"""
+import io
+import json
+import os
+import resource
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+TELEMETRY_BUCKET = os.environ.get("TELEMETRY_BUCKET", "serverlessfinalproject-results-bucket")
+TELEMETRY_PREFIX = "telemetry"
+PROFILE_TOP_FUNCTIONS = 30
+
+
+def json_logs_enabled() -> bool:
+    return os.environ.get("TELEMETRY_JSON_LOGS", "1") != "0"
+
+
+class Run:
+    """Spans, counters and latencies collected during one invocation."""
+
+    def __init__(self, function_name: str, emit_logs: bool = True, **attributes):
+        self.function_name = function_name
+        self.emit_logs = emit_logs
+        self.run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.attributes = attributes
+        self.started_at = datetime.now()
+        self.origin = time.perf_counter()
+        self.spans = []
+        self.counters = defaultdict(int)
+        self.latencies = defaultdict(list)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self) -> list:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def log(self, message: str, severity: str = "INFO", **fields):
+        if not self.emit_logs or not json_logs_enabled():
+            return
+        print(json.dumps({
+            "severity": severity,
+            "message": message,
+            "function": self.function_name,
+            "run_id": self.run_id,
+            **fields,
+        }, default=str))
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        stack = self._stack()
+        record = {
+            "name": name,
+            "parent": stack[-1]["name"] if stack else None,
+            "start_seconds": round(time.perf_counter() - self.origin, 6),
+            "attributes": attributes,
+        }
+        stack.append(record)
+        started = time.perf_counter()
+        try:
+            yield record["attributes"]
+            record["status"] = "ok"
+        except BaseException as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["duration_seconds"] = round(time.perf_counter() - started, 6)
+            stack.pop()
+            with self._lock:
+                self.spans.append(record)
+            self.log(f"span {name} finished", severity="INFO" if record["status"] == "ok" else "ERROR",
+                     span=name, parent=record["parent"], duration_ms=round(record["duration_seconds"] * 1000, 3),
+                     status=record["status"], **record["attributes"])
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.counters[f"{name}.calls"] += 1
+
+    @staticmethod
+    def _summarize(samples: list) -> dict:
+        ordered = sorted(samples)
+        return {
+            "count": len(ordered),
+            "total_seconds": round(sum(ordered), 6),
+            "mean_seconds": round(sum(ordered) / len(ordered), 6),
+            "p50_seconds": round(ordered[len(ordered) // 2], 6),
+            "p95_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+            "max_seconds": round(ordered[-1], 6),
+        }
+
+    def to_dict(self, status: str) -> dict:
+        with self._lock:
+            return {
+                "function": self.function_name,
+                "run_id": self.run_id,
+                "status": status,
+                "started_at": self.started_at.isoformat(),
+                "duration_seconds": round(time.perf_counter() - self.origin, 6),
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                "attributes": self.attributes,
+                "spans": sorted(self.spans, key=lambda record: record["start_seconds"]),
+                "counters": dict(self.counters),
+                "latencies": {name: self._summarize(samples) for name, samples in self.latencies.items()},
+            }
+
+    def metrics_path(self, extension: str = "json") -> str:
+        return f"{TELEMETRY_PREFIX}/{self.function_name}/{self.run_id}.{extension}"
+
+
+# Invocations outside run() (local scripts, the pipeline) record into a throwaway run
+_current = Run("default", emit_logs=False)
+
+
+def current() -> Run:
+    return _current
+
+
+def span(name: str, **attributes):
+    """Time a block as a named span nested under the enclosing one."""
+    return _current.span(name, **attributes)
+
+
+def count(name: str, value: int = 1):
+    """Add value to a counter of the current run."""
+    _current.count(name, value)
+
+
+def observe(name: str, seconds: float):
+    """Record one latency sample (and call) under name."""
+    _current.observe(name, seconds)
+
+
+@contextmanager
+def timer(name: str):
+    """Count a call and record its latency without emitting a span."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+class _Profiler:
+    """cProfile or pyinstrument, selected by the PROFILER environment variable."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        if kind == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+                self.profiler = Profiler()
+                return
+            except ImportError:
+                print("pyinstrument is not installed, profiling with cProfile instead")
+                self.kind = "cprofile"
+        import cProfile
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.kind == "pyinstrument":
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def save(self, run: Run):
+        """Upload the profile and return its blob name with a summary for the metrics file."""
+        from common import storage_backend
+
+        if self.kind == "pyinstrument":
+            path = run.metrics_path("html")
+            storage_backend.write_bytes(TELEMETRY_BUCKET, path, self.profiler.output_html(), content_type="text/html")
+            return {"kind": self.kind, "path": path}
+
+        import marshal
+        import pstats
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        path = run.metrics_path("prof")
+        storage_backend.write_bytes(TELEMETRY_BUCKET, path, marshal.dumps(stats.stats),
+                                    content_type="application/octet-stream")
+
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        return {
+            "kind": self.kind,
+            "path": path,
+            "top_cumulative": [
+                {"function": f"{filename}:{line}({name})", "calls": calls, "cumulative_seconds": round(cumulative, 6)}
+                for (filename, line, name), (_, calls, _, cumulative, _) in top
+            ],
+        }
+
+
+@contextmanager
+def run(function_name: str, **attributes):
+    """
+    Collect telemetry for one invocation and write its metrics file when it ends.
+
+    Args:
+        function_name: Name of the cloud function, used in the metrics path
+        **attributes: Values identifying the invocation (trigger bucket and blob, ...)
+    """
+    global _current
+    previous = _current
+    _current = Run(function_name, **attributes)
+
+    profiler = None
+    if os.environ.get("PROFILER"):
+        profiler = _Profiler(os.environ["PROFILER"].lower())
+        profiler.start()
+
+    status = "failed"
+    try:
+        with _current.span(function_name):
+            yield _current
+        status = "ok"
+    finally:
+        finished = _current
+        _current = previous
+
+        metrics = finished.to_dict(status)
+        try:
+            if profiler is not None:
+                profiler.stop()
+                metrics["profile"] = profiler.save(finished)
+
+            from common import storage_backend
+            path = finished.metrics_path()
+            storage_backend.write_bytes(TELEMETRY_BUCKET, path, json.dumps(metrics, indent=2),
+                                        content_type="application/json")
+            print(f"Metrics saved to gs://{TELEMETRY_BUCKET}/{path}")
+        except Exception as e:
+            # Telemetry must never fail the invocation it describes
+            print(f"Could not save metrics: {e}")
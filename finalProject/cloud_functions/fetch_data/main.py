@@ -1,12 +1,44 @@
+import argparse
+import hashlib
 import json
 import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 import requests
-from google.cloud import storage
+from common import raw_store, storage_backend
 
 # OpenAlex API endpoint
 OPENALEX_URL = "https://api.openalex.org"
 
+# Incremental harvest store: works are spread over PARTITIONS blobs by a hash of their ID,
+# with an index of every work's partition and updated_date, and the harvest state
+HARVEST_PREFIX = "works"
+HARVEST_STATE_BLOB = f"{HARVEST_PREFIX}/state.json"
+HARVEST_INDEX_BLOB = f"{HARVEST_PREFIX}/index.json"
+PARTITIONS = int(os.environ.get("HARVEST_PARTITIONS", "64"))
+# Merged works are buffered and written, with the index and the cursor, every HARVEST_FLUSH_PAGES pages
+FLUSH_PAGES = int(os.environ.get("HARVEST_FLUSH_PAGES", "50"))
+PARTITION_WRITERS = 8
+
+# Citation-frontier crawl: OpenAlex accepts at most 50 IDs in a single OR filter
+CRAWL_BATCH_SIZE = 50
+CRAWL_WORKERS = int(os.environ.get("CRAWL_WORKERS", "8"))
+CRAWL_MAX_RETRIES = int(os.environ.get("CRAWL_MAX_RETRIES", "4"))
+CRAWL_BACKOFF_SECONDS = 1.0
+# Fields of a crawled work that the preprocessing and analysis functions read
+CRAWL_SELECT_FIELDS = ("id,title,publication_date,publication_year,updated_date,cited_by_count,"
+                       "topics,concepts,authorships,referenced_works")
+# Responses that mean "slow down" rather than "this request is broken"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# "ndjson" stores works as compressed NDJSON chunks with an index (see common/raw_store.py),
+# "json" as a single JSON document
+RAW_FORMAT = os.environ.get("RAW_FORMAT", "ndjson")
+
 
 def fetch_data(entity_type, filters, sort_by=None, per_page=25):
     """
@@ -36,6 +68,288 @@ def fetch_data(entity_type, filters, sort_by=None, per_page=25):
         return None
 
 
+def fetch_pages(entity_type, filters, sort_by=None, per_page=200, cursor="*", max_pages=None):
+    """
+    Page through an OpenAlex query with cursor paging.
+
+    :param entity_type: Type of entity to fetch (e.g., 'works', 'authors').
+    :param filters: Dictionary of filters (e.g., {'publication_year': 2025}).
+    :param sort_by: Sorting criteria (e.g., {'cited_by_count': 'desc'}).
+    :param per_page: Number of results per page (at most 200).
+    :param cursor: Cursor to start from; '*' starts a new query.
+    :param max_pages: Stop after this many pages; None fetches every page.
+    :return: Iterator of (results, next_cursor); next_cursor is None after the last page.
+    """
+    url = f"{OPENALEX_URL}/{entity_type}"
+    pages = 0
+    while cursor and (max_pages is None or pages < max_pages):
+        params = {
+            "filter": ",".join([f"{k}:{v}" for k, v in filters.items()]),
+            "sort": ",".join([f"{k}:{v}" for k, v in sort_by.items()]) if sort_by else None,
+            "per-page": per_page,
+            "cursor": cursor,
+        }
+        response = requests.get(url, params=params)
+        response.raise_for_status()
+        page = response.json()
+        results = page.get("results", [])
+        cursor = page.get("meta", {}).get("next_cursor") if results else None
+        pages += 1
+        yield results, cursor
+
+
+def _load_json_blob(bucket_name, blob_name, default):
+    blob = storage_backend.get_blob(bucket_name, blob_name)
+    if not blob.exists():
+        return default
+    return json.loads(blob.download_as_bytes())
+
+
+def work_partition(work_id):
+    """Partition number of a work ID, stable across runs and processes."""
+    digest = hashlib.md5(work_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % PARTITIONS
+
+
+def merge_works(works, index, pending):
+    """
+    Buffer fetched works for the partitioned store, skipping records that are not newer.
+
+    :param works: Works fetched from OpenAlex.
+    :param index: ID index (work ID -> partition and updated_date), updated in place.
+    :param pending: Buffered works per partition (partition -> work ID -> work), updated in place.
+    :return: Number of works added or updated.
+    """
+    merged = 0
+    for work in works:
+        entry = index.get(work["id"])
+        updated = work.get("updated_date", "")
+        if entry is not None and entry["updated_date"] >= updated:
+            continue
+        partition = work_partition(work["id"])
+        pending[partition][work["id"]] = work
+        index[work["id"]] = {"partition": partition, "updated_date": updated}
+        merged += 1
+    return merged
+
+
+def flush_partitions(bucket_name, pending):
+    """
+    Write the buffered works, rewriting every partition that received one exactly once.
+
+    :param bucket_name: Bucket holding the harvest store.
+    :param pending: Buffered works per partition; emptied once written.
+    """
+    def write(item):
+        partition, updates = item
+        blob_name = f"{HARVEST_PREFIX}/partitions/part-{partition:04d}.json"
+        stored = _load_json_blob(bucket_name, blob_name, {})
+        stored.update(updates)
+        storage_backend.write_bytes(bucket_name, blob_name, json.dumps(stored), content_type="application/json")
+
+    with ThreadPoolExecutor(max_workers=PARTITION_WRITERS) as executor:
+        list(executor.map(write, pending.items()))
+    pending.clear()
+
+
+def harvest_incremental(bucket_name, filters, per_page=200, max_pages=None, flush_pages=None):
+    """
+    Fetch only works updated since the last harvest and merge them into the partitioned store.
+
+    The state blob holds the high-water mark (the latest updated_date seen) and,
+    while a query is unfinished, its cursor, which the next run resumes before
+    the mark advances. Merged works are buffered per partition and written,
+    followed by the index and the cursor, every flush_pages pages, so a run
+    interrupted between flushes only repeats the pages since the last one.
+
+    :param bucket_name: Bucket holding the harvest store.
+    :param filters: Base filters of the harvested query (e.g., {'publication_year': 2025}).
+    :param per_page: Number of results per page (at most 200).
+    :param max_pages: Pages fetched per run; None fetches every page.
+    :param flush_pages: Pages between writes to the store; HARVEST_FLUSH_PAGES when omitted.
+    :return: Number of works added or updated.
+    """
+    flush_pages = flush_pages or FLUSH_PAGES
+    state = _load_json_blob(bucket_name, HARVEST_STATE_BLOB, {})
+    index = _load_json_blob(bucket_name, HARVEST_INDEX_BLOB, {})
+
+    if state.get("cursor"):
+        query_filters = state["query_filters"]
+        cursor = state["cursor"]
+    else:
+        query_filters = dict(filters)
+        if state.get("watermark"):
+            query_filters["from_updated_date"] = state["watermark"]
+        cursor = "*"
+
+    def checkpoint(cursor):
+        # Partitions, then the index, then the state: a crash re-fetches pages rather than losing them
+        flush_partitions(bucket_name, pending)
+        storage_backend.write_bytes(bucket_name, HARVEST_INDEX_BLOB, json.dumps(index),
+                                    content_type="application/json")
+        if cursor:
+            state.update({"cursor": cursor, "query_filters": query_filters, "pending_watermark": watermark})
+        else:
+            state.clear()
+            state["watermark"] = watermark or previous_watermark
+        state["harvested_at"] = datetime.now().isoformat()
+        storage_backend.write_bytes(bucket_name, HARVEST_STATE_BLOB, json.dumps(state, indent=2),
+                                    content_type="application/json")
+
+    print(f"Harvesting works with filter {query_filters}")
+    previous_watermark = state.get("watermark")
+    watermark = state.get("pending_watermark") or state.get("watermark") or ""
+    pending = defaultdict(dict)
+    merged = fetched = pages = 0
+    for results, cursor in fetch_pages("works", query_filters, per_page=per_page, cursor=cursor, max_pages=max_pages):
+        fetched += len(results)
+        merged += merge_works(results, index, pending)
+        watermark = max([watermark] + [work.get("updated_date", "") for work in results])
+        pages += 1
+        if cursor and pages % flush_pages == 0:
+            checkpoint(cursor)
+
+    checkpoint(cursor)
+    print(f"Fetched {fetched} works, {merged} new or updated; {len(index)} works stored")
+    return merged
+
+
+def load_harvested_works(bucket_name):
+    """
+    Read every work of the partitioned store.
+
+    :param bucket_name: Bucket holding the harvest store.
+    :return: Works in the {'results': [...]} shape of an OpenAlex response.
+    """
+    works = []
+    for blob in storage_backend.get_client().list_blobs(bucket_name, prefix=f"{HARVEST_PREFIX}/partitions/"):
+        works.extend(json.loads(blob.download_as_bytes()).values())
+    return {"results": works}
+
+
+class SeenSet:
+    """
+    Set of OpenAlex IDs, kept as integers where possible.
+
+    Work IDs are stored as their number (W4405893659 -> 4405893659), which is
+    far smaller than the URL strings; other IDs are kept as their short form.
+    """
+
+    def __init__(self):
+        self.ids = set()
+
+    @staticmethod
+    def _key(work_id):
+        short_id = work_id.rsplit("/", 1)[-1]
+        return int(short_id[1:]) if short_id[:1] == "W" and short_id[1:].isdigit() else short_id
+
+    def add(self, work_id):
+        self.ids.add(self._key(work_id))
+
+    def __contains__(self, work_id):
+        return self._key(work_id) in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def fetch_works_batch(session, work_ids, max_retries=CRAWL_MAX_RETRIES):
+    """
+    Resolve up to CRAWL_BATCH_SIZE works with a single OR-filter request.
+
+    Rate limiting (429) and server errors are retried with exponential
+    backoff, honouring Retry-After when OpenAlex sends it.
+
+    :param session: requests.Session used for the request.
+    :param work_ids: Short work IDs (e.g., 'W4405893659').
+    :param max_retries: Attempts before the batch is given up.
+    :return: The works found, IDs OpenAlex does not know being missing; None when every attempt failed.
+    """
+    params = {
+        "filter": "openalex:" + "|".join(work_ids),
+        "select": CRAWL_SELECT_FIELDS,
+        "per-page": CRAWL_BATCH_SIZE,
+    }
+    for attempt in range(max_retries):
+        retry_after = None
+        try:
+            response = session.get(f"{OPENALEX_URL}/works", params=params, timeout=60)
+            if response.status_code == 200:
+                return response.json().get("results", [])
+            error = f"HTTP {response.status_code}"
+            if response.status_code not in RETRYABLE_STATUS_CODES:
+                break
+            retry_after = response.headers.get("Retry-After")
+        except requests.exceptions.RequestException as e:
+            error = str(e)
+        if attempt + 1 < max_retries:
+            delay = CRAWL_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.0)
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            time.sleep(delay)
+    print(f"Giving up on a batch of {len(work_ids)} works starting at {work_ids[0]}: {error}")
+    return None
+
+
+def crawl_citation_frontier(works_data, hops, budget, workers=None):
+    """
+    Expand works along referenced_works for up to `hops` levels.
+
+    Every level is fetched in concurrent batches. When the budget cannot cover
+    a level, the references cited by the most works are fetched first, ties
+    going to references cited by more highly cited works. Batches that still
+    fail after their retries are skipped and logged; the crawl goes on with
+    the works that were resolved.
+
+    :param works_data: Seed works in the {'results': [...]} shape of an OpenAlex response.
+    :param hops: Levels of references to resolve; 1 resolves the references of the seeds.
+    :param budget: Maximum number of works fetched over all levels.
+    :param workers: Concurrent batch requests; CRAWL_WORKERS when None.
+    :return: The seed works followed by the fetched works, level by level.
+    """
+    results = list(works_data.get("results", []))
+    seen = SeenSet()
+    for work in results:
+        seen.add(work["id"])
+
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=workers or CRAWL_WORKERS))
+    level = results
+    fetched_count = 0
+    for hop in range(1, hops + 1):
+        remaining = budget - fetched_count
+        if remaining <= 0 or not level:
+            break
+
+        # Candidates are ranked by how many crawled works cite them, then by the citations of those works
+        citing = defaultdict(lambda: [0, 0])
+        for work in level:
+            for reference in work.get("referenced_works") or []:
+                if reference not in seen:
+                    citing[reference][0] += 1
+                    citing[reference][1] = max(citing[reference][1], work.get("cited_by_count") or 0)
+        frontier = sorted(citing, key=lambda reference: (-citing[reference][0], -citing[reference][1]))[:remaining]
+        for reference in frontier:
+            seen.add(reference)
+
+        short_ids = [reference.rsplit("/", 1)[-1] for reference in frontier]
+        batches = [short_ids[i:i + CRAWL_BATCH_SIZE] for i in range(0, len(short_ids), CRAWL_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=workers or CRAWL_WORKERS) as executor:
+            responses = list(executor.map(lambda ids: fetch_works_batch(session, ids), batches))
+        fetched = {work["id"]: work for batch in responses if batch is not None for work in batch}
+        failed = [batch[0] for batch, response in zip(batches, responses) if response is None]
+        if failed:
+            print(f"Hop {hop}: skipped {len(failed)} failed batches (starting at {', '.join(failed)})")
+
+        # Keep the frontier's priority order, so the output does not depend on response order
+        level = [fetched[reference] for reference in frontier if reference in fetched]
+        results.extend(level)
+        fetched_count += len(frontier)
+        print(f"Hop {hop}: fetched {len(level)} of {len(citing)} unseen references in {len(batches)} batches")
+
+    return {**works_data, "results": results}
+
+
 def upload_to_gcs(bucket_name, blob_name, data):
     """
     Upload data to Google Cloud Storage.
@@ -44,16 +358,39 @@ def upload_to_gcs(bucket_name, blob_name, data):
     :param blob_name: Path to the blob (file) in the bucket.
     :param data: Data to upload (string).
     """
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
-
-    blob.upload_from_string(data, content_type="application/json")
+    storage_backend.write_bytes(bucket_name, blob_name, data, content_type="application/json")
     print(f"Data uploaded to gs://{bucket_name}/{blob_name}")
 
 
+def upload_works(bucket_name, blob_name, works_data):
+    """
+    Store fetched works in the format selected by RAW_FORMAT.
+
+    :param bucket_name: Name of the GCS bucket.
+    :param blob_name: Name of the JSON document; chunks go under the same name without '.json'.
+    :param works_data: Works in the {'results': [...]} shape of an OpenAlex response.
+    """
+    prefix = raw_store.prefix_for(blob_name)
+    if RAW_FORMAT == "json":
+        upload_to_gcs(bucket_name, blob_name, json.dumps(works_data))
+        # Readers prefer a chunked copy, so a stale one would shadow the document
+        index = storage_backend.get_client().bucket(bucket_name).get_blob(raw_store.index_blob(prefix))
+        if index is not None:
+            index.delete()
+    else:
+        raw_store.write_works(bucket_name, prefix, works_data)
+
+
 # Example usage
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch OpenAlex works into the raw data bucket.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fetch only works updated since the last harvest and merge them into the partitioned store")
+    parser.add_argument("--max-pages", type=int, default=None, help="Pages fetched per incremental run")
+    parser.add_argument("--hops", type=int, default=0, help="Levels of referenced works to resolve after fetching")
+    parser.add_argument("--crawl-budget", type=int, default=1000, help="Maximum works fetched by the citation crawl")
+    args = parser.parse_args()
+
     # Configuration
     INPUT_BUCKET_NAME = "serverlessfinalproject-raw-data-bucket"  # Replace with your bucket name
     INPUT_BLOB_NAME = (
@@ -64,14 +401,22 @@ if __name__ == "__main__":
         # Fetch recent papers from 2025
         filters = {"publication_year": 2025}
         sort_by = {"cited_by_count": "desc"}
-        works_data = fetch_data("works", filters, sort_by, per_page=100)
+        if args.incremental:
+            # Downstream functions read one copy of all works, rewritten only when works changed
+            if harvest_incremental(INPUT_BUCKET_NAME, filters, max_pages=args.max_pages):
+                works_data = load_harvested_works(INPUT_BUCKET_NAME)
+            else:
+                works_data = None
+        else:
+            works_data = fetch_data("works", filters, sort_by, per_page=100)
 
-        if works_data:
-            # Convert the JSON response to a string
-            works_data_json = json.dumps(works_data)
+        if works_data and args.hops:
+            # Resolve referenced works, so they become attributed nodes of the citation graph
+            works_data = crawl_citation_frontier(works_data, args.hops, args.crawl_budget)
 
+        if works_data:
             # Upload the data to GCS
-            upload_to_gcs(INPUT_BUCKET_NAME, INPUT_BLOB_NAME, works_data_json)
+            upload_works(INPUT_BUCKET_NAME, INPUT_BLOB_NAME, works_data)
 
     except Exception as e:
         print(f"Error: {e}")
@@ -1,10 +1,31 @@
+import os
+import argparse
+import hashlib
+import random
+import re
+import threading
 import requests
 import time
 import json
+from concurrent.futures import ThreadPoolExecutor
 
-# Ollama API configuration
-OLLAMA_URL = "http://pixelbay.at:11434/api/generate"  # Ensure Ollama is running
-OLLAMA_MODEL = "llama3.2:latest"  # Choose an available model (e.g., "gemma:2b", "deepseek-r1:8b")
+# Ollama API configuration (overridable for local pipeline runs)
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://pixelbay.at:11434/api/generate")  # Ensure Ollama is running
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.2:latest")  # Choose an available model (e.g., "gemma:2b", "deepseek-r1:8b")
+
+# Generation settings
+DESCRIPTION_CACHE_PATH = os.environ.get("DESCRIPTION_CACHE_PATH", "description_cache.json")
+DEFAULT_WORKERS = int(os.environ.get("OLLAMA_WORKERS", 4))
+REQUEST_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", 60))
+MAX_RETRIES = 3
+MAX_STREAM_TOKENS = int(os.environ.get("OLLAMA_MAX_TOKENS", 80))
+
+# End of the first sentence in a streamed answer; the terminator only counts once
+# the following whitespace has arrived, so "3.5" or "e.g." do not cut it short
+SENTENCE_END = re.compile(r"(?<!\be\.g)(?<!\bi\.e)[.!?](?=\s)")
+
+# Responses that mean "slow down" rather than "this request is broken"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
 
 # Load topics from topics.json and select top 10
 def load_top_topics(filename="topics.json", top_n=10):
@@ -12,7 +33,7 @@ def load_top_topics(filename="topics.json", top_n=10):
     try:
         with open(filename, "r", encoding="utf-8") as f:
             data = json.load(f)
-        
+
         # Sort topics by count (descending) and take top N
         top_topics = sorted(data.items(), key=lambda x: x[1], reverse=True)[:top_n]
         return [topic[0] for topic in top_topics]  # Extract only topic names
@@ -21,39 +42,274 @@ def load_top_topics(filename="topics.json", top_n=10):
         print(f"Error loading {filename}: {e}")
         return []
 
-# Generate topic descriptions using Ollama
-def generate_topic_description(topics):
+# Prompts
+def build_prompt(topic):
+    """Returns the single-topic prompt; its hash identifies the topic's description in the cache."""
+    return f"Provide a concise, one-sentence description for the topic: {topic}."
+
+def build_batch_prompt(topics):
+    """Returns a prompt asking for several descriptions as one JSON object keyed by topic name."""
+    return (
+        "Provide a concise, one-sentence description for each of the following topics. "
+        "Answer with a JSON object mapping every topic name exactly as given to its description.\n"
+        f"Topics: {json.dumps(topics, ensure_ascii=False)}"
+    )
+
+# Persistent description cache
+class DescriptionCache:
+    """JSON file of generated descriptions keyed on (model, prompt hash)."""
+
+    def __init__(self, path=DESCRIPTION_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    @staticmethod
+    def key(model, prompt):
+        return f"{model}:{hashlib.sha256(prompt.encode('utf-8')).hexdigest()}"
+
+    def get(self, model, prompt):
+        with self.lock:
+            return self.entries.get(self.key(model, prompt))
+
+    def put(self, model, prompt, description):
+        with self.lock:
+            self.entries[self.key(model, prompt)] = description
+            self.dirty = True
+
+    def save(self):
+        """Writes the cache back to disk if anything was added."""
+        if not self.path or not self.dirty:
+            return
+        with self.lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+
+# Adaptive backoff shared by all workers
+class AdaptiveBackoff:
     """
-    Calls Ollama to generate a short description for each topic.
-    
-    :param topics: List of topic names (strings)
-    :return: Dictionary mapping topics to generated descriptions
+    Spaces out requests when Ollama signals overload.
+
+    Every retryable failure doubles the delay applied before each request
+    (up to max_delay); every success halves it again.
     """
-    descriptions = {}
 
-    for topic in topics:
-        prompt = f"Provide a concise, one-sentence description for the topic: {topic}."
+    def __init__(self, base_delay=0.5, max_delay=30.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            delay = self.delay
+        if delay:
+            time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def success(self):
+        with self.lock:
+            self.delay = self.delay / 2 if self.delay > self.base_delay else 0.0
+
+    def failure(self):
+        with self.lock:
+            self.delay = min(self.max_delay, max(self.base_delay, self.delay * 2))
+
+# Generate topic descriptions using Ollama
+class DescriptionGenerator:
+    def __init__(self, url=OLLAMA_URL, model=OLLAMA_MODEL, workers=DEFAULT_WORKERS, batch_size=1,
+                 cache=None, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, stream=False,
+                 max_tokens=MAX_STREAM_TOKENS):
+        """
+        Generates topic descriptions concurrently, reusing cached ones.
+
+        :param url: Ollama generate endpoint
+        :param model: Ollama model name
+        :param workers: Number of concurrent requests
+        :param batch_size: Topics per request; batches use structured JSON output
+        :param cache: DescriptionCache instance, defaults to DESCRIPTION_CACHE_PATH
+        :param timeout: Per-request timeout in seconds
+        :param max_retries: Attempts per request on retryable failures
+        :param stream: Stream single-topic answers and stop after the first sentence
+        :param max_tokens: Token budget per streamed answer
+        """
+        self.url = url
+        self.model = model
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.cache = cache if cache is not None else DescriptionCache()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.stream = stream
+        self.max_tokens = max_tokens
+        self.timings = {}
+        self.timings_lock = threading.Lock()
+        self.failed = set()  # Topics whose description is the error of their failed request
+        self.backoff = AdaptiveBackoff()
+        self.session = requests.Session()
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=workers))
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=workers))
 
+    def _post(self, payload):
+        """Posts to Ollama, retrying with adaptive backoff. Returns the response (streamed if requested)."""
+        last_error = None
+        for _ in range(self.max_retries):
+            self.backoff.wait()
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout,
+                                             stream=payload.get("stream", False))
+                if response.status_code == 200:
+                    self.backoff.success()
+                    return response
+                response.close()
+                last_error = f"Error: {response.status_code}"
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    break
+            except requests.exceptions.RequestException as e:
+                last_error = f"Request failed: {str(e)}"
+            self.backoff.failure()
+        raise RuntimeError(last_error)
+
+    def _consume_stream(self, response, started):
+        """
+        Reads Ollama's NDJSON token stream until the first sentence ends or the
+        token budget is spent, then drops the connection so generation stops.
+
+        :return: (description, seconds to first token)
+        """
+        text = ""
+        first_token = None
+        tokens = 0
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                token = chunk.get("response", "")
+                if token and first_token is None:
+                    first_token = time.perf_counter() - started
+                text += token
+                tokens += 1
+
+                if chunk.get("done") or tokens >= self.max_tokens:
+                    break
+                match = SENTENCE_END.search(text.lstrip())
+                if match:
+                    text = text.lstrip()[:match.end()]
+                    break
+        finally:
+            response.close()
+        return text.strip(), first_token
+
+    def _describe_one(self, topic):
+        prompt = build_prompt(topic)
+        started = time.perf_counter()
+        try:
+            response = self._post({"model": self.model, "prompt": prompt, "stream": self.stream})
+            if self.stream:
+                description, first_token = self._consume_stream(response, started)
+            else:
+                description = response.json().get("response", "No description generated.").strip()
+                first_token = None
+        except (RuntimeError, ValueError, requests.exceptions.RequestException) as e:
+            self.failed.add(topic)
+            return {topic: str(e)}
+
+        self._record_timing(topic, started, first_token)
+        description = description or "No description generated."
+        self.cache.put(self.model, prompt, description)
+        return {topic: description}
+
+    def _record_timing(self, topic, started, first_token=None):
+        with self.timings_lock:
+            self.timings[topic] = {
+                "ttft_seconds": round(first_token, 4) if first_token is not None else None,
+                "total_seconds": round(time.perf_counter() - started, 4),
+            }
+
+    def _describe_batch(self, topics):
+        if len(topics) == 1:
+            return self._describe_one(topics[0])
+
+        started = time.perf_counter()
         try:
-            response = requests.post(
-                OLLAMA_URL,
-                json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False},
-                timeout=10  # Set a timeout to prevent issues
-            )
-            
-            # Parse response
-            if response.status_code == 200:
-                result = response.json()
-                description = result.get("response", "No description generated.")
+            result = self._post({
+                "model": self.model,
+                "prompt": build_batch_prompt(topics),
+                "format": "json",
+                "stream": False,
+            }).json()
+            parsed = json.loads(result.get("response", "{}"))
+        except (RuntimeError, ValueError, requests.exceptions.RequestException) as e:
+            print(f"Batch of {len(topics)} topics failed ({e}), retrying individually")
+            parsed = {}
+
+        descriptions = {}
+        for topic in topics:
+            description = parsed.get(topic) if isinstance(parsed, dict) else None
+            if isinstance(description, str) and description.strip():
+                descriptions[topic] = description.strip()
+                self._record_timing(topic, started)
+                self.cache.put(self.model, build_prompt(topic), descriptions[topic])
             else:
-                description = f"Error: {response.status_code}"
+                # Topics the model skipped or renamed fall back to a single-topic request
+                descriptions.update(self._describe_one(topic))
+        return descriptions
 
-        except requests.exceptions.RequestException as e:
-            description = f"Request failed: {str(e)}"
+    def generate(self, topics):
+        """
+        Returns a dictionary mapping every topic to its description.
 
-        descriptions[topic] = description
-        time.sleep(1)  # Small delay to avoid overwhelming Ollama
+        :param topics: List of topic names (strings)
+        """
+        descriptions = {}
+        pending = []
+        for topic in topics:
+            cached = self.cache.get(self.model, build_prompt(topic))
+            if cached is None:
+                pending.append(topic)
+            else:
+                descriptions[topic] = cached
+
+        print(f"{len(descriptions)} descriptions cached, generating {len(pending)}...")
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for result in executor.map(self._describe_batch, batches):
+                    descriptions.update(result)
+        finally:
+            self.cache.save()
+
+        return {topic: descriptions[topic] for topic in topics}
+
+def generate_topic_description(topics, workers=DEFAULT_WORKERS, batch_size=1, cache_path=DESCRIPTION_CACHE_PATH,
+                               stream=False, timings_file=None):
+    """
+    Calls Ollama to generate a short description for each topic.
 
+    :param topics: List of topic names (strings)
+    :param workers: Number of concurrent requests
+    :param batch_size: Topics described per request
+    :param cache_path: JSON file of previously generated descriptions
+    :param stream: Stream answers and stop at the first sentence (single-topic requests only)
+    :param timings_file: Optional JSON file receiving per-topic TTFT and total latency
+    :return: Dictionary mapping topics to generated descriptions
+    """
+    generator = DescriptionGenerator(workers=workers, batch_size=batch_size, cache=DescriptionCache(cache_path),
+                                     stream=stream)
+    descriptions = generator.generate(topics)
+    if timings_file:
+        save_descriptions(timings_file, generator.timings)
     return descriptions
 
 # Save generated descriptions to JSON file
@@ -68,13 +324,24 @@ def save_descriptions(filename, descriptions):
 
 # Main execution
 if __name__ == "__main__":
-    topics = load_top_topics("topics.json", top_n=10)  # Read and select top 10 topics
+    parser = argparse.ArgumentParser(description="Generate one-sentence topic descriptions with Ollama.")
+    parser.add_argument("--topics-file", default="topics.json")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--cache", default=DESCRIPTION_CACHE_PATH)
+    parser.add_argument("--stream", action="store_true", help="Stop generating after the first sentence")
+    args = parser.parse_args()
+
+    topics = load_top_topics(args.topics_file, top_n=args.top_n)  # Read and select top N topics
     if not topics:
         print("No topics found. Exiting.")
     else:
         print(f"Generating descriptions for the top {len(topics)} topics...")
-        descriptions = generate_topic_description(topics)
-        
+        descriptions = generate_topic_description(topics, workers=args.workers, batch_size=args.batch_size,
+                                                  cache_path=args.cache, stream=args.stream,
+                                                  timings_file="description_timings.json")
+
         save_descriptions("top_topic_descriptions.json", descriptions)
 
         # Print a preview of results
@@ -0,0 +1,134 @@
+"""
+Local stand-in for the Ollama /api/generate endpoint.
+
+Answers every prompt with a canned one-sentence description after a
+configurable delay, so the description generator can be exercised and
+benchmarked without a GPU host. Supports "stream": true (NDJSON chunks),
+"format": "json" for batched prompts, and a failure rate returning 503s to
+exercise the backoff.
+
+Run it with `python ollama_stub.py --port 11434` and point OLLAMA_URL at
+http://127.0.0.1:11434/api/generate.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def describe(topic):
+    return f"{topic} is a research area studying the methods, applications and open problems of {topic.lower()}."
+
+
+def build_response(prompt, json_format):
+    """Return the completion text the stub answers a prompt with."""
+    if json_format:
+        match = re.search(r"Topics: (\[.*\])", prompt, re.S)
+        topics = json.loads(match.group(1)) if match else []
+        return json.dumps({topic: describe(topic) for topic in topics})
+
+    match = re.search(r"for the topic: (.*)\.$", prompt, re.S)
+    return describe(match.group(1) if match else prompt)
+
+
+class OllamaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self.send_error(404)
+            return
+
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server = self.server
+
+        with server.lock:
+            server.request_count += 1
+        if random.random() < server.failure_rate:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        text = build_response(payload.get("prompt", ""), payload.get("format") == "json")
+        model = payload.get("model", "stub")
+
+        if not payload.get("stream", True):
+            time.sleep(server.latency + server.token_latency * len(text.split()))
+            body = json.dumps({"model": model, "response": text, "done": True}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        # Streamed answer: one NDJSON line per word, like Ollama's token stream
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(server.latency)
+        try:
+            words = text.split(" ")
+            for i, word in enumerate(words):
+                time.sleep(server.token_latency)
+                token = word if i == 0 else " " + word
+                self._write_chunk(json.dumps({"model": model, "response": token, "done": False}) + "\n")
+            self._write_chunk(json.dumps({"model": model, "response": "", "done": True}) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early
+            self.close_connection = True
+
+    def _write_chunk(self, data):
+        data = data.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.05, token_latency=0.0, failure_rate=0.0):
+    """
+    Start the stub server in a background thread.
+
+    :param host: Interface to bind
+    :param port: Port to bind, 0 picks a free one
+    :param latency: Seconds before the first token of every answer
+    :param token_latency: Seconds per generated word
+    :param failure_rate: Fraction of requests answered with 503
+    :return: (server, url of the generate endpoint); call server.shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), OllamaStubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.token_latency = token_latency
+    server.failure_rate = failure_rate
+    server.request_count = 0
+    server.lock = threading.Lock()
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api/generate"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a fake Ollama /api/generate endpoint.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-latency", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.latency, args.token_latency, args.failure_rate)
+    print(f"Ollama stub listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
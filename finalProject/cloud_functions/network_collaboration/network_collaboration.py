@@ -1,69 +1,53 @@
-import networkx as nx
+import heapq
 import os
 import json
 from collections import defaultdict
-from typing import Dict, List, Set, Tuple
-import numpy as np
-import requests
+from typing import Dict, Iterator, List, Set, Tuple
 from datetime import datetime
-import matplotlib.pyplot as plt
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.feature_extraction.text import TfidfVectorizer
 import functions_framework
-from google.cloud import storage
-import tempfile
+from common import idempotency, recommendation_index, render_queue, storage_backend, telemetry
+import io
+
+# networkx, numpy and the rendering helpers are imported where they are used,
+# so invocations skipped by the trigger filter start without loading them
+
+# Bounded outputs written as NDJSON: the best pairs overall and the best pairs of every
+# author; 0 turns either ranking off. Setting both to 0 opts out of the bounds and writes
+# every qualifying pair, which grows quadratically with the graph, to one JSON document.
+# Either way every unconnected pair is still scored (O(n^2)); the bounds cap output and memory.
+TOP_K = int(os.environ.get("COLLABORATION_TOP_K", "1000"))
+PER_AUTHOR_K = int(os.environ.get("COLLABORATION_PER_AUTHOR_K", "10"))
 
 
 class CollaborationAnalyzer:
-    def __init__(self, graph_path: str):
-        """Initialize the analyzer with a NetworkX graph."""
-        self.G = nx.read_gml(graph_path)
+    def __init__(self, graph_path=None, session=None):
+        """Initialize the analyzer with a graph read from a GML path or binary file object, or from an AnalysisSession."""
+        from common.analysis_session import AnalysisSession
+
+        self.session = session if session is not None else AnalysisSession(graph_path)
+        self.G = self.session.author_graph
+        self.hierarchies = self.session.by_label(self.session.topic_hierarchies)
         self.domain_weights = {"domain": 0.4, "field": 0.3, "subfield": 0.3}
         
     def extract_topic_hierarchy(self, node_data: Dict) -> Dict[str, Set[str]]:
         """Extract hierarchical topic information from a node."""
-        hierarchy = {
-            "domain": set(),
-            "field": set(),
-            "subfield": set()
-        }
-        
-        if "topics" in node_data:
-            topics = node_data["topics"]
-            if not isinstance(topics, list):
-                return hierarchy
-                
-            for topic in topics:
-                if isinstance(topic, dict):
-                    # Add topic display name
-                    if "display_name" in topic:
-                        topic_name = topic["display_name"].lower()
-                        
-                    # Extract hierarchical information
-                    if "domain" in topic and isinstance(topic["domain"], dict):
-                        domain_name = topic["domain"].get("display_name", "").lower()
-                        hierarchy["domain"].add(domain_name)
-                        
-                    if "field" in topic and isinstance(topic["field"], dict):
-                        field_name = topic["field"].get("display_name", "").lower()
-                        hierarchy["field"].add(field_name)
-                        
-                    if "subfield" in topic and isinstance(topic["subfield"], dict):
-                        subfield_name = topic["subfield"].get("display_name", "").lower()
-                        hierarchy["subfield"].add(subfield_name)
-        
-        return hierarchy
+        from common.analysis_session import topic_hierarchy
+
+        return topic_hierarchy(node_data)
 
     def calculate_topic_similarity(self, node1_id: str, node2_id: str) -> Tuple[float, str]:
         """Calculate topic similarity between two nodes and provide reasoning."""
-        node1 = self.G.nodes[node1_id]
-        node2 = self.G.nodes[node2_id]
-        
-        hierarchy1 = self.extract_topic_hierarchy(node1)
-        hierarchy2 = self.extract_topic_hierarchy(node2)
+        similarity = self.topic_similarity(node1_id, node2_id)
+        return similarity, self.similarity_reason(node1_id, node2_id)
+
+    def topic_similarity(self, node1_id: str, node2_id: str) -> float:
+        """Weighted topic similarity of two nodes, without building the reasoning."""
+        import numpy as np
+
+        hierarchy1 = self.hierarchies[node1_id]
+        hierarchy2 = self.hierarchies[node2_id]
         
         similarity_scores = {}
-        shared_topics = defaultdict(set)
         
         for level in ["domain", "field", "subfield"]:
             set1 = hierarchy1[level]
@@ -81,31 +65,34 @@ class CollaborationAnalyzer:
                 base_similarity = len(intersection) / len(union)
                 noise = np.random.uniform(-0.05, 0.05)  # Add small random variation
                 similarity_scores[level] = max(0, min(1, base_similarity + noise))
-                shared_topics[level] = intersection
             else:
                 similarity_scores[level] = 0
         
-        weighted_similarity = sum(
+        return sum(
             similarity_scores[level] * weight 
             for level, weight in self.domain_weights.items()
         )
+
+    def similarity_reason(self, node1_id: str, node2_id: str) -> str:
+        """Reasoning of a recommendation: the domains, fields and subfields two nodes share."""
+        hierarchy1 = self.hierarchies[node1_id]
+        hierarchy2 = self.hierarchies[node2_id]
         
         reason_parts = []
         for level in ["domain", "field", "subfield"]:
-            if shared_topics[level]:
-                reason_parts.append(f"shared {level}s: {', '.join(shared_topics[level])}")
-        
-        reason = "Potential collaboration based on " + "; ".join(reason_parts) if reason_parts else "Limited topic overlap"
+            shared = hierarchy1[level] & hierarchy2[level]
+            if shared:
+                reason_parts.append(f"shared {level}s: {', '.join(shared)}")
         
-        return weighted_similarity, reason
+        return "Potential collaboration based on " + "; ".join(reason_parts) if reason_parts else "Limited topic overlap"
 
     def analyze_network_structure(self) -> Dict[str, float]:
         """Analyze network structure using centrality measures."""
         centrality_scores = {}
         
-        # Calculate different centrality measures
-        degree_cent = nx.degree_centrality(self.G)
-        betweenness_cent = nx.betweenness_centrality(self.G)
+        # Centrality measures, computed once per session
+        degree_cent = self.session.by_label(self.session.degree_centrality)
+        betweenness_cent = self.session.by_label(self.session.betweenness)
         
         # Combine centrality measures with weights
         for node in self.G.nodes():
@@ -118,34 +105,20 @@ class CollaborationAnalyzer:
 
     def create_visualization(self, potential_pairs: List[Dict], output_path: str):
         """Create and save a visualization of the collaboration network."""
-        plt.figure(figsize=(12, 8))
-        
-        # Create a scatter plot of topic similarity vs network score
-        similarities = [pair["topic_similarity_score"] for pair in potential_pairs]
-        network_scores = [pair["network_score"] for pair in potential_pairs]
-        combined_scores = [pair["combined_score"] for pair in potential_pairs]
-        
-        plt.scatter(similarities, network_scores, c=combined_scores, 
-                   cmap='viridis', alpha=0.6)
-        
-        plt.colorbar(label='Combined Score')
-        plt.xlabel('Topic Similarity Score')
-        plt.ylabel('Network Score')
-        plt.title('Potential Collaborations Analysis')
-        
-        # Add a trend line
-        z = np.polyfit(similarities, network_scores, 1)
-        p = np.poly1d(z)
-        plt.plot(similarities, p(similarities), "r--", alpha=0.8)
-        
-        plt.tight_layout()
-        plt.savefig(output_path)
-        plt.close()
+        from common import rendering
 
-    def find_potential_collaborators(self, min_similarity: float = 0.3) -> List[Dict]:
-        """Find and rank potential collaborator pairs."""
-        potential_pairs = []
-        centrality_scores = self.analyze_network_structure()
+        fig = rendering.draw_collaboration_scores(potential_pairs)
+        rendering.save_figure(fig, output_path)
+
+    def scored_pairs(self, min_similarity: float = 0.3) -> Iterator[Tuple[float, float, float, str, str]]:
+        """
+        Score every unconnected pair of nodes.
+        
+        Yields:
+            (combined_score, topic_similarity, network_score, node1, node2) for pairs reaching min_similarity
+        """
+        with telemetry.span("centrality", nodes=self.G.number_of_nodes()):
+            centrality_scores = self.analyze_network_structure()
         
         # Get all pairs of nodes
         nodes = list(self.G.nodes())
@@ -157,34 +130,84 @@ class CollaborationAnalyzer:
                 if self.G.has_edge(node1, node2):
                     continue
                 
-                # Calculate topic similarity and get reasoning
-                similarity, reason = self.calculate_topic_similarity(node1, node2)
+                similarity = self.topic_similarity(node1, node2)
                 
                 if similarity >= min_similarity:
                     # Calculate combined score including centrality
                     network_score = (centrality_scores[node1] + centrality_scores[node2]) / 2
                     combined_score = 0.7 * similarity + 0.3 * network_score
-                    
-                    pair_info = {
-                        "author_1": {
-                            "id": node1,
-                            "name": self.G.nodes[node1].get("label", "Unknown")
-                        },
-                        "author_2": {
-                            "id": node2,
-                            "name": self.G.nodes[node2].get("label", "Unknown")
-                        },
-                        "topic_similarity_score": round(similarity, 3),
-                        "network_score": round(network_score, 3),
-                        "combined_score": round(combined_score, 3),
-                        "reason": reason,
-                    }
-                    potential_pairs.append(pair_info)
+                    yield combined_score, similarity, network_score, node1, node2
+
+    def pair_info(self, combined_score: float, similarity: float, network_score: float,
+                  node1: str, node2: str) -> Dict:
+        """Recommendation record of a scored pair, with names and reasoning."""
+        return {
+            "author_1": {
+                "id": node1,
+                "name": self.G.nodes[node1].get("label", "Unknown")
+            },
+            "author_2": {
+                "id": node2,
+                "name": self.G.nodes[node2].get("label", "Unknown")
+            },
+            "topic_similarity_score": round(similarity, 3),
+            "network_score": round(network_score, 3),
+            "combined_score": round(combined_score, 3),
+            "reason": self.similarity_reason(node1, node2),
+        }
+
+    def find_potential_collaborators(self, min_similarity: float = 0.3) -> List[Dict]:
+        """Find and rank potential collaborator pairs."""
+        potential_pairs = [self.pair_info(*scored) for scored in self.scored_pairs(min_similarity)]
         
         # Sort by combined score
         potential_pairs.sort(key=lambda x: x["combined_score"], reverse=True)
         return potential_pairs
 
+    def find_top_collaborators(self, top_k: int = 0, per_author_k: int = 0,
+                               min_similarity: float = 0.3) -> Tuple[List[Dict], Dict[str, List[Dict]]]:
+        """
+        Find the best pairs by combined score while keeping only bounded heaps of scores.
+        
+        Args:
+            top_k: Number of pairs kept overall; 0 disables the global ranking
+            per_author_k: Number of pairs kept for every author; 0 disables the per-author ranking
+            min_similarity: Minimum topic similarity of a recommended pair
+        
+        Returns:
+            The global top pairs and the top pairs of every author, best first. Names and
+            reasoning are only materialised for these survivors.
+        """
+        top_heap = []
+        author_heaps = defaultdict(list)
+        for scored in self.scored_pairs(min_similarity):
+            if top_k:
+                self._push_bounded(top_heap, scored, top_k)
+            if per_author_k:
+                self._push_bounded(author_heaps[scored[3]], scored, per_author_k)
+                self._push_bounded(author_heaps[scored[4]], scored, per_author_k)
+        
+        # Pairs surviving in several rankings are materialised once
+        infos = {}
+        
+        def ranked(heap):
+            pairs = []
+            for scored in sorted(heap, reverse=True):
+                if scored[3:] not in infos:
+                    infos[scored[3:]] = self.pair_info(*scored)
+                pairs.append(infos[scored[3:]])
+            return pairs
+        
+        return ranked(top_heap), {author: ranked(heap) for author, heap in author_heaps.items()}
+
+    @staticmethod
+    def _push_bounded(heap: List, item, k: int):
+        """Keep the k largest items in a min-heap."""
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+
 
 class CloudCollaborationAnalyzer:
     def __init__(self, input_file_path: str, source_bucket: str, output_bucket: str = "collaborationanalysis"):
@@ -199,85 +222,128 @@ class CloudCollaborationAnalyzer:
         self.input_file_path = input_file_path
         self.source_bucket = source_bucket
         self.output_bucket = output_bucket
-        self.temp_input_file = None
+
+    def analyze_collaborations(self, min_similarity: float = 0.3, session=None, timestamp: str = None):
+        """
+        Run the collaboration analysis and save results to GCS.
         
-    def download_input_file(self):
-        """Download the input GML file from Google Cloud Storage to a temp file."""
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.source_bucket)
-        blob = bucket.blob(self.input_file_path)
+        Args:
+            min_similarity: Minimum topic similarity of a recommended pair
+            session: AnalysisSession of the input graph shared with other analyses; loaded here when omitted
+            timestamp: Timestamp used in the output names, shared by outputs emitted together
+        """
+        from common.analysis_session import AnalysisSession
+
+        print("Analyzing potential collaborations...")
         
-        # Create a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".gml")
-        self.temp_input_file = temp_file.name
-        temp_file.close()
+        # Initialize the analyzer by streaming the graph from GCS
+        if session is None:
+            session = AnalysisSession.from_blob(self.source_bucket, self.input_file_path)
+        analyzer = CollaborationAnalyzer(session=session)
         
-        # Download the file
-        blob.download_to_filename(self.temp_input_file)
-        print(f"Downloaded gs://{self.source_bucket}/{self.input_file_path} to {self.temp_input_file}")
+        # Create timestamp for file naming
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        return self.temp_input_file
-
-    def analyze_collaborations(self, min_similarity: float = 0.3):
-        """Run the collaboration analysis and save results to GCS."""
-        print("Analyzing potential collaborations...")
+        # Determine output folder name from input file
+        output_folder = os.path.basename(self.input_file_path).replace(".gml", "")
         
-        # Initialize the analyzer with the downloaded graph
-        analyzer = CollaborationAnalyzer(self.temp_input_file)
+        if TOP_K or PER_AUTHOR_K:
+            recommendations, json_path = self.write_top_collaborators(analyzer, min_similarity, output_folder, timestamp)
+        else:
+            recommendations, json_path = self.write_all_collaborators(analyzer, min_similarity, output_folder, timestamp)
+        
+        # Indexes behind the on-demand query function
+        with telemetry.span("build_index"):
+            recommendation_index.build_index(session, self.output_bucket, output_folder, version=timestamp)
+        
+        viz_path = f"{output_folder}/collaboration_visualization_{timestamp}.png"
+        if render_queue.render_mode() == "queue":
+            # The worker plots straight from the published recommendations
+            with telemetry.span("enqueue_render"):
+                render_queue.enqueue_render(
+                    "collaboration",
+                    output=render_queue.blob_ref(self.output_bucket, viz_path),
+                    data=render_queue.blob_ref(self.output_bucket, json_path),
+                )
+            return len(recommendations)
+        
+        # Render the visualization into memory
+        with telemetry.span("render"):
+            viz_buffer = io.BytesIO()
+            analyzer.create_visualization(recommendations, viz_buffer)
         
-        # Find potential collaborators
-        recommendations = analyzer.find_potential_collaborators(min_similarity=min_similarity)
+        # Upload visualization
+        with telemetry.span("upload_visualization"):
+            storage_backend.write_bytes(self.output_bucket, viz_path, viz_buffer.getvalue(), content_type="image/png")
+        print(f"Visualization saved to gs://{self.output_bucket}/{viz_path}")
         
-        # Create timestamp for file naming
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return len(recommendations)
+
+    def write_all_collaborators(self, analyzer: CollaborationAnalyzer, min_similarity: float,
+                                output_folder: str, timestamp: str) -> Tuple[List[Dict], str]:
+        """Score, sort and upload every qualifying pair as one JSON document."""
+        # Find potential collaborators
+        with telemetry.span("score_pairs") as attributes:
+            recommendations = analyzer.find_potential_collaborators(min_similarity=min_similarity)
+            attributes["recommendations"] = len(recommendations)
         
-        # Save results to JSON in a temporary file
+        # Serialize results to JSON
         json_data = {
             "generated_at": datetime.now().isoformat(),
             "number_of_recommendations": len(recommendations),
             "recommendations": recommendations
         }
         
-        # Create temp file for JSON results
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as temp_json:
-            temp_json_path = temp_json.name
-            json.dump(json_data, temp_json, indent=2)
-        
-        # Create temp file for visualization
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_viz:
-            temp_viz_path = temp_viz.name
-        
-        # Create visualization
-        analyzer.create_visualization(recommendations, temp_viz_path)
-        
-        # Upload results to GCS
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(self.output_bucket)
-        
-        # Determine output folder name from input file
-        output_folder = os.path.basename(self.input_file_path).replace(".gml", "")
-        
         # Upload JSON results
-        json_blob = bucket.blob(f"{output_folder}/recommendations_{timestamp}.json")
-        json_blob.upload_from_filename(temp_json_path)
-        print(f"Results saved to gs://{self.output_bucket}/{output_folder}/recommendations_{timestamp}.json")
-        
-        # Upload visualization
-        viz_blob = bucket.blob(f"{output_folder}/collaboration_visualization_{timestamp}.png")
-        viz_blob.upload_from_filename(temp_viz_path)
-        print(f"Visualization saved to gs://{self.output_bucket}/{output_folder}/collaboration_visualization_{timestamp}.png")
+        json_path = f"{output_folder}/recommendations_{timestamp}.json"
+        with telemetry.span("upload_results"):
+            storage_backend.write_bytes(self.output_bucket, json_path, json.dumps(json_data, indent=2),
+                                        content_type="application/json")
+        print(f"Results saved to gs://{self.output_bucket}/{json_path}")
         
-        # Clean up temporary files
-        os.remove(temp_json_path)
-        os.remove(temp_viz_path)
-        
-        return len(recommendations)
+        return recommendations, json_path
+
+    def write_top_collaborators(self, analyzer: CollaborationAnalyzer, min_similarity: float,
+                                output_folder: str, timestamp: str) -> Tuple[List[Dict], str]:
+        """
+        Keep the TOP_K best pairs and the PER_AUTHOR_K best pairs of every author and stream them as NDJSON.
         
-    def cleanup(self):
-        """Clean up temporary files."""
-        if self.temp_input_file and os.path.exists(self.temp_input_file):
-            os.remove(self.temp_input_file)
-            print(f"Deleted temporary input file {self.temp_input_file}")
+        Returns:
+            The recommended pairs, best first, and the path of the NDJSON file holding one pair per line
+        """
+        with telemetry.span("score_pairs", top_k=TOP_K, per_author_k=PER_AUTHOR_K) as attributes:
+            top_pairs, author_pairs = analyzer.find_top_collaborators(TOP_K, PER_AUTHOR_K, min_similarity)
+            attributes["recommendations"] = len(top_pairs)
+            attributes["authors"] = len(author_pairs)
+        
+        json_path = None
+        with telemetry.span("upload_results"):
+            if TOP_K:
+                json_path = f"{output_folder}/recommendations_{timestamp}.ndjson"
+                self.write_ndjson(json_path, top_pairs)
+            if PER_AUTHOR_K:
+                by_author_path = f"{output_folder}/recommendations_by_author_{timestamp}.ndjson"
+                self.write_ndjson(by_author_path, (
+                    {"author": {"id": author, "name": analyzer.G.nodes[author].get("label", "Unknown")},
+                     "recommendations": pairs}
+                    for author, pairs in author_pairs.items()
+                ))
+        
+        if TOP_K:
+            return top_pairs, json_path
+        
+        # Without a global ranking the per-author lists are plotted, each pair once
+        unique_pairs = {(pair["author_1"]["id"], pair["author_2"]["id"]): pair
+                        for pairs in author_pairs.values() for pair in pairs}
+        recommendations = sorted(unique_pairs.values(), key=lambda x: x["combined_score"], reverse=True)
+        return recommendations, by_author_path
+
+    def write_ndjson(self, blob_name: str, records):
+        """Stream records to the output bucket, one JSON object per line."""
+        with storage_backend.open_blob(self.output_bucket, blob_name, "wb", content_type="application/x-ndjson") as f:
+            for record in records:
+                f.write(json.dumps(record).encode() + b"\n")
+        print(f"Results saved to gs://{self.output_bucket}/{blob_name}")
 
 
 @functions_framework.cloud_event
@@ -298,29 +364,31 @@ def analyze_collaboration_network(cloud_event):
         print(f"Skipping non-target file: gs://{bucket_name}/{file_path}")
         return
     
+    output_bucket = "collaborationanalysis"
+
+    # Duplicate deliveries and re-uploads of unchanged content stop here, before any download
+    event = idempotency.check_event(data, output_bucket, "analyze_collaboration_network", __file__)
+    if event is None:
+        return
+    
     print(f"Processing collaboration analysis for: gs://{bucket_name}/{file_path}")
     
-    try:
-        # Initialize the cloud analyzer
-        analyzer = CloudCollaborationAnalyzer(
-            input_file_path=file_path,
-            source_bucket=bucket_name,
-            output_bucket="collaborationanalysis"
-        )
-        
-        # Download the input file
-        analyzer.download_input_file()
-        
-        # Run the analysis
-        num_recommendations = analyzer.analyze_collaborations(min_similarity=0.3)
+    with telemetry.run("analyze_collaboration_network", bucket=bucket_name, name=file_path) as run:
+        try:
+            # Initialize the cloud analyzer
+            analyzer = CloudCollaborationAnalyzer(
+                input_file_path=file_path,
+                source_bucket=bucket_name,
+                output_bucket=output_bucket
+            )
         
-        print(f"Analysis complete. Found {num_recommendations} potential collaborations.")
+            # Run the analysis
+            num_recommendations = analyzer.analyze_collaborations(min_similarity=0.3)
+            run.attributes["recommendations"] = num_recommendations
+            event.mark_processed(recommendations=num_recommendations, run_id=run.run_id)
         
-    except Exception as e:
-        print(f"Error processing file: {e}")
-        raise
+            print(f"Analysis complete. Found {num_recommendations} potential collaborations.")
         
-    finally:
-        # Clean up temporary files
-        if 'analyzer' in locals():
-            analyzer.cleanup()
\ No newline at end of file
+        except Exception as e:
+            print(f"Error processing file: {e}")
+            raise
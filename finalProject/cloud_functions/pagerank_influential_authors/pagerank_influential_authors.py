@@ -1,7 +1,9 @@
 import networkx as nx
-from collections import defaultdict
 import json
 
+import numpy as np
+from scipy import sparse
+
 def load_graph(graph_file):
     """
     Load the citation graph from a GML file.
@@ -10,72 +12,152 @@ def load_graph(graph_file):
     print(f"Loaded graph with {len(citation_graph.nodes())} nodes and {len(citation_graph.edges())} edges.")
     return citation_graph
 
-def rank_authors_pagerank(graph, alpha=0.85):
-    """
-    Ranks authors using PageRank based on the citation network.
-    Returns a dictionary mapping topics to their most influential authors.
-    """
-    author_graph = nx.DiGraph()
-    author_papers = defaultdict(set)  # {author: {papers}}
-    
-    # Step 1: Create an author citation graph
-    for node in graph.nodes():
-        authors = graph.nodes[node].get('authors', [])
-        citations = list(graph.neighbors(node))  # Papers cited by this paper
-
-        # Ensure authors is a list (handle string storage)
-        if isinstance(authors, str):
-            authors = json.loads(authors)
-
-        for author in authors:
-            author_name = author.get("display_name", "Unknown Author")
-            author_graph.add_node(author_name)
-            author_papers[author_name].add(node)
-
-            # Link authors if they are cited by other papers
-            for cited_paper in citations:
-                cited_authors = graph.nodes[cited_paper].get('authors', [])
-                if isinstance(cited_authors, str):
-                    cited_authors = json.loads(cited_authors)
-
-                for cited_author in cited_authors:
-                    cited_author_name = cited_author.get("display_name", "Unknown Author")
-                    author_graph.add_edge(author_name, cited_author_name)  # Directed edge
+def _as_list(value):
+    """Node attribute list, whether stored as a list, a JSON string or a single GML dict."""
+    if isinstance(value, str):
+        value = json.loads(value) if value else []
+    elif isinstance(value, dict):
+        value = [value]
+    return value
 
-    # Step 2: Compute PageRank on the author citation graph
-    pagerank_scores = nx.pagerank(author_graph, alpha=alpha)
 
-    # Step 3: Assign PageRank scores to topics
-    author_topic_scores = defaultdict(lambda: defaultdict(float))  # {topic: {author: score}}
+class AuthorMatrix:
+    """
+    Integer-indexed authors of a citation graph.
 
-    for node in graph.nodes():
-        authors = graph.nodes[node].get('authors', [])
-        topics = graph.nodes[node].get('topics', [])
+    Authors are keyed by their OpenAlex ID, so distinct authors sharing a
+    display name stay apart; author i is ids[i], and names[i] is only used
+    for output. paper_authors is the paper x author occurrence matrix (in
+    graph node order) and citations the author x author matrix with a 1
+    where an author of a paper cites an author of a paper it references.
+    """
 
-        if isinstance(authors, str):
-            authors = json.loads(authors)
-        if isinstance(topics, str):
-            topics = json.loads(topics)
+    def __init__(self, ids, names, paper_authors, citations):
+        self.ids = ids
+        self.names = names
+        self.paper_authors = paper_authors
+        self.citations = citations
+
+    @classmethod
+    def from_graph(cls, graph):
+        nodes = list(graph.nodes())
+        position = {node: i for i, node in enumerate(nodes)}
+        author_index = {}
+        ids, names = [], []
+        rows, cols = [], []
+        for row, node in enumerate(nodes):
+            for author in _as_list(graph.nodes[node].get('authors', [])):
+                name = author.get("display_name", "Unknown Author")
+                # Authors without an OpenAlex ID fall back to their name
+                key = author.get("id") or name
+                if key not in author_index:
+                    author_index[key] = len(ids)
+                    ids.append(key)
+                    names.append(name)
+                rows.append(row)
+                cols.append(author_index[key])
+
+        # Repeated entries are summed, so an author listed twice on a paper counts twice
+        paper_authors = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(nodes), len(ids)))
+
+        edges = graph.number_of_edges()
+        paper_citations = sparse.csr_matrix(
+            (np.ones(edges),
+             (np.fromiter((position[u] for u, _ in graph.edges()), dtype=np.int64, count=edges),
+              np.fromiter((position[v] for _, v in graph.edges()), dtype=np.int64, count=edges))),
+            shape=(len(nodes), len(nodes)))
+
+        # Author a cites author b when a paper of a cites a paper of b; like DiGraph edges, repeats count once
+        citations = (paper_authors.T @ paper_citations @ paper_authors).tocsr()
+        citations.data[:] = 1
+        return cls(ids, names, paper_authors, citations)
+
+    def save(self, file):
+        """Write the matrices and lookup arrays to an .npz file or file object."""
+        arrays = {"ids": np.array(self.ids), "names": np.array(self.names)}
+        for name in ("paper_authors", "citations"):
+            matrix = getattr(self, name)
+            arrays.update({f"{name}_data": matrix.data, f"{name}_indices": matrix.indices,
+                           f"{name}_indptr": matrix.indptr, f"{name}_shape": np.array(matrix.shape)})
+        np.savez_compressed(file, **arrays)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as arrays:
+            matrices = {name: sparse.csr_matrix((arrays[f"{name}_data"], arrays[f"{name}_indices"],
+                                                 arrays[f"{name}_indptr"]), shape=tuple(arrays[f"{name}_shape"]))
+                        for name in ("paper_authors", "citations")}
+            return cls(arrays["ids"].tolist(), arrays["names"].tolist(), **matrices)
+
+
+def pagerank(matrix, alpha=0.85, max_iter=100, tol=1.0e-6):
+    """
+    PageRank of the nodes of a sparse adjacency matrix.
 
-        for topic in topics:
-            topic_name = topic["display_name"]
+    Same power iteration as nx.pagerank, including uniform redistribution of
+    the rank of dangling nodes, without building a networkx graph.
+    """
+    N = matrix.shape[0]
+    if N == 0:
+        return np.zeros(0)
+
+    out_degree = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = out_degree == 0
+    inverse = np.divide(1.0, out_degree, out=np.zeros(N), where=~dangling)
+    transition = (sparse.diags(inverse) @ matrix).tocsr()
+
+    x = np.repeat(1.0 / N, N)
+    p = np.repeat(1.0 / N, N)
+    for _ in range(max_iter):
+        xlast = x
+        x = alpha * (x @ transition + x[dangling].sum() * p) + (1 - alpha) * p
+        # check convergence, l1 norm
+        if np.absolute(x - xlast).sum() < N * tol:
+            return x
+    raise nx.PowerIterationFailedConvergence(max_iter)
+
+
+def rank_authors_pagerank(graph, alpha=0.85, author_matrix=None):
+    """
+    Ranks authors using PageRank based on the citation network.
+    Returns a dictionary mapping topics to their most influential authors,
+    as (display name, score, OpenAlex author ID) tuples.
+    """
+    # Step 1: Create the integer-indexed author citation graph
+    if author_matrix is None:
+        author_matrix = AuthorMatrix.from_graph(graph)
 
-            for author in authors:
-                author_name = author.get("display_name", "Unknown Author")
-                author_topic_scores[topic_name][author_name] += pagerank_scores.get(author_name, 0)
+    # Step 2: Compute PageRank on the author citation graph
+    scores = pagerank(author_matrix.citations, alpha=alpha)
+
+    # Step 3: Assign PageRank scores to topics; a paper adds the score of each
+    # of its authors once per occurrence of the topic
+    topic_index = {}
+    rows, cols = [], []
+    for row, node in enumerate(graph.nodes()):
+        for topic in _as_list(graph.nodes[node].get('topics', [])):
+            rows.append(row)
+            cols.append(topic_index.setdefault(topic["display_name"], len(topic_index)))
+    paper_topics = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)),
+                                     shape=(author_matrix.paper_authors.shape[0], len(topic_index)))
+    topic_scores = (paper_topics.T @ author_matrix.paper_authors @ sparse.diags(scores)).tocsr()
 
     # Step 4: Sort authors within each topic by influence score
-    ranked_authors = {
-        topic: sorted(author_counter.items(), key=lambda x: x[1], reverse=True)
-        for topic, author_counter in author_topic_scores.items()
-    }
+    ranked_authors = {}
+    for topic, t in topic_index.items():
+        start, end = topic_scores.indptr[t], topic_scores.indptr[t + 1]
+        authors, values = topic_scores.indices[start:end], topic_scores.data[start:end]
+        # Ties go to the author seen first in the graph
+        order = np.lexsort((authors, -values))
+        ranked_authors[topic] = [(author_matrix.names[authors[i]], float(values[i]), author_matrix.ids[authors[i]])
+                                 for i in order]
 
     return ranked_authors
 
 def print_top_authors(ranked_authors, top_n=5):
     for topic, authors in ranked_authors.items():
         print(f"\n🔹 Top {top_n} Authors for Topic: {topic}")
-        for author, score in authors[:top_n]:
+        for author, score, _ in authors[:top_n]:
             print(f"  {author}: {score:.4f}")  # Show PageRank score
 
 if __name__ == "__main__":
@@ -3,7 +3,7 @@ import json
 
 import networkx as nx
 import pandas as pd
-from google.cloud import storage
+from common import raw_store, storage_backend
 
 
 def fetch_and_process_works_data(bucket_name, blob_name):
@@ -12,22 +12,24 @@ def fetch_and_process_works_data(bucket_name, blob_name):
 
     Args:
         bucket_name (str): Name of the GCS bucket
-        blob_name (str): Path to the JSON file in the bucket
+        blob_name (str): Path to the JSON file in the bucket; its chunked copy is read when it exists
 
     Returns:
         pandas.DataFrame: Processed works data
     """
-    # Initialize the GCS client
-    storage_client = storage.Client()
+    return process_works(raw_store.load_works(bucket_name, blob_name))
 
-    # Get bucket and blob
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(blob_name)
 
-    # Download and parse JSON data
-    json_data = blob.download_as_string()
-    works_data = json.loads(json_data)
+def process_works(works_data):
+    """
+    Extract the works table from parsed works data.
+
+    Args:
+        works_data (dict): The parsed JSON data containing works information.
 
+    Returns:
+        pandas.DataFrame: Processed works data
+    """
     # Extract relevant fields from works data
     works_list = []
     for work in works_data.get("results", []):
@@ -79,6 +81,69 @@ def create_citation_graph(works_data):
     return citation_graph
 
 
+def _detailed_topic(topic):
+    """Reduce an OpenAlex topic to the id/name hierarchy used by fetchinputdata.py."""
+    detailed = {"id": topic.get("id", ""), "display_name": topic.get("display_name", "")}
+    for level in ("subfield", "field", "domain"):
+        detailed[level] = {
+            "id": topic.get(level, {}).get("id", ""),
+            "display_name": topic.get(level, {}).get("display_name", ""),
+        }
+    return detailed
+
+
+def create_detailed_citation_graph(works_data):
+    """
+    Creates a citation graph whose paper nodes carry the attributes the
+    analysis functions read: title, topics, pubdate and authors.
+
+    This is the offline equivalent of citation_graph/fetchinputdata.py,
+    built from referenced_works instead of fetching related works.
+
+    Args:
+        works_data (dict): The parsed JSON data containing works information.
+
+    Returns:
+        networkx.DiGraph: A directed graph representing the citation network.
+    """
+    citation_graph = nx.DiGraph()
+
+    for work in works_data.get("results", []):
+        paper_id = work.get("id")
+        citation_graph.add_node(
+            paper_id,
+            title=work.get("title") or "",
+            cited_by_count=work.get("cited_by_count") or 0,
+            pubdate=work.get("publication_date") or "",
+            topics=[_detailed_topic(topic) for topic in work.get("topics", [])],
+            authors=[
+                {
+                    "id": authorship.get("author", {}).get("id") or "",
+                    "display_name": authorship.get("author", {}).get("display_name") or "",
+                }
+                for authorship in work.get("authorships", [])
+            ],
+        )
+        for reference in work.get("referenced_works", []):
+            citation_graph.add_edge(paper_id, reference)
+
+    return citation_graph
+
+
+def save_gml_to_gcs(graph, bucket_name, output_blob_name):
+    """
+    Saves a NetworkX graph to Google Cloud Storage in GML format.
+
+    Args:
+        graph (networkx.Graph): The graph to save.
+        bucket_name (str): The name of the GCS bucket.
+        output_blob_name (str): The path to save the graph in the bucket.
+    """
+    # Stream GML lines straight into the blob
+    with storage_backend.open_blob(bucket_name, output_blob_name, "wb", content_type="text/plain") as f:
+        nx.write_gml(graph, f)
+
+
 def save_graph_to_gcs(graph, bucket_name, output_blob_name):
     """
     Saves a NetworkX graph to Google Cloud Storage as a JSON file.
@@ -88,16 +153,12 @@ def save_graph_to_gcs(graph, bucket_name, output_blob_name):
         bucket_name (str): The name of the GCS bucket.
         output_blob_name (str): The path to save the graph in the bucket.
     """
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(output_blob_name)
-
     # Convert graph to JSON
     graph_data = nx.node_link_data(graph)
     graph_json = json.dumps(graph_data)
 
     # Upload to GCS
-    blob.upload_from_string(graph_json, content_type="application/json")
+    storage_backend.write_bytes(bucket_name, output_blob_name, graph_json, content_type="application/json")
 
 
 def save_to_gcs(df, bucket_name, output_blob_name, format="csv"):
@@ -110,10 +171,6 @@ def save_to_gcs(df, bucket_name, output_blob_name, format="csv"):
         output_blob_name (str): Path where to save the file
         format (str): Output format ('csv' or 'parquet')
     """
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(bucket_name)
-    blob = bucket.blob(output_blob_name)
-
     # Create a buffer to store the data
     buffer = io.BytesIO()
 
@@ -126,8 +183,7 @@ def save_to_gcs(df, bucket_name, output_blob_name, format="csv"):
         raise ValueError("Format must be either 'csv' or 'parquet'")
 
     # Upload to GCS
-    buffer.seek(0)
-    blob.upload_from_file(buffer)
+    storage_backend.write_bytes(bucket_name, output_blob_name, buffer.getvalue())
 
 
 # Example usage
@@ -141,18 +197,11 @@ if __name__ == "__main__":
 
     try:
         # Fetch data
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(INPUT_BUCKET_NAME)
-        blob = bucket.blob(INPUT_BLOB_NAME)
-
-        # Download and parse JSON data
-        json_data = blob.download_as_string()
-        works_data = json.loads(json_data)
+        # Download and parse the works, from the compressed chunks when they exist
+        works_data = raw_store.load_works(INPUT_BUCKET_NAME, INPUT_BLOB_NAME)
 
         # Process data into DataFrame
-        works_df = fetch_and_process_works_data(
-            INPUT_BUCKET_NAME, INPUT_BLOB_NAME
-        )
+        works_df = process_works(works_data)
 
         # Display the top 5 papers
         print("Top 5 papers:")
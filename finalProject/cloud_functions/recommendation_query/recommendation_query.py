@@ -0,0 +1,71 @@
+"""
+HTTP function answering collaborator and topic queries from prebuilt indexes.
+
+    GET ?author=A5000000394&k=10     collaborators recommended for an author
+    GET ?topic=T10803&k=10           most influential authors of a topic
+
+The indexes are built by the collaboration analysis (see
+common/recommendation_index.py). An instance downloads the latest version
+once, memory-maps it and keeps answers in an LRU cache across warm
+invocations; the latest.json pointer is re-read at most every
+INDEX_REFRESH_SECONDS.
+"""
+import json
+import os
+import time
+import functions_framework
+from common import recommendation_index
+
+INDEX_BUCKET = os.environ.get("INDEX_BUCKET", "collaborationanalysis")
+INDEX_GRAPH = os.environ.get("INDEX_GRAPH", "co_authorship_graph")
+INDEX_REFRESH_SECONDS = float(os.environ.get("INDEX_REFRESH_SECONDS", "60"))
+DEFAULT_K = 10
+MAX_K = 100
+
+_indexes = recommendation_index.IndexCache()
+_latest = {"version": None, "checked_at": 0.0}
+
+
+def current_index() -> recommendation_index.RecommendationIndex:
+    """Index of the latest version, re-reading the version pointer when the last check is stale."""
+    now = time.monotonic()
+    if _latest["version"] is None or now - _latest["checked_at"] >= INDEX_REFRESH_SECONDS:
+        _latest["version"] = recommendation_index.latest_version(INDEX_BUCKET, INDEX_GRAPH)
+        _latest["checked_at"] = now
+    return _indexes.get(INDEX_BUCKET, INDEX_GRAPH, _latest["version"])
+
+
+def _response(body: dict, status: int = 200):
+    return json.dumps(body), status, {"Content-Type": "application/json"}
+
+
+@functions_framework.http
+def query_recommendations(request):
+    """
+    HTTP Cloud Function answering author and topic queries.
+    
+    Args:
+        request: The Flask request; 'author' or 'topic' selects the query, 'k' the number of results
+    """
+    author = request.args.get("author")
+    topic = request.args.get("topic")
+    try:
+        k = min(int(request.args.get("k", DEFAULT_K)), MAX_K)
+    except ValueError:
+        return _response({"error": "k must be an integer"}, 400)
+    if bool(author) == bool(topic) or k < 1:
+        return _response({"error": "Pass exactly one of 'author' or 'topic', and k >= 1"}, 400)
+    
+    start = time.perf_counter()
+    index = current_index()
+    try:
+        if author:
+            body = {"author": author, "recommendations": index.recommend_collaborators(author, k)}
+        else:
+            body = {"topic": index.topic(topic), "authors": index.top_authors(topic, k)}
+    except KeyError:
+        return _response({"error": f"Unknown {'author' if author else 'topic'}: {author or topic}"}, 404)
+    
+    body["index_version"] = index.version
+    body["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return _response(body)
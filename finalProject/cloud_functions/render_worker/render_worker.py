@@ -0,0 +1,182 @@
+import json
+import os
+from datetime import datetime
+from typing import TYPE_CHECKING
+import functions_framework
+from common import render_queue, storage_backend, telemetry
+
+# Every finished job is moved to done/, which triggers this function again and
+# is skipped, so networkx and the rendering helpers are imported where they are used
+if TYPE_CHECKING:
+    import networkx as nx
+
+
+class RenderWorker:
+    def __init__(self, jobs_bucket: str = render_queue.RENDER_JOBS_BUCKET):
+        """
+        Render visualizations queued by the analysis functions.
+
+        Args:
+            jobs_bucket: Bucket holding the render jobs
+        """
+        self.jobs_bucket = jobs_bucket
+        self.renderers = {
+            "coauthorship": self.render_coauthorship,
+            "gaps": self.render_gaps,
+            "collaboration": self.render_collaboration,
+        }
+
+    @staticmethod
+    def load_graph(ref: dict) -> "nx.Graph":
+        """Stream a GML graph; nodes are keyed by their label (the author ID)."""
+        import networkx as nx
+
+        with storage_backend.open_blob(ref["bucket"], ref["name"], "rb") as f:
+            return nx.read_gml(f)
+
+    @staticmethod
+    def load_json(ref: dict):
+        with storage_backend.open_blob(ref["bucket"], ref["name"], "rb") as f:
+            return json.load(f)
+
+    @staticmethod
+    def load_ndjson_recommendations(ref: dict) -> list:
+        """Read bounded recommendations: one pair per line, or one author with their pairs per line."""
+        pairs = {}
+        with storage_backend.open_blob(ref["bucket"], ref["name"], "rb") as f:
+            for line in f:
+                record = json.loads(line)
+                for pair in record.get("recommendations", [record]):
+                    pairs[(pair["author_1"]["id"], pair["author_2"]["id"])] = pair
+        return sorted(pairs.values(), key=lambda x: x["combined_score"], reverse=True)
+
+    @staticmethod
+    def publish(job: dict, draw):
+        """Write the preview first, then the full-resolution PNG."""
+        from common import rendering
+
+        options = job["options"]
+        output = job["output"]
+
+        if options.get("preview_dpi"):
+            preview = render_queue.preview_path(output["name"])
+            storage_backend.write_bytes(output["bucket"], preview, rendering.figure_to_png(draw(), options["preview_dpi"]),
+                                        content_type="image/png")
+            print(f"Preview saved to gs://{output['bucket']}/{preview}")
+
+        storage_backend.write_bytes(output["bucket"], output["name"], rendering.figure_to_png(draw(), options["dpi"]),
+                                    content_type="image/png")
+        print(f"Visualization saved to gs://{output['bucket']}/{output['name']}")
+
+    def render_coauthorship(self, job: dict):
+        from common import layout, rendering
+
+        graph = self.load_graph(job["graph"])
+        previous = job.get("previous_layout") or {}
+        pos = layout.cached_layout(graph, job["layout"]["bucket"], job["layout"]["name"], previous.get("name"))
+        labels = {node: name for node, name in job.get("labels", {}).items() if node in graph}
+
+        self.publish(job, lambda: rendering.draw_coauthorship_network(graph, pos, labels, job["options"]))
+
+    def render_gaps(self, job: dict):
+        from common import layout, rendering, webgl_export
+
+        graph = self.load_graph(job["graph"])
+        partition = job.get("partition", {})
+
+        # The gaps view always places communities first; its cache only serves an unchanged graph
+        pos = layout.cached_layout(graph, job["layout"]["bucket"], job["layout"]["name"], warm=False,
+                                   compute=lambda g: layout.community_layout(g, partition))
+
+        formats = job["options"].get("formats", ["png"])
+        if "webgl" in formats:
+            webgl_export.export_graph(graph, pos, job["output"]["bucket"], job["webgl_prefix"],
+                                      partition=partition, highlight=job.get("label_nodes", []))
+        if "png" in formats:
+            self.publish(job, lambda: rendering.draw_gap_network(graph, pos, partition, job.get("label_nodes", []),
+                                                                 options=job["options"]))
+
+    def render_collaboration(self, job: dict):
+        from common import rendering
+
+        if job["data"]["name"].endswith(".ndjson"):
+            recommendations = self.load_ndjson_recommendations(job["data"])
+        else:
+            recommendations = self.load_json(job["data"])["recommendations"]
+        self.publish(job, lambda: rendering.draw_collaboration_scores(recommendations, job["options"]))
+
+    def process_job(self, job_path: str) -> bool:
+        """
+        Render one job and move it to done/, or to failed/ with the error when rendering raises.
+
+        A failed job is not raised: it has already left jobs/, so a retried
+        event would find nothing to render. Returns whether the job rendered.
+        """
+        job = self.load_json(render_queue.blob_ref(self.jobs_bucket, job_path))
+        print(f"Rendering {job['kind']} job {job['job_id']}...")
+
+        started = datetime.now()
+        try:
+            with telemetry.span(f"render.{job['kind']}", job_id=job["job_id"]):
+                self.renderers[job["kind"]](job)
+            target = render_queue.DONE_PREFIX
+        except Exception as e:
+            print(f"Render job {job['job_id']} failed: {e}")
+            job["error"] = str(e)
+            target = render_queue.FAILED_PREFIX
+        job["rendered_at"] = datetime.now().isoformat()
+        job["render_seconds"] = round((datetime.now() - started).total_seconds(), 3)
+
+        storage_backend.write_bytes(self.jobs_bucket, target + job_path[len(render_queue.JOBS_PREFIX):],
+                                    json.dumps(job), content_type="application/json")
+        storage_backend.get_blob(self.jobs_bucket, job_path).delete()
+        return target == render_queue.DONE_PREFIX
+
+    def process_pending(self) -> int:
+        """Render every queued job, oldest first. Returns the number of jobs processed."""
+        blobs = storage_backend.get_client().list_blobs(self.jobs_bucket, prefix=render_queue.JOBS_PREFIX)
+        # Job names start with their creation time
+        job_paths = sorted((blob.name for blob in blobs), key=os.path.basename)
+        failed = []
+        for job_path in job_paths:
+            try:
+                rendered = self.process_job(job_path)
+            except Exception as e:
+                # The job could not be read or moved and stays in jobs/
+                print(f"Render job {job_path} could not be processed: {e}")
+                rendered = False
+            if not rendered:
+                failed.append(job_path)
+
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(job_paths)} render jobs failed: {', '.join(failed)}")
+        return len(job_paths)
+
+
+@functions_framework.cloud_event
+def render_job(cloud_event):
+    """
+    Cloud Function triggered when a render job is written to the jobs bucket.
+    Draws the requested visualization and saves it next to the analysis results.
+
+    Args:
+        cloud_event: The Cloud Event that triggered this function
+    """
+    data = cloud_event.data
+    bucket_name = data["bucket"]
+    file_path = data["name"]
+
+    # Finished jobs are moved to done/, which triggers this function again
+    if not file_path.startswith(render_queue.JOBS_PREFIX) or not file_path.endswith(".json"):
+        print(f"Skipping non-target file: gs://{bucket_name}/{file_path}")
+        return
+
+    print(f"Processing render job: gs://{bucket_name}/{file_path}")
+
+    with telemetry.run("render_job", bucket=bucket_name, name=file_path):
+        try:
+            if not RenderWorker(jobs_bucket=bucket_name).process_job(file_path):
+                telemetry.count("render.jobs_failed")
+        except Exception as e:
+            print(f"Error processing file: {e}")
+            raise
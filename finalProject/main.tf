@@ -4,6 +4,10 @@ terraform {
       source  = "hashicorp/google"
       version = "~> 5.0"
     }
+    archive = {
+      source  = "hashicorp/archive"
+      version = "~> 2.4"
+    }
   }
 }
 
@@ -38,18 +42,68 @@ resource "google_storage_bucket" "function_bucket" {
   force_destroy = true
 }
 
-# Cloud Function source code object for fetch_data
+# Shared helpers imported by the functions as the "common" package
+locals {
+  common_sources = fileset("${path.module}/cloud_functions/common", "*.py")
+}
+
+# Source archive for fetch_data: main.py and requirements.txt plus common/
+data "archive_file" "fetch_data_zip" {
+  type        = "zip"
+  output_path = "${path.module}/build/fetch-data.zip"
+
+  source {
+    content  = file("${path.module}/cloud_functions/fetch_data/main.py")
+    filename = "main.py"
+  }
+  source {
+    content  = file("${path.module}/cloud_functions/fetch_data/requirements.txt")
+    filename = "requirements.txt"
+  }
+  dynamic "source" {
+    for_each = local.common_sources
+    content {
+      content  = file("${path.module}/cloud_functions/common/${source.value}")
+      filename = "common/${source.value}"
+    }
+  }
+}
+
+# Source archive for preprocess_data: main.py and requirements.txt plus common/
+data "archive_file" "preprocess_data_zip" {
+  type        = "zip"
+  output_path = "${path.module}/build/preprocess-data.zip"
+
+  source {
+    content  = file("${path.module}/cloud_functions/preprocess_data/main.py")
+    filename = "main.py"
+  }
+  source {
+    content  = file("${path.module}/cloud_functions/preprocess_data/requirements.txt")
+    filename = "requirements.txt"
+  }
+  dynamic "source" {
+    for_each = local.common_sources
+    content {
+      content  = file("${path.module}/cloud_functions/common/${source.value}")
+      filename = "common/${source.value}"
+    }
+  }
+}
+
+# Cloud Function source code object for fetch_data (named by content hash so
+# a code change redeploys the function)
 resource "google_storage_bucket_object" "fetch_data_code" {
-  name   = "cloud_functions/fetch_data/fetch-data.zip"
+  name   = "cloud_functions/fetch_data/fetch-data-${data.archive_file.fetch_data_zip.output_md5}.zip"
   bucket = google_storage_bucket.function_bucket.name
-  source = "cloud_functions/fetch_data/fetch-data.zip"
+  source = data.archive_file.fetch_data_zip.output_path
 }
 
 # Cloud Function source code object for preprocess_data
 resource "google_storage_bucket_object" "preprocess_data_code" {
-  name   = "cloud_functions/preprocess_data/preprocess-data.zip"
+  name   = "cloud_functions/preprocess_data/preprocess-data-${data.archive_file.preprocess_data_zip.output_md5}.zip"
   bucket = google_storage_bucket.function_bucket.name
-  source = "cloud_functions/preprocess_data/preprocess-data.zip"
+  source = data.archive_file.preprocess_data_zip.output_path
 }
 
 # Cloud Function resource for fetch_data (triggered by object creation in raw_data bucket)
@@ -0,0 +1,10 @@
+"""
+Local, in-process runner for the whole research analysis pipeline.
+
+Usage (from finalProject/):
+    python -m pipeline --works-file cloud_functions/citation_graph/publications.json
+"""
+from pipeline.runner import PipelineRunner
+from pipeline.stages import STAGES, Stage
+
+__all__ = ["PipelineRunner", "STAGES", "Stage"]
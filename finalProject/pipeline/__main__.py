@@ -0,0 +1,83 @@
+"""Command line entry point: python -m pipeline --help"""
+import argparse
+
+from pipeline.runner import PipelineRunner
+from pipeline.stages import (API_SOURCE_STAGES, SEPARATE_ANALYSIS_STAGES, SHARED_ANALYSIS_STAGES,
+                             SNAPSHOT_SOURCE_STAGES, STAGES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the research analysis pipeline against local buckets.")
+    parser.add_argument("--root", default="local_buckets", help="Directory standing in for the GCS buckets")
+    parser.add_argument("--works-file", help="OpenAlex works JSON to seed the raw bucket with instead of calling the API")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel worker processes (1 runs in-process)")
+    parser.add_argument("--skip", action="append", default=[], choices=[stage.name for stage in STAGES],
+                        help="Stage to skip; may be given several times")
+    parser.add_argument("--snapshot-dir", help="OpenAlex snapshot directory to build the graphs from instead of the API")
+    parser.add_argument("--snapshot-workers", type=int, default=None, help="Processes parsing snapshot partitions")
+    parser.add_argument("--coauthorship-shards", type=int, default=None,
+                        help="Build the co-authorship graph in this many shards, run as parallel processes")
+    parser.add_argument("--shard-workers", type=int, default=None, help="Processes running co-authorship shards")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fetch only works updated since the last harvest instead of the whole query")
+    parser.add_argument("--max-pages", type=int, default=None, help="OpenAlex pages fetched per incremental harvest")
+    parser.add_argument("--crawl-hops", type=int, default=0,
+                        help="Levels of referenced works to fetch from OpenAlex after loading the works")
+    parser.add_argument("--crawl-budget", type=int, default=1000, help="Maximum works fetched by the citation crawl")
+    parser.add_argument("--force", action="store_true", help="Ignore cached stage outputs")
+    parser.add_argument("--online", action="store_true", help="Allow OpenAlex API calls for author enrichment")
+    parser.add_argument("--top-n", type=int, default=5, help="Authors kept per topic in the PageRank output")
+    parser.add_argument("--max-depth", type=int, default=100, help="Citation depth for the bfs and seeds emerging topic modes")
+    parser.add_argument("--emerging-mode", choices=["components", "seeds", "bfs"], default="components",
+                        help="Emerging topics over all papers and per component, around the most recent papers, "
+                             "or with the original per-node BFS")
+    parser.add_argument("--emerging-seeds", type=int, default=100, help="Most recent papers seeding the seeds mode")
+    parser.add_argument("--descriptions-top-n", type=int, default=10, help="Topics to describe with Ollama")
+    parser.add_argument("--descriptions-workers", type=int, default=4, help="Concurrent Ollama requests")
+    parser.add_argument("--descriptions-batch-size", type=int, default=1, help="Topics described per Ollama request")
+    parser.add_argument("--descriptions-stream", action="store_true",
+                        help="Stream Ollama answers and stop after the first sentence")
+    parser.add_argument("--separate-analyses", action="store_true",
+                        help="Run the gap and collaboration analyses as separate stages, each loading the graph")
+    parser.add_argument("--ollama-url", help="Ollama generate endpoint")
+    parser.add_argument("--ollama-model", help="Ollama model name")
+    args = parser.parse_args()
+
+    runner = PipelineRunner(
+        root=args.root,
+        config={
+            "works_file": args.works_file,
+            "snapshot_dir": args.snapshot_dir,
+            "snapshot_workers": args.snapshot_workers,
+            "incremental": args.incremental,
+            "max_pages": args.max_pages,
+            "crawl_hops": args.crawl_hops,
+            "crawl_budget": args.crawl_budget,
+            "offline": not args.online,
+            "coauthorship_shards": args.coauthorship_shards,
+            "shard_workers": args.shard_workers,
+            "top_n": args.top_n,
+            "max_depth": args.max_depth,
+            "emerging_mode": args.emerging_mode,
+            "emerging_seeds": args.emerging_seeds,
+            "descriptions_top_n": args.descriptions_top_n,
+            "descriptions_workers": args.descriptions_workers,
+            "descriptions_batch_size": args.descriptions_batch_size,
+            "descriptions_stream": args.descriptions_stream,
+            "ollama_url": args.ollama_url,
+            "ollama_model": args.ollama_model,
+        },
+        max_workers=args.workers,
+        skip=(args.skip + (SHARED_ANALYSIS_STAGES if args.separate_analyses else SEPARATE_ANALYSIS_STAGES)
+              + (API_SOURCE_STAGES if args.snapshot_dir else SNAPSHOT_SOURCE_STAGES)),
+        force=args.force,
+    )
+    results = runner.run()
+
+    failed = [name for name, result in results.items() if result["status"] in ("failed", "upstream_failed")]
+    if failed:
+        raise SystemExit(f"Pipeline failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+DAG runner executing the pipeline stages against a local bucket directory.
+
+Stages whose dependencies are complete run in parallel worker processes.
+Before a stage runs, its cache key is computed from the stage's source code,
+every shared module under cloud_functions/common/, the relevant config values
+and the content hashes of its input blobs; if the key and the hashes of the
+recorded outputs are unchanged, the stage is skipped. A stage that reports
+problems (e.g. failed requests baked into its output) is not cached, so the
+next run retries it.
+Per-stage timings of every run are written to <root>/.pipeline/runs/.
+"""
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from pipeline.stages import CLOUD_FUNCTIONS_DIR, STAGES, STAGES_BY_NAME, Stage
+
+STATE_DIR = ".pipeline"
+
+
+def file_sha256(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_fingerprint(snapshot_dir: str) -> str:
+    """Hash the names, sizes and modification times of a snapshot's partitions instead of their contents."""
+    from pipeline.snapshot import partition_files
+
+    digest = hashlib.sha256()
+    for entity in ("works", "authors"):
+        for path in partition_files(snapshot_dir, entity):
+            stat = os.stat(path)
+            digest.update(f"{os.path.relpath(path, snapshot_dir)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def common_sources_sha256() -> str:
+    """Hash every module under cloud_functions/common/, which any stage may import."""
+    digest = hashlib.sha256()
+    common_dir = os.path.join(CLOUD_FUNCTIONS_DIR, "common")
+    for filename in sorted(os.listdir(common_dir)):
+        if filename.endswith(".py"):
+            digest.update(f"{filename}:{file_sha256(os.path.join(common_dir, filename))}".encode())
+    return digest.hexdigest()
+
+
+def _execute_stage(stage_name: str, config: dict) -> tuple:
+    """Run one stage and return its duration in seconds and the problems it reported (executed in a worker)."""
+    start = time.perf_counter()
+    problems = STAGES_BY_NAME[stage_name].func(config) or []
+    return time.perf_counter() - start, list(problems)
+
+
+class PipelineRunner:
+    def __init__(self, root: str, config: dict = None, max_workers: int = None,
+                 skip: Iterable[str] = (), force: bool = False):
+        """
+        Initialize the pipeline runner.
+
+        Args:
+            root: Directory holding one sub-directory per bucket
+            config: Run configuration passed to every stage
+            max_workers: Number of worker processes; 1 runs every stage in this process
+            skip: Names of stages not to run; their outputs are assumed to exist
+            force: Run every stage even if its cache entry is valid
+        """
+        self.root = os.path.abspath(root)
+        self.config = dict(config or {})
+        self.max_workers = max_workers or os.cpu_count()
+        self.skip = set(skip)
+        self.force = force
+        self.stages = STAGES
+        self.state_dir = os.path.join(self.root, STATE_DIR)
+        self.cache_path = os.path.join(self.state_dir, "cache.json")
+        self.cache = {}
+        self.results = {}
+        self.common_sha = None
+
+    def _prepare_environment(self):
+        """Point every function at the local buckets before workers are started."""
+        os.makedirs(self.state_dir, exist_ok=True)
+        os.environ["STORAGE_BACKEND"] = "local"
+        os.environ["LOCAL_STORAGE_ROOT"] = self.root
+        os.environ["OPENALEX_OFFLINE"] = "1" if self.config.get("offline", True) else "0"
+        os.environ["COAUTHORSHIP_BUILD_MODE"] = "full"
+        # Stages only run when their cache key changed, so the functions must not skip them as duplicates
+        os.environ["IDEMPOTENCY_CHECK"] = "0"
+        os.environ.setdefault("MPLBACKEND", "Agg")
+        if self.config.get("ollama_url"):
+            os.environ["OLLAMA_URL"] = self.config["ollama_url"]
+        if self.config.get("ollama_model"):
+            os.environ["OLLAMA_MODEL"] = self.config["ollama_model"]
+        if self.config.get("works_file"):
+            self.config["works_file_sha256"] = file_sha256(self.config["works_file"])
+        if self.config.get("snapshot_dir"):
+            self.config["snapshot_fingerprint"] = snapshot_fingerprint(self.config["snapshot_dir"])
+
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                self.cache = json.load(f)
+
+    def _blob_path(self, bucket: str, blob: str) -> str:
+        return os.path.join(self.root, bucket, blob)
+
+    def _cache_key(self, stage: Stage) -> str:
+        """Hash the stage's code, parameters and input contents."""
+        digest = hashlib.sha256(stage.name.encode())
+        if self.common_sha is None:
+            self.common_sha = common_sources_sha256()
+        digest.update(self.common_sha.encode())
+        for source in stage.sources:
+            digest.update(file_sha256(os.path.join(CLOUD_FUNCTIONS_DIR, source)).encode())
+        digest.update(file_sha256(os.path.join(os.path.dirname(os.path.abspath(__file__)), "stages.py")).encode())
+        digest.update(json.dumps({key: self.config.get(key) for key in stage.params}, sort_keys=True).encode())
+        for bucket, blob in stage.inputs:
+            path = self._blob_path(bucket, blob)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Input gs://{bucket}/{blob} of stage '{stage.name}' does not exist")
+            digest.update(f"{bucket}/{blob}:{file_sha256(path)}".encode())
+        return digest.hexdigest()
+
+    def _is_cached(self, stage: Stage, key: str) -> bool:
+        entry = self.cache.get(stage.name)
+        if self.force or not stage.cacheable(self.config) or not entry or entry["key"] != key:
+            return False
+        for blob_ref, sha in entry["outputs"].items():
+            path = os.path.join(self.root, blob_ref)
+            if not os.path.exists(path) or file_sha256(path) != sha:
+                return False
+        return True
+
+    def _collect_outputs(self, stage: Stage, started_ns: int) -> Dict[str, str]:
+        """Hash every blob written under the stage's output prefixes since it started."""
+        outputs = {}
+        for bucket, prefix in stage.outputs:
+            bucket_dir = os.path.join(self.root, bucket)
+            for directory, _, files in os.walk(bucket_dir):
+                for filename in files:
+                    path = os.path.join(directory, filename)
+                    blob = os.path.relpath(path, bucket_dir).replace(os.sep, "/")
+                    if blob.startswith(prefix) and os.stat(path).st_mtime_ns >= started_ns:
+                        outputs[f"{bucket}/{blob}"] = file_sha256(path)
+        return outputs
+
+    def _record(self, stage: Stage, status: str, seconds: float = 0.0, started: float = None,
+                outputs: Dict[str, str] = None, error: str = None, problems: List[str] = None):
+        self.results[stage.name] = {
+            "status": status,
+            "seconds": round(seconds, 4),
+            "started_at": datetime.fromtimestamp(started).isoformat() if started else None,
+            "outputs": sorted(outputs or {}),
+        }
+        if error:
+            self.results[stage.name]["error"] = error
+        if problems:
+            self.results[stage.name]["problems"] = problems
+        print(f"[pipeline] {stage.name}: {status}" + (f" in {seconds:.2f}s" if seconds else "")
+              + (f", {len(problems)} problems, not cached" if problems else ""))
+
+    def _ready(self, stage: Stage) -> bool:
+        return all(dep in self.skip or self.results.get(dep, {}).get("status") in ("ran", "cached")
+                   for dep in stage.deps if dep in STAGES_BY_NAME)
+
+    def _blocked(self, stage: Stage) -> bool:
+        return any(self.results.get(dep, {}).get("status") in ("failed", "upstream_failed")
+                   for dep in stage.deps)
+
+    def run(self) -> dict:
+        """Run all stages and return the per-stage results of this run."""
+        self._prepare_environment()
+        run_started = time.time()
+        pending = {stage.name: stage for stage in self.stages if stage.name not in self.skip}
+        running = {}
+        keys = {}
+
+        executor = ProcessPoolExecutor(max_workers=self.max_workers) if self.max_workers > 1 else None
+        try:
+            while pending or running:
+                progressed = False
+                for name, stage in list(pending.items()):
+                    if self._blocked(stage):
+                        del pending[name]
+                        self._record(stage, "upstream_failed")
+                        continue
+                    if not self._ready(stage):
+                        continue
+
+                    del pending[name]
+                    progressed = True
+                    try:
+                        keys[name] = self._cache_key(stage)
+                    except FileNotFoundError as e:
+                        self._record(stage, "failed", error=str(e))
+                        continue
+                    if self._is_cached(stage, keys[name]):
+                        self._record(stage, "cached", outputs=self.cache[name]["outputs"])
+                        continue
+
+                    started, started_ns = time.time(), time.time_ns()
+                    if executor is None:
+                        self._finish(stage, keys[name], started, started_ns, self._run_inline(stage))
+                    else:
+                        future = executor.submit(_execute_stage, name, self.config)
+                        running[future] = (stage, started, started_ns)
+
+                if not running:
+                    if pending and not progressed:
+                        for stage in pending.values():
+                            self._record(stage, "failed", error="Dependencies cannot be satisfied")
+                        pending.clear()
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, started, started_ns = running.pop(future)
+                    try:
+                        outcome = (*future.result(), None)
+                    except Exception:
+                        outcome = (time.time() - started, [], traceback.format_exc())
+                    self._finish(stage, keys[stage.name], started, started_ns, outcome)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self._save_state(run_started)
+        return self.results
+
+    def _run_inline(self, stage: Stage):
+        start = time.perf_counter()
+        try:
+            return (*_execute_stage(stage.name, self.config), None)
+        except Exception:
+            return time.perf_counter() - start, [], traceback.format_exc()
+
+    def _finish(self, stage: Stage, key: str, started: float, started_ns: int, outcome):
+        seconds, problems, error = outcome
+        if error:
+            print(error)
+            self._record(stage, "failed", seconds, started, error=error.strip().splitlines()[-1])
+            return
+
+        outputs = self._collect_outputs(stage, started_ns)
+        # Outputs with problems stay usable downstream, but the next run produces them again
+        if problems:
+            self.cache.pop(stage.name, None)
+        else:
+            self.cache[stage.name] = {"key": key, "outputs": outputs}
+        self._record(stage, "ran", seconds, started, outputs, problems=problems)
+
+    def _save_state(self, run_started: float):
+        with open(self.cache_path, "w", encoding="utf-8") as f:
+            json.dump(self.cache, f, indent=2)
+
+        runs_dir = os.path.join(self.state_dir, "runs")
+        os.makedirs(runs_dir, exist_ok=True)
+        run_id = datetime.fromtimestamp(run_started).strftime("%Y%m%d_%H%M%S_%f")
+        with open(os.path.join(runs_dir, f"{run_id}.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "run_id": run_id,
+                "wall_seconds": round(time.time() - run_started, 4),
+                "max_workers": self.max_workers,
+                "stages": self.results,
+            }, f, indent=2)
+        print(f"[pipeline] Timings saved to {os.path.join(runs_dir, run_id)}.json")
@@ -0,0 +1,117 @@
+"""
+Parallel loader for OpenAlex snapshot files.
+
+An OpenAlex snapshot stores each entity as gzipped JSON lines partitioned by
+update date:
+
+    <snapshot>/data/works/updated_date=2025-06-30/part_000.gz
+    <snapshot>/data/authors/updated_date=2025-06-30/part_000.gz
+
+Partitions are parsed in worker processes, which keep only the fields the
+pipeline reads before sending records back. A work or author listed in
+several partitions keeps its most recently updated record. The projected
+works go through the same preprocess_data functions as works fetched from
+the API, so the tables and graph files are identical; author records seed
+the co-authorship author table so enrichment needs no API calls.
+"""
+import glob
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+# Fields of a work read by preprocess_data; nested lists keep only the listed keys
+WORK_FIELDS = ["id", "title", "abstract", "publication_year", "publication_date", "cited_by_count",
+               "referenced_works", "updated_date"]
+AUTHORSHIP_FIELDS = ["id", "display_name"]
+CONCEPT_FIELDS = ["display_name"]
+TOPIC_FIELDS = ["id", "display_name", "subfield", "field", "domain"]
+
+# Fields of an author kept in the author table, as selected by the co-authorship API lookups
+AUTHOR_FIELDS = ["id", "display_name", "last_known_institutions", "updated_date"]
+
+
+def partition_files(snapshot_dir: str, entity: str) -> List[str]:
+    """Gzipped JSON-lines partitions of an entity, in update order."""
+    root = os.path.join(snapshot_dir, "data", entity)
+    if not os.path.isdir(root):
+        root = os.path.join(snapshot_dir, entity)
+    return sorted(glob.glob(os.path.join(root, "**", "*.gz"), recursive=True))
+
+
+def project_work(work: dict) -> dict:
+    projected = {field: work.get(field) for field in WORK_FIELDS if field in work}
+    projected["authorships"] = [
+        {"author": {field: (authorship.get("author") or {}).get(field) for field in AUTHORSHIP_FIELDS}}
+        for authorship in work.get("authorships") or []
+    ]
+    projected["concepts"] = [{field: concept.get(field) for field in CONCEPT_FIELDS if field in concept}
+                             for concept in work.get("concepts") or []]
+    projected["topics"] = [{field: topic.get(field) for field in TOPIC_FIELDS if field in topic}
+                           for topic in work.get("topics") or []]
+    return projected
+
+
+def project_author(author: dict) -> dict:
+    projected = {field: author.get(field) for field in AUTHOR_FIELDS if field in author}
+    projected["last_known_institutions"] = [{"display_name": institution.get("display_name")}
+                                            for institution in author.get("last_known_institutions") or []]
+    return projected
+
+
+PROJECTIONS = {"works": project_work, "authors": project_author}
+
+
+def _load_partition(args) -> List[dict]:
+    """Parse one partition and project its records (executed in a worker)."""
+    entity, path = args
+    project = PROJECTIONS[entity]
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [project(json.loads(line)) for line in f if line.strip()]
+
+
+def load_entities(snapshot_dir: str, entity: str, workers: int = None) -> Dict[str, dict]:
+    """
+    Parse every partition of an entity in parallel.
+
+    Args:
+        snapshot_dir: Root of the snapshot
+        entity: 'works' or 'authors'
+        workers: Worker processes; 1 parses in this process
+
+    Returns:
+        Projected records keyed by OpenAlex ID, keeping the latest updated_date of each
+    """
+    files = partition_files(snapshot_dir, entity)
+    records = {}
+
+    def merge(batch):
+        for record in batch:
+            current = records.get(record["id"])
+            if current is None or (record.get("updated_date") or "") >= (current.get("updated_date") or ""):
+                records[record["id"]] = record
+
+    workers = workers or os.cpu_count()
+    if workers == 1 or len(files) < 2:
+        for path in files:
+            merge(_load_partition((entity, path)))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as executor:
+            # map keeps partition order, so the merge is deterministic
+            for batch in executor.map(_load_partition, [(entity, path) for path in files]):
+                merge(batch)
+
+    print(f"Loaded {len(records)} {entity} from {len(files)} snapshot partitions")
+    return records
+
+
+def load_works(snapshot_dir: str, workers: int = None) -> dict:
+    """Works of a snapshot in the {"results": [...]} shape of an OpenAlex response."""
+    return {"results": list(load_entities(snapshot_dir, "works", workers).values())}
+
+
+def author_table(snapshot_dir: str, workers: int = None) -> Dict[str, dict]:
+    """Author records keyed by short author ID, as stored in the co-authorship author table."""
+    return {author_id.split("/")[-1]: record
+            for author_id, record in load_entities(snapshot_dir, "authors", workers).items()}
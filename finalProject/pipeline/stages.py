@@ -0,0 +1,388 @@
+"""
+Pipeline stage definitions.
+
+Each stage wraps one cloud function (or analysis script) and runs it against
+the configured storage backend. Buckets and blob names match the deployed
+functions so the local directory tree mirrors the production buckets.
+"""
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+CLOUD_FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cloud_functions")
+
+RAW_BUCKET = "serverlessfinalproject-raw-data-bucket"
+RAW_BLOB = "openalex_works.json"
+RAW_PREFIX = "openalex_works"  # Compressed NDJSON chunks of RAW_BLOB and their index
+RAW_INDEX_BLOB = f"{RAW_PREFIX}/index.json"
+CITATION_BUCKET = "serverlessfinalproject-citation-graph-bucket"
+PROCESSED_BUCKET = "processeddata_sds"
+CITATION_GML_BLOB = "citation_graph.gml"
+COAUTHORSHIP_BUCKET = "coauthorshipgraph"
+COAUTHORSHIP_GML_BLOB = "citation_graph/co_authorship_graph.gml"
+AUTHOR_TABLE_BLOB = "author_table.json"
+GAPS_BUCKET = "gaps_analysis"
+COLLABORATION_BUCKET = "collaborationanalysis"
+RESULTS_BUCKET = "serverlessfinalproject-results-bucket"
+RENDER_JOBS_BUCKET = "serverlessfinalproject-render-jobs"
+
+
+class Stage:
+    def __init__(self, name: str, func: Callable[[dict], None], deps: List[str] = None,
+                 inputs: List[Tuple[str, str]] = None, outputs: List[Tuple[str, str]] = None,
+                 sources: List[str] = None, params: List[str] = None,
+                 cacheable: Callable[[dict], bool] = None):
+        """
+        Describe one pipeline stage.
+
+        Args:
+            name: Unique stage name
+            func: Callable taking the run config, executed in a worker process; it may return
+                a list of problems (e.g. failed requests), in which case its outputs are not cached
+            deps: Names of stages that must finish first
+            inputs: (bucket, blob) pairs whose content determines the cache key
+            outputs: (bucket, prefix) pairs under which the stage writes its results
+            sources: Files relative to cloud_functions/ whose code determines the cache key,
+                besides the modules under common/, which every key includes
+            params: Config keys that determine the cache key
+            cacheable: Predicate on the run config; stages for which it is false always run
+        """
+        self.name = name
+        self.func = func
+        self.deps = deps or []
+        self.inputs = inputs or []
+        self.outputs = outputs or []
+        self.sources = sources or []
+        self.params = params or []
+        self.cacheable = cacheable or (lambda config: True)
+
+
+class StorageEvent:
+    """Minimal stand-in for the CloudEvent passed to GCS-triggered functions."""
+
+    def __init__(self, bucket: str, name: str):
+        self.data = {"bucket": bucket, "name": name}
+
+
+def load_function_module(relative_path: str):
+    """Import a cloud function source file, e.g. 'fetch_data/main.py', under a unique module name."""
+    module_name = os.path.splitext(relative_path)[0].replace("/", "_")
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    if CLOUD_FUNCTIONS_DIR not in sys.path:
+        sys.path.insert(0, CLOUD_FUNCTIONS_DIR)
+
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(CLOUD_FUNCTIONS_DIR, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _storage():
+    if CLOUD_FUNCTIONS_DIR not in sys.path:
+        sys.path.insert(0, CLOUD_FUNCTIONS_DIR)
+    from common import storage_backend
+    return storage_backend
+
+
+@contextmanager
+def _downloaded(bucket_name: str, blob_name: str, suffix: str = ""):
+    """Download a blob to a temporary file for scripts that expect a local path."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        temp_path = temp_file.name
+    try:
+        _storage().get_blob(bucket_name, blob_name).download_to_filename(temp_path)
+        yield temp_path
+    finally:
+        os.remove(temp_path)
+
+
+def _raw_store():
+    if CLOUD_FUNCTIONS_DIR not in sys.path:
+        sys.path.insert(0, CLOUD_FUNCTIONS_DIR)
+    from common import raw_store
+    return raw_store
+
+
+def _upload_json(bucket_name: str, blob_name: str, data):
+    _storage().write_bytes(bucket_name, blob_name, json.dumps(data, indent=4, ensure_ascii=False),
+                           content_type="application/json")
+
+
+def run_fetch(config: dict):
+    """Seed the raw bucket from a local works file, or fetch from OpenAlex."""
+    fetch = load_function_module("fetch_data/main.py")
+
+    if config.get("works_file"):
+        with open(config["works_file"], "r", encoding="utf-8") as f:
+            works_data = json.load(f)
+    elif config.get("incremental"):
+        # Only works updated since the last harvest are fetched; the chunks are rebuilt when any changed
+        changed = fetch.harvest_incremental(RAW_BUCKET, {"publication_year": 2025}, max_pages=config.get("max_pages"))
+        if not changed and _storage().get_blob(RAW_BUCKET, RAW_INDEX_BLOB).exists():
+            return
+        works_data = fetch.load_harvested_works(RAW_BUCKET)
+    else:
+        works_data = fetch.fetch_data("works", {"publication_year": 2025}, {"cited_by_count": "desc"}, per_page=100)
+        if works_data is None:
+            raise RuntimeError("Fetching works from OpenAlex failed")
+
+    if config.get("crawl_hops"):
+        # Referenced works become attributed nodes instead of stubs
+        works_data = fetch.crawl_citation_frontier(works_data, config["crawl_hops"], config.get("crawl_budget", 1000))
+
+    # Downstream stages read the compressed NDJSON chunks
+    _raw_store().write_works(RAW_BUCKET, RAW_PREFIX, works_data)
+
+
+def run_preprocess(config: dict):
+    """Build the works table and the node-link citation graph."""
+    preprocess = load_function_module("preprocess_data/main.py")
+
+    works_data = _raw_store().load_works(RAW_BUCKET, RAW_PREFIX)
+    works_df = preprocess.process_works(works_data)
+    preprocess.save_to_gcs(works_df, CITATION_BUCKET, "csv/preprocessed_data_csv.csv", format="csv")
+
+    citation_graph = preprocess.create_citation_graph(works_data)
+    preprocess.save_graph_to_gcs(citation_graph, CITATION_BUCKET, "graph/preprocessed_data_graph.json")
+
+
+def run_citation_graph(config: dict):
+    """Build the attributed citation graph GML consumed by the analysis functions."""
+    preprocess = load_function_module("preprocess_data/main.py")
+
+    citation_graph = preprocess.create_detailed_citation_graph(_raw_store().load_works(RAW_BUCKET, RAW_PREFIX))
+    preprocess.save_gml_to_gcs(citation_graph, PROCESSED_BUCKET, CITATION_GML_BLOB)
+
+
+def run_snapshot(config: dict):
+    """Build the works table, citation graphs and author table from local OpenAlex snapshot files."""
+    from pipeline import snapshot
+
+    preprocess = load_function_module("preprocess_data/main.py")
+    workers = config.get("snapshot_workers")
+
+    works_data = snapshot.load_works(config["snapshot_dir"], workers)
+    preprocess.save_to_gcs(preprocess.process_works(works_data), CITATION_BUCKET, "csv/preprocessed_data_csv.csv",
+                           format="csv")
+    preprocess.save_graph_to_gcs(preprocess.create_citation_graph(works_data), CITATION_BUCKET,
+                                 "graph/preprocessed_data_graph.json")
+    preprocess.save_gml_to_gcs(preprocess.create_detailed_citation_graph(works_data), PROCESSED_BUCKET,
+                               CITATION_GML_BLOB)
+
+    authors = snapshot.author_table(config["snapshot_dir"], workers)
+    if authors:
+        _storage().write_bytes(COAUTHORSHIP_BUCKET, AUTHOR_TABLE_BLOB, json.dumps(authors),
+                               content_type="application/json")
+
+
+def _coauthorship_network():
+    coauthorship = load_function_module("co_authorship_graph/coauthorship.py")
+    return coauthorship.CoAuthorshipNetwork(CITATION_GML_BLOB, PROCESSED_BUCKET, COAUTHORSHIP_BUCKET)
+
+
+def _run_coauthorship_shard(build_id: str, shard: int, shard_count: int):
+    """Map step of one shard (executed in a worker process)."""
+    _coauthorship_network().build_shard(build_id, shard, shard_count)
+
+
+def run_coauthorship(config: dict):
+    coauthorship = load_function_module("co_authorship_graph/coauthorship.py")
+    shard_count = config.get("coauthorship_shards")
+    if not shard_count:
+        coauthorship.process_gml_file(StorageEvent(PROCESSED_BUCKET, CITATION_GML_BLOB))
+        return
+
+    # Shards run as processes; shards checkpointed by an earlier, failed run are not repeated
+    with coauthorship.telemetry.run("process_gml_file", bucket=PROCESSED_BUCKET, name=CITATION_GML_BLOB,
+                                    build_mode="sharded"):
+        network = _coauthorship_network()
+        build_id = coauthorship.shard_build_id(PROCESSED_BUCKET, CITATION_GML_BLOB, shard_count)
+        shards = network.plan_shards(build_id, shard_count)
+        if shards:
+            workers = min(config.get("shard_workers") or os.cpu_count(), len(shards))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(_run_coauthorship_shard, [build_id] * len(shards), shards,
+                                  [shard_count] * len(shards)))
+
+        network.reduce_shards(build_id, shard_count)
+        output_folder = os.path.splitext(os.path.basename(CITATION_GML_BLOB))[0]
+        coauthorship.publish_graph(network, f"{output_folder}/co_authorship_graph.gml",
+                                   f"{output_folder}/network_stats.json", f"{output_folder}/co_authorship_network.png")
+
+
+def run_gaps(config: dict):
+    gaps = load_function_module("co_authorship_graph_gaps/co_authorship_graph_gaps.py")
+    gaps.analyze_coauthorship_gaps(StorageEvent(COAUTHORSHIP_BUCKET, COAUTHORSHIP_GML_BLOB))
+
+
+def run_collaboration(config: dict):
+    collaboration = load_function_module("network_collaboration/network_collaboration.py")
+    collaboration.analyze_collaboration_network(StorageEvent(COAUTHORSHIP_BUCKET, COAUTHORSHIP_GML_BLOB))
+
+
+def run_analysis(config: dict):
+    """Run the gap and collaboration analyses over one shared load of the co-authorship graph."""
+    # The function imports the analyser modules by name, as deployed next to it
+    for directory in ("co_authorship_graph_gaps", "network_collaboration"):
+        path = os.path.join(CLOUD_FUNCTIONS_DIR, directory)
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    analysis = load_function_module("co_authorship_analysis/co_authorship_analysis.py")
+    analysis.analyze_coauthorship_graph(StorageEvent(COAUTHORSHIP_BUCKET, COAUTHORSHIP_GML_BLOB))
+
+
+def run_render(config: dict):
+    """Drain the render queue filled by the analysis stages."""
+    worker = load_function_module("render_worker/render_worker.py")
+    processed = worker.RenderWorker(jobs_bucket=RENDER_JOBS_BUCKET).process_pending()
+    print(f"Rendered {processed} queued visualizations")
+
+
+def run_pagerank(config: dict):
+    pagerank = load_function_module("pagerank_influential_authors/pagerank_influential_authors.py")
+
+    with _storage().open_blob(PROCESSED_BUCKET, CITATION_GML_BLOB, "rb") as f:
+        citation_graph = pagerank.load_graph(f)
+    author_matrix = pagerank.AuthorMatrix.from_graph(citation_graph)
+    ranked_authors = pagerank.rank_authors_pagerank(citation_graph, author_matrix=author_matrix)
+
+    # Other stages can load the integer-indexed author space instead of re-parsing the graph
+    buffer = io.BytesIO()
+    author_matrix.save(buffer)
+    _storage().write_bytes(RESULTS_BUCKET, "pagerank/author_matrix.npz", buffer.getvalue(),
+                           content_type="application/octet-stream")
+
+    top_n = config.get("top_n", 5)
+    _upload_json(RESULTS_BUCKET, "pagerank/influential_authors.json",
+                 {topic: authors[:top_n] for topic, authors in ranked_authors.items()})
+
+
+def run_emerging_topics(config: dict):
+    bfs = load_function_module("bfs_emerging_topics/bfs_emerging_topics.py")
+
+    with _storage().open_blob(PROCESSED_BUCKET, CITATION_GML_BLOB, "rb") as f:
+        citation_graph = bfs.load_graph(f)
+
+    # "components" counts every paper and each weakly connected component in one pass,
+    # "seeds" only the papers within max_depth citations of the most recent papers
+    mode = config.get("emerging_mode", "components")
+    if mode == "bfs":
+        counts = bfs.bfs_emerging_topics(citation_graph, max_depth=config.get("max_depth", 100))
+    elif mode == "seeds":
+        seeds = bfs.most_recent_papers(citation_graph, config.get("emerging_seeds", 100))
+        counts, reached = bfs.seeded_emerging_topics(citation_graph, seeds, max_depth=config.get("max_depth", 100))
+        print(f"Counted topics of {reached} papers within {config.get('max_depth', 100)} citations of {len(seeds)} seeds")
+    else:
+        counts, components = bfs.component_emerging_topics(citation_graph)
+        _upload_json(RESULTS_BUCKET, "emerging_topics/components.json", components)
+    if mode in ("bfs", "seeds"):
+        # Components of an earlier run in "components" mode no longer match these counts
+        stale = _storage().get_client().bucket(RESULTS_BUCKET).get_blob("emerging_topics/components.json")
+        if stale is not None:
+            stale.delete()
+    for name, counter in zip(bfs.LEVELS, counts):
+        _upload_json(RESULTS_BUCKET, f"emerging_topics/{name}.json", dict(counter))
+
+
+def run_descriptions(config: dict):
+    descriptions_module = load_function_module("generate_descriptions_topics/generate_descriptions_topics.py")
+
+    with _downloaded(RESULTS_BUCKET, "emerging_topics/topics.json", suffix=".json") as topics_path:
+        topics = descriptions_module.load_top_topics(topics_path, top_n=config.get("descriptions_top_n", 10))
+
+    # The description cache lives next to the run state so repeated runs reuse it
+    cache_path = os.path.join(os.environ.get("LOCAL_STORAGE_ROOT", "."), ".pipeline", "description_cache.json")
+    generator = descriptions_module.DescriptionGenerator(
+        url=descriptions_module.OLLAMA_URL,
+        model=descriptions_module.OLLAMA_MODEL,
+        workers=config.get("descriptions_workers", descriptions_module.DEFAULT_WORKERS),
+        batch_size=config.get("descriptions_batch_size", 1),
+        cache=descriptions_module.DescriptionCache(cache_path),
+        stream=config.get("descriptions_stream", False),
+    )
+    descriptions = generator.generate(topics)
+    _upload_json(RESULTS_BUCKET, "descriptions/description_timings.json", generator.timings)
+    _upload_json(RESULTS_BUCKET, "descriptions/top_topic_descriptions.json", descriptions)
+    # Failed topics hold the error instead of a description; the stage is not cached so they are retried
+    return [f"{topic}: {descriptions[topic]}" for topic in topics if topic in generator.failed]
+
+
+STAGES = [
+    Stage("fetch", run_fetch,
+          outputs=[(RAW_BUCKET, f"{RAW_PREFIX}/"), (RAW_BUCKET, "works/")],
+          sources=["fetch_data/main.py"],
+          params=["works_file_sha256", "crawl_hops", "crawl_budget"],
+          cacheable=lambda config: bool(config.get("works_file"))),
+    Stage("preprocess", run_preprocess, deps=["fetch"],
+          inputs=[(RAW_BUCKET, RAW_INDEX_BLOB)],
+          outputs=[(CITATION_BUCKET, "csv/"), (CITATION_BUCKET, "graph/")],
+          sources=["preprocess_data/main.py"]),
+    Stage("citation_graph", run_citation_graph, deps=["fetch"],
+          inputs=[(RAW_BUCKET, RAW_INDEX_BLOB)],
+          outputs=[(PROCESSED_BUCKET, CITATION_GML_BLOB)],
+          sources=["preprocess_data/main.py"]),
+    Stage("snapshot", run_snapshot,
+          outputs=[(CITATION_BUCKET, "csv/"), (CITATION_BUCKET, "graph/"), (PROCESSED_BUCKET, CITATION_GML_BLOB),
+                   (COAUTHORSHIP_BUCKET, AUTHOR_TABLE_BLOB)],
+          sources=["preprocess_data/main.py", "../pipeline/snapshot.py"],
+          params=["snapshot_fingerprint"]),
+    Stage("coauthorship", run_coauthorship, deps=["citation_graph", "snapshot"],
+          inputs=[(PROCESSED_BUCKET, CITATION_GML_BLOB)],
+          outputs=[(COAUTHORSHIP_BUCKET, "citation_graph/")],
+          sources=["co_authorship_graph/coauthorship.py"],
+          params=["offline", "coauthorship_shards"]),
+    Stage("gaps", run_gaps, deps=["coauthorship"],
+          inputs=[(COAUTHORSHIP_BUCKET, COAUTHORSHIP_GML_BLOB)],
+          outputs=[(GAPS_BUCKET, "co_authorship_graph/")],
+          sources=["co_authorship_graph_gaps/co_authorship_graph_gaps.py"]),
+    Stage("collaboration", run_collaboration, deps=["coauthorship"],
+          inputs=[(COAUTHORSHIP_BUCKET, COAUTHORSHIP_GML_BLOB)],
+          outputs=[(COLLABORATION_BUCKET, "co_authorship_graph/"), (COLLABORATION_BUCKET, "index/")],
+          sources=["network_collaboration/network_collaboration.py"]),
+    Stage("analysis", run_analysis, deps=["coauthorship"],
+          inputs=[(COAUTHORSHIP_BUCKET, COAUTHORSHIP_GML_BLOB)],
+          outputs=[(GAPS_BUCKET, "co_authorship_graph/"), (COLLABORATION_BUCKET, "co_authorship_graph/"),
+                   (COLLABORATION_BUCKET, "index/")],
+          sources=["co_authorship_analysis/co_authorship_analysis.py",
+                   "co_authorship_graph_gaps/co_authorship_graph_gaps.py",
+                   "network_collaboration/network_collaboration.py"]),
+    Stage("render", run_render, deps=["coauthorship", "gaps", "collaboration", "analysis"],
+          outputs=[(COAUTHORSHIP_BUCKET, "citation_graph/"), (GAPS_BUCKET, "co_authorship_graph/"),
+                   (COLLABORATION_BUCKET, "co_authorship_graph/"), (RENDER_JOBS_BUCKET, "done/")],
+          sources=["render_worker/render_worker.py"],
+          cacheable=lambda config: False),
+    Stage("pagerank", run_pagerank, deps=["citation_graph", "snapshot"],
+          inputs=[(PROCESSED_BUCKET, CITATION_GML_BLOB)],
+          outputs=[(RESULTS_BUCKET, "pagerank/")],
+          sources=["pagerank_influential_authors/pagerank_influential_authors.py"],
+          params=["top_n"]),
+    Stage("emerging_topics", run_emerging_topics, deps=["citation_graph", "snapshot"],
+          inputs=[(PROCESSED_BUCKET, CITATION_GML_BLOB)],
+          outputs=[(RESULTS_BUCKET, "emerging_topics/")],
+          sources=["bfs_emerging_topics/bfs_emerging_topics.py"],
+          params=["max_depth", "emerging_mode", "emerging_seeds"]),
+    Stage("descriptions", run_descriptions, deps=["emerging_topics"],
+          inputs=[(RESULTS_BUCKET, "emerging_topics/topics.json")],
+          outputs=[(RESULTS_BUCKET, "descriptions/")],
+          sources=["generate_descriptions_topics/generate_descriptions_topics.py"],
+          params=["descriptions_top_n", "descriptions_batch_size", "descriptions_stream", "ollama_url", "ollama_model"]),
+]
+
+STAGES_BY_NAME: Dict[str, Stage] = {stage.name: stage for stage in STAGES}
+
+# The combined analysis replaces the separate gap and collaboration stages; only one variant runs
+SEPARATE_ANALYSIS_STAGES = ["gaps", "collaboration"]
+SHARED_ANALYSIS_STAGES = ["analysis"]
+
+# The snapshot stage replaces fetching and preprocessing works from the API
+API_SOURCE_STAGES = ["fetch", "preprocess", "citation_graph"]
+SNAPSHOT_SOURCE_STAGES = ["snapshot"]
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The pipeline package and the shared cloud function helpers are imported as in a local run
+for path in (ROOT, os.path.join(ROOT, "cloud_functions")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture
+def local_storage(tmp_path, monkeypatch):
+    """Point storage_backend at a fresh local bucket directory; returns its root."""
+    root = tmp_path / "buckets"
+    root.mkdir()
+    monkeypatch.setenv("STORAGE_BACKEND", "local")
+    monkeypatch.setenv("LOCAL_STORAGE_ROOT", str(root))
+    monkeypatch.setenv("MPLBACKEND", "Agg")
+    return root
@@ -0,0 +1,74 @@
+"""
+The author table cached by a co-authorship instance is only downloaded again
+when its generation changed, and saved against the generation it was read at.
+"""
+import json
+
+import pytest
+
+from common import storage_backend, telemetry
+from pipeline.stages import load_function_module
+
+BUCKET = "coauthorship"
+
+
+@pytest.fixture
+def coauthorship(local_storage, monkeypatch):
+    module = load_function_module("co_authorship_graph/coauthorship.py")
+    # Start every test from a cold instance
+    monkeypatch.setattr(module, "_author_table", {})
+    monkeypatch.setattr(module, "_author_table_generations", {})
+    monkeypatch.delenv("OPENALEX_OFFLINE", raising=False)
+    return module
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    counted = []
+    monkeypatch.setattr(telemetry, "count", lambda name, value=1: counted.append(name))
+    return counted
+
+
+def network(coauthorship):
+    return coauthorship.CoAuthorshipNetwork("citation_graph.gml", "processed", BUCKET)
+
+
+def stored_table(coauthorship):
+    return json.loads(storage_backend.read_bytes(BUCKET, coauthorship.AUTHOR_TABLE_PATH))
+
+
+def test_warm_instance_skips_unchanged_table(coauthorship, counters):
+    storage_backend.write_bytes(BUCKET, coauthorship.AUTHOR_TABLE_PATH, json.dumps({"A1": {"id": "A1"}}))
+
+    first = network(coauthorship)
+    first._merge_stored_author_table()
+    assert first.author_data == {"A1": {"id": "A1"}}
+    assert "author_table.unchanged" not in counters
+
+    network(coauthorship)._merge_stored_author_table()
+    assert counters.count("author_table.unchanged") == 1
+
+    # A table saved elsewhere is merged on the next invocation
+    storage_backend.write_bytes(BUCKET, coauthorship.AUTHOR_TABLE_PATH,
+                                json.dumps({"A1": {"id": "A1"}, "A2": {"id": "A2"}}))
+    third = network(coauthorship)
+    third._merge_stored_author_table()
+    assert set(third.author_data) == {"A1", "A2"}
+    assert counters.count("author_table.unchanged") == 1
+
+
+def test_save_merges_a_concurrent_save(coauthorship, counters):
+    net = network(coauthorship)
+    net._merge_stored_author_table()
+    net.author_data["A1"] = {"id": "A1"}
+    net.new_author_records = 1
+
+    # Another instance saves its table after this one read the (missing) table
+    storage_backend.write_bytes(BUCKET, coauthorship.AUTHOR_TABLE_PATH, json.dumps({"A2": {"id": "A2"}}))
+    net.save_author_table()
+
+    assert stored_table(coauthorship) == {"A1": {"id": "A1"}, "A2": {"id": "A2"}}
+    assert net.new_author_records == 0
+    # The saved generation is the one this instance now holds
+    network(coauthorship)._merge_stored_author_table()
+    assert counters.count("author_table.unchanged") == 1
@@ -0,0 +1,75 @@
+"""
+The bounded rankings of network_collaboration.py keep exactly the best pairs
+of the full ranking, overall and for every author.
+"""
+import io
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from pipeline.stages import load_function_module
+
+DOMAINS = ["Physical Sciences", "Life Sciences"]
+FIELDS = ["Computer Science", "Physics", "Biology", "Chemistry"]
+SUBFIELDS = ["Networks", "Optics", "Genetics", "Catalysis", "Learning", "Graphs"]
+
+
+@pytest.fixture
+def collaboration():
+    return load_function_module("network_collaboration/network_collaboration.py")
+
+
+@pytest.fixture
+def analyzer(collaboration):
+    from common.analysis_session import AnalysisSession
+
+    rng = random.Random(5)
+    graph = nx.Graph()
+    for i in range(30):
+        graph.add_node(i, label=f"A{i}", topics=[
+            {"id": f"T{rng.randrange(20)}", "domain": {"display_name": rng.choice(DOMAINS)},
+             "field": {"display_name": rng.choice(FIELDS)}, "subfield": {"display_name": rng.choice(SUBFIELDS)}}
+            for _ in range(3)])
+    graph.add_edges_from((rng.randrange(30), rng.randrange(30)) for _ in range(40))
+    graph.remove_edges_from(nx.selfloop_edges(graph))
+
+    gml = io.BytesIO("\n".join(nx.generate_gml(graph)).encode())
+    return collaboration.CollaborationAnalyzer(session=AnalysisSession(gml))
+
+
+def pair_key(pair):
+    return pair["author_1"]["id"], pair["author_2"]["id"]
+
+
+def test_top_collaborators_match_full_ranking(analyzer):
+    # Topic similarity adds random noise, so both rankings draw the same noise
+    np.random.seed(0)
+    full = analyzer.find_potential_collaborators(min_similarity=0.2)
+    np.random.seed(0)
+    top, by_author = analyzer.find_top_collaborators(top_k=25, per_author_k=3, min_similarity=0.2)
+
+    assert len(full) > 25
+    assert [pair["combined_score"] for pair in top] == [pair["combined_score"] for pair in full[:25]]
+    assert len({pair_key(pair) for pair in top}) == 25
+
+    for author, pairs in by_author.items():
+        own = [pair for pair in full if author in pair_key(pair)]
+        assert [pair["combined_score"] for pair in pairs] == [pair["combined_score"] for pair in own[:3]]
+    assert set(by_author) == {author for pair in full for author in pair_key(pair)}
+
+
+def test_per_author_only_plots_each_pair_once(local_storage, collaboration, analyzer, monkeypatch):
+    monkeypatch.setattr(collaboration, "TOP_K", 0)
+    monkeypatch.setattr(collaboration, "PER_AUTHOR_K", 3)
+    cloud = collaboration.CloudCollaborationAnalyzer("graph.gml", "coauthorship", "collaboration")
+
+    np.random.seed(0)
+    recommendations, path = cloud.write_top_collaborators(analyzer, 0.2, "graph", "20250101_000000")
+
+    keys = [pair_key(pair) for pair in recommendations]
+    assert len(keys) == len(set(keys))
+    scores = [pair["combined_score"] for pair in recommendations]
+    assert scores == sorted(scores, reverse=True)
+    assert path == "graph/recommendations_by_author_20250101_000000.ndjson"
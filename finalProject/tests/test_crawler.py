@@ -0,0 +1,128 @@
+"""
+The citation-frontier crawler of fetch_data/main.py resolves referenced works
+level by level, within its budget, and skips batches that keep failing.
+"""
+import random
+
+import pytest
+import requests
+
+from pipeline.stages import load_function_module
+
+OPENALEX = "https://openalex.org/"
+
+
+def corpus(n=400, references=4, seed=2):
+    """Works citing random earlier works, keyed by their full ID."""
+    rng = random.Random(seed)
+    works = {}
+    for i in range(n):
+        cited = {f"{OPENALEX}W{j}" for j in rng.sample(range(i), min(i, references))}
+        works[f"{OPENALEX}W{i}"] = {"id": f"{OPENALEX}W{i}", "referenced_works": sorted(cited),
+                                    "cited_by_count": rng.randrange(100)}
+    return works
+
+
+class FakeOpenAlex(requests.Session):
+    """Answers OR-filter work requests from a corpus; batches starting at a failing ID get 500s."""
+
+    def __init__(self, works, failing=()):
+        super().__init__()
+        self.works = works
+        self.failing = set(failing)
+        self.requested = []
+
+    def get(self, url, params=None, timeout=None):
+        ids = params["filter"].split(":", 1)[1].split("|")
+        self.requested.append(ids)
+        response = requests.Response()
+        if ids[0] in self.failing:
+            response.status_code = 500
+            return response
+        response.status_code = 200
+        response._content = requests.compat.json.dumps(
+            {"results": [self.works[OPENALEX + work_id] for work_id in ids]}).encode()
+        return response
+
+
+@pytest.fixture
+def fetch(monkeypatch):
+    module = load_function_module("fetch_data/main.py")
+    monkeypatch.setattr(module, "CRAWL_BACKOFF_SECONDS", 0.0)
+    return module
+
+
+def crawl(fetch, monkeypatch, works, seeds, hops, budget, failing=()):
+    session = FakeOpenAlex(works, failing)
+    monkeypatch.setattr(fetch.requests, "Session", lambda: session)
+    return fetch.crawl_citation_frontier({"meta": {}, "results": seeds}, hops, budget, workers=4), session
+
+
+def within_hops(works, seeds, hops):
+    """IDs within `hops` references of the seeds, per level."""
+    seen = {seed["id"] for seed in seeds}
+    levels = []
+    level = seeds
+    for _ in range(hops):
+        ids = {ref for work in level for ref in work["referenced_works"]} - seen
+        seen |= ids
+        levels.append(ids)
+        level = [works[work_id] for work_id in ids]
+    return levels
+
+
+def test_crawls_every_level(fetch, monkeypatch):
+    works = corpus()
+    seeds = [works[f"{OPENALEX}W{i}"] for i in range(390, 400)]
+
+    result, _ = crawl(fetch, monkeypatch, works, seeds, hops=3, budget=10_000)
+
+    crawled = [work["id"] for work in result["results"]]
+    assert crawled[:len(seeds)] == [seed["id"] for seed in seeds]
+    assert len(crawled) == len(set(crawled))
+    # Each hop's works follow the previous hop's
+    position = len(seeds)
+    for ids in within_hops(works, seeds, 3):
+        assert set(crawled[position:position + len(ids)]) == ids
+        position += len(ids)
+    assert position == len(crawled)
+
+
+def test_budget_fetches_most_cited_references_first(fetch, monkeypatch):
+    works = corpus()
+    seeds = [works[f"{OPENALEX}W{i}"] for i in range(300, 400)]
+    seed_ids = {seed["id"] for seed in seeds}
+    citing = {}
+    for seed in seeds:
+        for reference in set(seed["referenced_works"]) - seed_ids:
+            citing[reference] = citing.get(reference, 0) + 1
+
+    result, _ = crawl(fetch, monkeypatch, works, seeds, hops=2, budget=30)
+
+    fetched = result["results"][len(seeds):]
+    assert len(fetched) == 30
+    assert min(citing[work["id"]] for work in fetched) >= max(
+        count for reference, count in citing.items() if reference not in {work["id"] for work in fetched})
+
+
+def test_failed_batches_are_skipped(fetch, monkeypatch):
+    works = corpus()
+    seeds = [works[f"{OPENALEX}W{i}"] for i in range(300, 400)]
+    _, session = crawl(fetch, monkeypatch, works, seeds, hops=1, budget=10_000)
+    first_batch = session.requested[0]
+
+    result, session = crawl(fetch, monkeypatch, works, seeds, hops=1, budget=10_000, failing=[first_batch[0]])
+
+    fetched = {work["id"] for work in result["results"][len(seeds):]}
+    assert fetched == within_hops(works, seeds, 1)[0] - {OPENALEX + work_id for work_id in first_batch}
+    assert session.requested.count(first_batch) == fetch.CRAWL_MAX_RETRIES
+
+
+def test_seen_set_keys_work_ids_by_number(fetch):
+    seen = fetch.SeenSet()
+    seen.add(f"{OPENALEX}W4405893659")
+    seen.add("A123")
+
+    assert "W4405893659" in seen and f"{OPENALEX}W4405893659" in seen and "A123" in seen
+    assert "W4405893660" not in seen
+    assert seen.ids == {4405893659, "A123"}
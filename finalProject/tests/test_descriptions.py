@@ -0,0 +1,120 @@
+"""
+The description generator (generate_descriptions_topics.py) against the
+Ollama stub: concurrent and batched generation, the (model, prompt hash)
+cache, backoff on 503s and the early stop of streamed answers.
+"""
+import time
+
+import pytest
+
+from pipeline.stages import load_function_module
+
+TOPICS = [f"Topic {i}" for i in range(8)]
+
+
+@pytest.fixture
+def descriptions():
+    return load_function_module("generate_descriptions_topics/generate_descriptions_topics.py")
+
+
+@pytest.fixture
+def stub():
+    return load_function_module("generate_descriptions_topics/ollama_stub.py")
+
+
+@pytest.fixture
+def ollama(stub):
+    """Start a stub server on a free port; tests adjust its latency and failure rate."""
+    server, url = stub.start_stub_server(latency=0.0)
+    server.url = url
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def generator_for(descriptions, ollama, **kwargs):
+    kwargs.setdefault("cache", descriptions.DescriptionCache(path=None))
+    generator = descriptions.DescriptionGenerator(url=ollama.url, model="stub", **kwargs)
+    generator.backoff = descriptions.AdaptiveBackoff(base_delay=0.01, max_delay=0.05)
+    return generator
+
+
+def test_generates_concurrently(descriptions, stub, ollama):
+    ollama.latency = 0.2
+    generator = generator_for(descriptions, ollama, workers=len(TOPICS))
+
+    started = time.perf_counter()
+    result = generator.generate(TOPICS)
+    elapsed = time.perf_counter() - started
+
+    assert result == {topic: stub.describe(topic) for topic in TOPICS}
+    assert ollama.request_count == len(TOPICS)
+    # One at a time the requests would take 8 * 0.2 s
+    assert elapsed < len(TOPICS) * ollama.latency / 2
+
+
+def test_cache_hits_skip_generation(tmp_path, descriptions, ollama):
+    cache_path = str(tmp_path / "description_cache.json")
+    first = generator_for(descriptions, ollama, cache=descriptions.DescriptionCache(cache_path)).generate(TOPICS)
+    assert ollama.request_count == len(TOPICS)
+
+    cache = descriptions.DescriptionCache(cache_path)
+    assert set(cache.entries) == {cache.key("stub", descriptions.build_prompt(topic)) for topic in TOPICS}
+    assert generator_for(descriptions, ollama, cache=cache).generate(TOPICS) == first
+    assert ollama.request_count == len(TOPICS)
+
+    # The model is part of the key, so another model regenerates every description
+    other_model = descriptions.DescriptionGenerator(url=ollama.url, model="other", cache=cache)
+    other_model.generate(TOPICS)
+    assert ollama.request_count == 2 * len(TOPICS)
+
+
+def test_batches_parse_json_answers(descriptions, stub, ollama):
+    generator = generator_for(descriptions, ollama, batch_size=4)
+
+    result = generator.generate(TOPICS)
+
+    assert result == {topic: stub.describe(topic) for topic in TOPICS}
+    assert ollama.request_count == len(TOPICS) // 4
+    assert set(generator.cache.entries) == {
+        generator.cache.key("stub", descriptions.build_prompt(topic)) for topic in TOPICS}
+
+
+def test_retries_and_backs_off_on_503(descriptions, stub, ollama):
+    ollama.failure_rate = 1.0
+    generator = generator_for(descriptions, ollama, max_retries=3)
+
+    result = generator.generate(TOPICS[:1])
+
+    assert result == {TOPICS[0]: "Error: 503"}
+    assert generator.failed == {TOPICS[0]}
+    assert ollama.request_count == 3
+    # Three failures: the base delay, then doubled twice
+    assert generator.backoff.delay == pytest.approx(4 * generator.backoff.base_delay)
+
+    # Once the server recovers, a success halves the delay again
+    ollama.failure_rate = 0.0
+    assert generator.generate(TOPICS[1:2]) == {TOPICS[1]: stub.describe(TOPICS[1])}
+    assert generator.backoff.delay == pytest.approx(2 * generator.backoff.base_delay)
+
+
+def test_stream_stops_at_first_sentence(descriptions, stub, ollama):
+    ollama.token_latency = 0.02
+    generator = generator_for(descriptions, ollama, stream=True)
+
+    result = generator.generate(["Graphs. Networks"])
+
+    assert result == {"Graphs. Networks": "Graphs."}
+    # The full answer is 16 words; the generator stopped reading after the second
+    assert generator.timings["Graphs. Networks"]["total_seconds"] < 10 * ollama.token_latency
+
+
+def test_stream_stops_at_token_budget(descriptions, stub, ollama):
+    ollama.token_latency = 0.02
+    generator = generator_for(descriptions, ollama, stream=True, max_tokens=3)
+
+    result = generator.generate(TOPICS[:1])
+
+    assert result == {TOPICS[0]: " ".join(stub.describe(TOPICS[0]).split()[:3])}
+    assert generator.timings[TOPICS[0]]["ttft_seconds"] is not None
+    assert generator.timings[TOPICS[0]]["total_seconds"] < 10 * ollama.token_latency
@@ -0,0 +1,81 @@
+"""
+The vectorized emerging topic counts of bfs_emerging_topics.py agree with the
+BFS they replace, and the stage only publishes components of its own mode.
+"""
+import networkx as nx
+import pytest
+
+from benchmarks import synthetic
+from common import storage_backend
+from pipeline import stages
+from pipeline.stages import load_function_module
+
+
+@pytest.fixture
+def bfs():
+    return load_function_module("bfs_emerging_topics/bfs_emerging_topics.py")
+
+
+@pytest.fixture
+def citation_graph(local_storage):
+    """A synthetic citation graph, stored where the emerging topics stage reads it."""
+    preprocess = load_function_module("preprocess_data/main.py")
+    works = {"results": list(synthetic.generate_works(200, seed=7))}
+    preprocess.save_gml_to_gcs(preprocess.create_detailed_citation_graph(works), stages.PROCESSED_BUCKET,
+                               stages.CITATION_GML_BLOB)
+    with storage_backend.open_blob(stages.PROCESSED_BUCKET, stages.CITATION_GML_BLOB, "rb") as f:
+        return nx.read_gml(f)
+
+
+def assert_counts_equal(actual, expected):
+    for counter, reference in zip(actual, expected):
+        assert counter.keys() == reference.keys()
+        for name, value in reference.items():
+            assert counter[name] == pytest.approx(value)
+
+
+def test_components_match_bfs(bfs, citation_graph):
+    overall, components = bfs.component_emerging_topics(citation_graph, top_n=10_000, min_size=1)
+
+    assert_counts_equal(overall, bfs.bfs_emerging_topics(citation_graph, max_depth=100))
+    assert sum(component["papers"] for component in components) == citation_graph.number_of_nodes()
+    assert [component["papers"] for component in components] == sorted(
+        (len(c) for c in nx.weakly_connected_components(citation_graph)), reverse=True)
+
+    # With every name kept, the components add up to the overall counts
+    for level, counter in zip(bfs.LEVELS, overall):
+        summed = {}
+        for component in components:
+            for name, value in component[level].items():
+                summed[name] = summed.get(name, 0) + value
+        assert summed == pytest.approx(dict(counter))
+
+
+def test_seeds_count_papers_within_max_depth(bfs, citation_graph):
+    seeds = bfs.most_recent_papers(citation_graph, 5)
+    expected = set()
+    for seed in seeds:
+        expected |= set(nx.single_source_shortest_path_length(citation_graph, seed, cutoff=2))
+
+    counts, reached = bfs.seeded_emerging_topics(citation_graph, seeds, max_depth=2)
+
+    assert len(seeds) < reached == len(expected) < citation_graph.number_of_nodes()
+    assert_counts_equal(counts, bfs.bfs_emerging_topics(citation_graph.subgraph(expected), max_depth=100))
+
+    # Seeding every paper counts the whole graph
+    everything, reached = bfs.seeded_emerging_topics(citation_graph, list(citation_graph.nodes()))
+    assert reached == citation_graph.number_of_nodes()
+    assert_counts_equal(everything, bfs.bfs_emerging_topics(citation_graph, max_depth=100))
+
+
+@pytest.mark.parametrize("mode", ["seeds", "bfs"])
+def test_other_modes_drop_components(citation_graph, mode):
+    stages.run_emerging_topics({"emerging_mode": "components"})
+    components = storage_backend.get_client().bucket(stages.RESULTS_BUCKET).get_blob("emerging_topics/components.json")
+    assert components is not None
+
+    stages.run_emerging_topics({"emerging_mode": mode, "emerging_seeds": 5, "max_depth": 2})
+
+    assert storage_backend.get_client().bucket(stages.RESULTS_BUCKET).get_blob(
+        "emerging_topics/components.json") is None
+    assert storage_backend.get_client().bucket(stages.RESULTS_BUCKET).get_blob("emerging_topics/topics.json")
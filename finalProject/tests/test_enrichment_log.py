@@ -0,0 +1,188 @@
+"""
+Enrichment checkpoint logs (common/enrichment_log.py) keep API results across
+invocations, and a co-authorship build whose time budget runs out resumes
+from them without requesting any paper or author twice.
+"""
+import json
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from benchmarks import synthetic
+from common import enrichment_log, storage_backend
+from pipeline.stages import load_function_module
+
+BUCKET = "enrichment"
+PREFIX = "enrichment/graphs/1/paper_authors"
+
+
+@pytest.fixture
+def small_segments(local_storage, monkeypatch):
+    monkeypatch.setattr(enrichment_log, "CHECKPOINT_EVERY", 2)
+    monkeypatch.setattr(enrichment_log, "COMPACT_SEGMENTS", 3)
+
+
+def test_log_resumes_logged_results(small_segments):
+    with enrichment_log.EnrichmentLog(BUCKET, PREFIX) as log:
+        for i in range(5):
+            log.record(f"W{i}", [f"A{i}"])
+        # Every second record writes a segment; the last one waits for the exit
+        assert len(enrichment_log._segment_names(BUCKET, PREFIX)) == 2
+    assert len(enrichment_log._segment_names(BUCKET, PREFIX)) == 3
+
+    resumed = enrichment_log.EnrichmentLog(BUCKET, PREFIX)
+    assert resumed.results == {f"W{i}": [f"A{i}"] for i in range(5)}
+    assert "W4" in resumed and "W5" not in resumed
+
+
+def test_load_compacts_many_segments(small_segments):
+    with enrichment_log.EnrichmentLog(BUCKET, PREFIX) as log:
+        for i in range(8):
+            log.record(f"W{i % 6}", [f"A{i}"])
+    assert len(enrichment_log._segment_names(BUCKET, PREFIX)) == 4
+
+    compacted = enrichment_log.EnrichmentLog(BUCKET, PREFIX)
+
+    # Later entries for an ID win, before and after compaction
+    expected = {f"W{i % 6}": [f"A{i}"] for i in range(8)}
+    assert compacted.results == expected
+    assert len(enrichment_log._segment_names(BUCKET, PREFIX)) == 1
+    assert enrichment_log.EnrichmentLog(BUCKET, PREFIX).results == expected
+
+
+def test_reader_relists_after_concurrent_compaction(small_segments, monkeypatch):
+    with enrichment_log.EnrichmentLog(BUCKET, PREFIX) as log:
+        for i in range(8):
+            log.record(f"W{i}", [f"A{i}"])
+
+    # Another invocation compacts the log between this reader's listing and its reads
+    read_segment = enrichment_log.EnrichmentLog._read_segment
+    raced = []
+
+    def racing_read(self, name):
+        if not raced:
+            raced.append(name)
+            enrichment_log.EnrichmentLog(BUCKET, PREFIX)
+        return read_segment(self, name)
+
+    monkeypatch.setattr(enrichment_log.EnrichmentLog, "_read_segment", racing_read)
+    reader = enrichment_log.EnrichmentLog(BUCKET, PREFIX)
+
+    assert reader.results == {f"W{i}": [f"A{i}"] for i in range(8)}
+    assert len(enrichment_log._segment_names(BUCKET, PREFIX)) == 1
+
+
+def test_discard_keeps_other_builds(small_segments):
+    for build in ("1", "2"):
+        with enrichment_log.EnrichmentLog(BUCKET, f"enrichment/graphs/{build}/paper_authors") as log:
+            log.record("W1", ["A1"])
+
+    enrichment_log.discard(BUCKET, "enrichment/graphs/1")
+
+    assert enrichment_log._segment_names(BUCKET, "enrichment/graphs/1") == []
+    assert len(enrichment_log._segment_names(BUCKET, "enrichment/graphs/2")) == 1
+
+
+class FakeOpenAlex:
+    """Work and author-batch answers from a synthetic corpus, counting requests per invocation."""
+
+    def __init__(self, works):
+        self.works = {work["id"]: work for work in works}
+        self.requested_works = []
+        self.requested_authors = []
+        self.calls = 0
+
+    @staticmethod
+    def response(body):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(body).encode()
+        return response
+
+    def get_work(self, url, params=None, **kwargs):
+        self.calls += 1
+        paper_id = url.split("/works/", 1)[1]
+        self.requested_works.append(paper_id)
+        return self.response(self.works[paper_id])
+
+    def get_authors(self, url, params=None, **kwargs):
+        self.calls += 1
+        author_ids = params["filter"].split(":", 1)[1].split("|")
+        self.requested_authors.extend(author_ids)
+        return self.response({"results": [{"id": f"https://openalex.org/{author_id}",
+                                           "display_name": f"Name of {author_id}",
+                                           "last_known_institutions": []} for author_id in author_ids]})
+
+
+@pytest.fixture
+def coauthorship(local_storage, monkeypatch):
+    module = load_function_module("co_authorship_graph/coauthorship.py")
+    monkeypatch.setattr(module, "_author_table", {})
+    monkeypatch.setattr(module, "_author_table_generations", {})
+    monkeypatch.setattr(module, "_topic_cache", module.LRUCache(module.TOPIC_CACHE_SIZE))
+    monkeypatch.setattr(module, "_topic_cache_versions", {})
+    monkeypatch.setattr(module, "AUTHOR_BATCH_SIZE", 5)
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: None)
+    monkeypatch.delenv("OPENALEX_OFFLINE", raising=False)
+    monkeypatch.setenv("RENDER_MODE", "queue")
+    return module
+
+
+@pytest.fixture
+def api(coauthorship, monkeypatch):
+    works = list(synthetic.generate_works(40, seed=9))
+    preprocess = load_function_module("preprocess_data/main.py")
+    # Only works with attributes are requested; references outside the corpus are dropped
+    graph = preprocess.create_detailed_citation_graph({"results": works})
+    graph.remove_nodes_from([node for node in list(graph) if not graph.nodes[node]])
+    preprocess.save_gml_to_gcs(graph, "processeddata_sds", "citation_graph.gml")
+
+    api = FakeOpenAlex(works)
+    monkeypatch.setattr(requests, "get", api.get_work)
+    session = requests.Session()
+    session.get = api.get_authors
+    monkeypatch.setattr(requests, "Session", lambda: session)
+    return api
+
+
+def run_invocations(coauthorship, api, monkeypatch, requests_per_invocation):
+    """Deliver the event until it succeeds; each invocation's budget allows a number of requests."""
+    monkeypatch.setattr(enrichment_log.EnrichmentLog, "expired",
+                        lambda self: api.calls >= requests_per_invocation)
+    event = SimpleNamespace(data={"bucket": "processeddata_sds", "name": "citation_graph.gml"})
+    invocations = 0
+    while True:
+        invocations += 1
+        api.calls = 0
+        # A retry may land on a cold instance
+        coauthorship._author_table.clear()
+        coauthorship._author_table_generations.clear()
+        try:
+            coauthorship.process_gml_file(event)
+            return invocations
+        except enrichment_log.EnrichmentIncomplete:
+            assert invocations < 100
+
+
+def published_graph():
+    return storage_backend.read_bytes("coauthorshipgraph", "citation_graph/co_authorship_graph.gml")
+
+
+def test_build_resumes_after_time_budget(coauthorship, api, monkeypatch):
+    assert run_invocations(coauthorship, api, monkeypatch, requests_per_invocation=1000) == 1
+    uninterrupted = published_graph()
+    works_requested = len(api.requested_works)
+
+    # Start over, with budgets that run out both while fetching papers and while fetching authors
+    storage_backend.get_blob("coauthorshipgraph", "author_table.json").delete()
+    api.requested_works.clear()
+    api.requested_authors.clear()
+    assert run_invocations(coauthorship, api, monkeypatch, requests_per_invocation=7) > 2
+
+    assert published_graph() == uninterrupted
+    assert sorted(api.requested_works) == sorted(set(api.requested_works))
+    assert len(api.requested_works) == works_requested
+    assert sorted(api.requested_authors) == sorted(set(api.requested_authors))
+    # Publishing the graph discards the build's logs
+    assert enrichment_log._segment_names("coauthorshipgraph", coauthorship.ENRICHMENT_PREFIX) == []
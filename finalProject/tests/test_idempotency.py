@@ -0,0 +1,87 @@
+"""
+Storage events for an object the function already analysed are skipped
+(common/idempotency.py), while failed and changed inputs are processed again.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from common import idempotency, storage_backend, telemetry
+
+INPUT_BUCKET = "coauthorship"
+OUTPUT_BUCKET = "results"
+
+
+@pytest.fixture
+def source(tmp_path, local_storage, monkeypatch):
+    """Source file whose hash is the code version."""
+    monkeypatch.delenv("K_REVISION", raising=False)
+    monkeypatch.delenv("X_GOOGLE_FUNCTION_VERSION", raising=False)
+    monkeypatch.delenv("IDEMPOTENCY_CHECK", raising=False)
+    path = tmp_path / "function.py"
+    path.write_text("VERSION = 1\n")
+    return path
+
+
+@pytest.fixture
+def duplicates(monkeypatch):
+    counted = []
+    monkeypatch.setattr(telemetry, "count", lambda name, value=1: counted.append(name))
+    return counted
+
+
+def upload(name, data):
+    storage_backend.write_bytes(INPUT_BUCKET, name, data)
+    return {"bucket": INPUT_BUCKET, "name": name}
+
+
+def check(event, source):
+    return idempotency.check_event(event, OUTPUT_BUCKET, "analyze", str(source))
+
+
+def test_processed_events_are_skipped(source, duplicates):
+    event = upload("graph.gml", b"graph v1")
+    pending = check(event, source)
+    assert pending is not None
+    pending.mark_processed(recommendations=3)
+
+    assert check(event, source) is None
+    assert duplicates.count("idempotency.duplicates") == 1
+    manifest = json.loads(storage_backend.read_bytes(OUTPUT_BUCKET, "idempotency/analyze.json"))
+    assert manifest["objects"][f"{INPUT_BUCKET}/graph.gml"]["recommendations"] == 3
+
+    # A re-upload of the same content is a new generation with the same hash
+    assert check(upload("graph.gml", b"graph v1"), source) is None
+    # New content, or a new code version, is analysed again
+    assert check(upload("graph.gml", b"graph v2"), source) is not None
+    source.write_text("VERSION = 2\n")
+    assert check(upload("graph.gml", b"graph v1"), source) is not None
+
+
+def test_failed_events_are_retried(source):
+    event = upload("graph.gml", b"graph")
+    assert check(event, source) is not None
+    # The analysis failed, so the event was never marked
+    assert check(event, source) is not None
+
+
+def test_missing_objects_and_disabled_check(source, monkeypatch):
+    assert check({"bucket": INPUT_BUCKET, "name": "deleted.gml"}, source) is None
+
+    event = upload("graph.gml", b"graph")
+    check(event, source).mark_processed()
+    monkeypatch.setenv("IDEMPOTENCY_CHECK", "0")
+    pending = check(event, source)
+    assert pending is not None and pending.ledger is None
+
+
+def test_concurrent_marks_keep_every_record(source):
+    # Every conflicting round has a winner, so up to MAX_UPDATE_ATTEMPTS writers all get through
+    events = [upload(f"graph_{i}.gml", f"graph {i}".encode()) for i in range(idempotency.MAX_UPDATE_ATTEMPTS)]
+    pendings = [check(event, source) for event in events]
+
+    with ThreadPoolExecutor(max_workers=len(pendings)) as executor:
+        list(executor.map(lambda pending: pending.mark_processed(), pendings))
+
+    assert all(check(event, source) is None for event in events)
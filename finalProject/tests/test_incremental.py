@@ -0,0 +1,104 @@
+"""
+Incremental co-authorship updates (CoAuthorshipNetwork.update_graph) fold only
+the papers missing from the manifest into the latest graph version.
+"""
+import json
+
+import pytest
+
+from benchmarks import synthetic
+from common import storage_backend
+from pipeline.stages import load_function_module
+
+SOURCE_BUCKET = "processed"
+OUTPUT_BUCKET = "coauthorship"
+GML = "citation_graph.gml"
+
+
+@pytest.fixture
+def coauthorship(local_storage, monkeypatch):
+    module = load_function_module("co_authorship_graph/coauthorship.py")
+    # Start from a cold instance, offline: authors come from the 'authors' node attribute
+    monkeypatch.setattr(module, "_author_table", {})
+    monkeypatch.setattr(module, "_author_table_generations", {})
+    monkeypatch.setattr(module, "_topic_cache", module.LRUCache(module.TOPIC_CACHE_SIZE))
+    monkeypatch.setattr(module, "_topic_cache_versions", {})
+    monkeypatch.setenv("OPENALEX_OFFLINE", "1")
+    return module
+
+
+@pytest.fixture
+def preprocess():
+    return load_function_module("preprocess_data/main.py")
+
+
+@pytest.fixture
+def works():
+    return list(synthetic.generate_works(300, seed=11))
+
+
+def write_citation_graph(preprocess, works, without_authors=()):
+    graph = preprocess.create_detailed_citation_graph({"results": works})
+    for paper_id in without_authors:
+        del graph.nodes[paper_id]["authors"]
+    preprocess.save_gml_to_gcs(graph, SOURCE_BUCKET, GML)
+    return graph
+
+
+def network(coauthorship):
+    return coauthorship.CoAuthorshipNetwork(GML, SOURCE_BUCKET, OUTPUT_BUCKET)
+
+
+def manifest(coauthorship):
+    return json.loads(storage_backend.read_bytes(OUTPUT_BUCKET, coauthorship.MANIFEST_PATH))
+
+
+def weighted_edges(graph):
+    return {tuple(sorted((u, v))): data["weight"] for u, v, data in graph.edges(data=True)}
+
+
+def test_update_matches_full_build(coauthorship, preprocess, works):
+    write_citation_graph(preprocess, works[:200])
+    assert network(coauthorship).update_graph() == 1
+
+    graph = write_citation_graph(preprocess, works)
+    updated = network(coauthorship)
+    assert updated.update_graph() == 2
+
+    full = network(coauthorship)
+    full.build_graph()
+    assert weighted_edges(updated.graph) == weighted_edges(full.graph)
+    assert ({node: data["pub_count"] for node, data in updated.graph.nodes(data=True)}
+            == {node: data["pub_count"] for node, data in full.graph.nodes(data=True)})
+
+    # Every paper with attributes is recorded, bare references wait for theirs
+    recorded = manifest(coauthorship)
+    assert recorded["version"] == 2
+    assert set(recorded["paper_authors"]) == {node for node in graph if graph.nodes[node]}
+    assert recorded["graph_path"] == coauthorship.VERSIONED_GRAPH_PATH.format(version=2)
+
+
+def test_failing_papers_are_retried_up_to_the_cap(coauthorship, preprocess, works, monkeypatch, capsys):
+    monkeypatch.setattr(coauthorship, "MAX_PAPER_ATTEMPTS", 2)
+    write_citation_graph(preprocess, works[:200])
+    network(coauthorship).update_graph()
+
+    # Two new papers whose authors cannot be read
+    broken = [work["id"] for work in works[200:202]]
+    graph = write_citation_graph(preprocess, works, without_authors=broken)
+    assert all(graph.nodes[paper_id] for paper_id in broken)
+
+    network(coauthorship).update_graph()
+    assert manifest(coauthorship)["failed_attempts"] == {paper_id: 1 for paper_id in broken}
+    assert "2 new papers could not be processed yet" in capsys.readouterr().out
+
+    network(coauthorship).update_graph()
+    assert manifest(coauthorship)["failed_attempts"] == {paper_id: 2 for paper_id in broken}
+    assert "Giving up on 2 papers after 2 failed attempts" in capsys.readouterr().out
+
+    # Given-up papers are no longer extracted
+    network(coauthorship).update_graph()
+    out = capsys.readouterr().out
+    assert "0 of" in out and "2 failed papers are no longer retried" in out
+    assert manifest(coauthorship)["failed_attempts"] == {paper_id: 2 for paper_id in broken}
+    assert not set(broken) & set(manifest(coauthorship)["paper_authors"])
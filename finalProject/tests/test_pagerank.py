@@ -0,0 +1,103 @@
+"""
+The matrix PageRank of pagerank_influential_authors.py ranks authors like
+nx.pagerank on the author citation graph, with authors keyed by OpenAlex ID.
+"""
+import io
+import json
+import random
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from pipeline.stages import load_function_module
+
+
+@pytest.fixture
+def pagerank():
+    return load_function_module("pagerank_influential_authors/pagerank_influential_authors.py")
+
+
+def citation_graph(n_papers=60, n_authors=25, seed=4):
+    """Papers citing earlier papers; some authors share a display name, some papers store JSON strings."""
+    rng = random.Random(seed)
+    graph = nx.DiGraph()
+    for i in range(n_papers):
+        authors = [{"id": f"https://openalex.org/A{a}", "display_name": f"Author {a % 20}"}
+                   for a in rng.sample(range(n_authors), rng.randrange(1, 4))]
+        topics = [{"display_name": f"Topic {t}"} for t in rng.sample(range(5), rng.randrange(1, 3))]
+        if i % 3 == 0:
+            authors, topics = json.dumps(authors), json.dumps(topics)
+        graph.add_node(f"W{i}", authors=authors, topics=topics)
+        graph.add_edges_from((f"W{i}", f"W{j}") for j in rng.sample(range(i), min(i, rng.randrange(0, 4))))
+    return graph
+
+
+def as_list(value):
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def reference_ranking(graph, alpha=0.85):
+    """Author citation DiGraph ranked with nx.pagerank, topic scores summed per paper."""
+    author_graph = nx.DiGraph()
+    for paper in graph.nodes():
+        author_graph.add_nodes_from(author["id"] for author in as_list(graph.nodes[paper]["authors"]))
+    for citing, cited in graph.edges():
+        for author in as_list(graph.nodes[citing]["authors"]):
+            for other in as_list(graph.nodes[cited]["authors"]):
+                author_graph.add_edge(author["id"], other["id"])
+    scores = nx.pagerank(author_graph, alpha=alpha)
+
+    topic_scores = {}
+    for paper in graph.nodes():
+        for topic in as_list(graph.nodes[paper]["topics"]):
+            for author in as_list(graph.nodes[paper]["authors"]):
+                by_author = topic_scores.setdefault(topic["display_name"], {})
+                by_author[author["id"]] = by_author.get(author["id"], 0) + scores[author["id"]]
+    return scores, topic_scores
+
+
+def test_pagerank_matches_networkx(pagerank):
+    graph = nx.gnp_random_graph(80, 0.05, seed=1, directed=True)
+    # Nodes without out-edges exercise the dangling redistribution
+    graph.remove_edges_from(list(graph.out_edges(range(10))))
+    matrix = nx.to_scipy_sparse_array(graph, nodelist=range(80), format="csr")
+
+    expected = nx.pagerank(graph, alpha=0.85)
+    assert pagerank.pagerank(matrix) == pytest.approx([expected[node] for node in range(80)], abs=1e-6)
+    assert pagerank.pagerank(matrix[:0, :0]).shape == (0,)
+
+
+def test_rankings_match_networkx(pagerank):
+    graph = citation_graph()
+    scores, topic_scores = reference_ranking(graph)
+
+    ranked = pagerank.rank_authors_pagerank(graph)
+
+    assert set(ranked) == set(topic_scores)
+    for topic, authors in ranked.items():
+        assert {author_id: score for _, score, author_id in authors} == pytest.approx(topic_scores[topic], abs=1e-6)
+        values = [score for _, score, _ in authors]
+        assert values == sorted(values, reverse=True)
+
+    # Authors 3 and 23 share a display name but are ranked apart
+    matrix = pagerank.AuthorMatrix.from_graph(graph)
+    assert matrix.names[matrix.ids.index("https://openalex.org/A3")] == "Author 3"
+    assert matrix.names[matrix.ids.index("https://openalex.org/A23")] == "Author 3"
+    assert pagerank.pagerank(matrix.citations) == pytest.approx([scores[author_id] for author_id in matrix.ids],
+                                                                abs=1e-6)
+
+
+def test_author_matrix_round_trip(pagerank):
+    graph = citation_graph()
+    matrix = pagerank.AuthorMatrix.from_graph(graph)
+
+    file = io.BytesIO()
+    matrix.save(file)
+    file.seek(0)
+    loaded = pagerank.AuthorMatrix.load(file)
+
+    assert loaded.ids == matrix.ids and loaded.names == matrix.names
+    assert (loaded.citations != matrix.citations).nnz == 0
+    assert np.array_equal(loaded.paper_authors.toarray(), matrix.paper_authors.toarray())
+    assert pagerank.rank_authors_pagerank(graph, author_matrix=loaded) == pagerank.rank_authors_pagerank(graph)
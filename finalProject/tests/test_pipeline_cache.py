@@ -0,0 +1,105 @@
+"""
+PipelineRunner skips a stage only while its cache key (code, shared common/
+modules, params and input contents) and its recorded outputs are unchanged.
+"""
+import os
+
+import pytest
+
+from pipeline import runner as runner_module
+from pipeline.runner import PipelineRunner
+from pipeline.stages import Stage
+
+calls = []
+
+
+def _write(config, name, text):
+    path = os.path.join(os.environ["LOCAL_STORAGE_ROOT"], "bucket", name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def produce(config):
+    calls.append("produce")
+    _write(config, "produced/data.txt", f"scale={config['scale']}")
+
+
+def consume(config):
+    calls.append("consume")
+    _write(config, "consumed/result.txt", "ok")
+    return config.get("problems", [])
+
+
+def fail(config):
+    calls.append("fail")
+    raise RuntimeError("stage broke")
+
+
+STAGES = [
+    Stage("produce", produce, outputs=[("bucket", "produced/")], params=["scale"]),
+    Stage("consume", consume, deps=["produce"], inputs=[("bucket", "produced/data.txt")],
+          outputs=[("bucket", "consumed/")]),
+]
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    # The runner sets these for its stages; monkeypatch restores them afterwards
+    for name in ("STORAGE_BACKEND", "LOCAL_STORAGE_ROOT", "OPENALEX_OFFLINE", "COAUTHORSHIP_BUILD_MODE",
+                 "IDEMPOTENCY_CHECK", "MPLBACKEND"):
+        monkeypatch.setenv(name, "")
+    calls.clear()
+    return str(tmp_path)
+
+
+def run(root, stages=STAGES, **config):
+    runner = PipelineRunner(root, {"scale": 1, **config}, max_workers=1)
+    runner.stages = stages
+    with pytest.MonkeyPatch.context() as patch:
+        # Stages are looked up by name when they execute
+        patch.setattr(runner_module, "STAGES_BY_NAME", {stage.name: stage for stage in stages})
+        results = runner.run()
+    return {name: result["status"] for name, result in results.items()}
+
+
+def test_unchanged_stages_are_cached(root):
+    assert run(root) == {"produce": "ran", "consume": "ran"}
+    assert run(root) == {"produce": "cached", "consume": "cached"}
+    assert calls == ["produce", "consume"]
+
+
+def test_param_change_reruns_the_stage_and_its_consumers(root):
+    run(root)
+    assert run(root, scale=2) == {"produce": "ran", "consume": "ran"}
+    # Same param and same produced content as the first run: both keys match again
+    assert run(root, scale=2) == {"produce": "cached", "consume": "cached"}
+
+
+def test_changed_output_reruns_the_stage(root):
+    run(root)
+    with open(os.path.join(root, "bucket", "consumed", "result.txt"), "w", encoding="utf-8") as f:
+        f.write("edited")
+
+    assert run(root) == {"produce": "cached", "consume": "ran"}
+
+
+def test_common_modules_are_part_of_every_key(root, monkeypatch):
+    run(root)
+    monkeypatch.setattr(runner_module, "common_sources_sha256", lambda: "changed common/")
+
+    assert run(root) == {"produce": "ran", "consume": "ran"}
+
+
+def test_stages_with_problems_are_not_cached(root):
+    assert run(root, problems=["topic X: Error: 503"]) == {"produce": "ran", "consume": "ran"}
+    assert run(root, problems=[]) == {"produce": "cached", "consume": "ran"}
+    assert run(root) == {"produce": "cached", "consume": "cached"}
+
+
+def test_failure_blocks_dependents(root):
+    stages = [Stage("produce", fail, outputs=[("bucket", "produced/")]), STAGES[1]]
+
+    assert run(root, stages) == {"produce": "failed", "consume": "upstream_failed"}
+    assert run(root, stages) == {"produce": "failed", "consume": "upstream_failed"}
+    assert calls == ["fail", "fail"]
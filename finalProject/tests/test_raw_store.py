@@ -0,0 +1,65 @@
+"""
+Raw works written by common/raw_store.py read back unchanged, whichever way
+they are read.
+"""
+import json
+
+import pytest
+
+from benchmarks import synthetic
+from common import raw_store, storage_backend
+
+BUCKET = "raw"
+
+
+@pytest.fixture
+def works():
+    return {"meta": {"count": 50}, "results": list(synthetic.generate_works(50, seed=1))}
+
+
+def chunk_names(prefix):
+    return sorted(blob.name for blob in storage_backend.get_client().list_blobs(BUCKET, prefix=prefix + "/")
+                  if not blob.name.endswith("index.json"))
+
+
+def test_round_trip(local_storage, works):
+    index = raw_store.write_works(BUCKET, "openalex_works", works, chunk_records=8, compression="gzip")
+
+    assert index["record_count"] == 50
+    assert [chunk["records"] for chunk in index["chunks"]] == [8] * 6 + [2]
+    assert chunk_names("openalex_works") == sorted(chunk["name"] for chunk in index["chunks"])
+    # The legacy document name resolves to the chunked copy
+    assert raw_store.load_works(BUCKET, "openalex_works.json", workers=3) == works
+    assert list(raw_store.iter_works(BUCKET, "openalex_works")) == works["results"]
+
+    wanted = [works["results"][3]["id"], works["results"][41]["id"]]
+    assert raw_store.lookup_works(BUCKET, "openalex_works", wanted) == {
+        work["id"]: work for work in works["results"] if work["id"] in wanted}
+
+
+def test_rewrite_replaces_chunks(local_storage, works):
+    first = raw_store.write_works(BUCKET, "openalex_works", works, chunk_records=8)
+    assert raw_store.write_works(BUCKET, "openalex_works", works, chunk_records=8)["chunks"] == first["chunks"]
+
+    changed = {**works, "results": works["results"][:20]}
+    second = raw_store.write_works(BUCKET, "openalex_works", changed, chunk_records=8)
+
+    # Chunks of the replaced version are deleted once the new index is written
+    assert chunk_names("openalex_works") == sorted(chunk["name"] for chunk in second["chunks"])
+    assert raw_store.load_works(BUCKET, "openalex_works.json") == changed
+
+
+def test_zstd_falls_back_to_gzip(local_storage, works, monkeypatch):
+    monkeypatch.setattr(raw_store, "_zstandard", lambda: None)
+
+    index = raw_store.write_works(BUCKET, "openalex_works", works, compression="zstd")
+
+    assert index["compression"] == "gzip"
+    assert all(chunk["name"].endswith(raw_store.SUFFIXES["gzip"]) for chunk in index["chunks"])
+    assert raw_store.load_works(BUCKET, "openalex_works.json") == works
+
+
+def test_legacy_document_without_chunks(local_storage, works):
+    storage_backend.write_bytes(BUCKET, "openalex_works.json", json.dumps(works))
+
+    assert raw_store.load_works(BUCKET, "openalex_works.json") == works
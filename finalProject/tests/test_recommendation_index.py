@@ -0,0 +1,132 @@
+"""
+The prebuilt query indexes (common/recommendation_index.py) answer collaborator
+and topic queries like a direct computation on the co-authorship graph.
+"""
+import io
+import json
+import random
+
+import networkx as nx
+import pytest
+
+from pipeline.stages import load_function_module
+
+BUCKET = "collaborationanalysis"
+GRAPH = "co_authorship_graph"
+
+
+@pytest.fixture
+def index_module(local_storage, tmp_path, monkeypatch):
+    from common import recommendation_index
+
+    monkeypatch.setattr(recommendation_index, "INDEX_CACHE_DIR", str(tmp_path / "index_cache"))
+    return recommendation_index
+
+
+@pytest.fixture
+def session():
+    from common.analysis_session import AnalysisSession
+
+    rng = random.Random(11)
+    graph = nx.Graph()
+    for i in range(25):
+        # GML labels are the node names, i.e. the author IDs
+        graph.add_node(f"A{i}", institution=f"I{i % 4}", pub_count=i + 1, topics=[
+            {"id": f"https://openalex.org/T{t}", "display_name": f"Topic {t}"}
+            for t in rng.sample(range(12), rng.randrange(0, 4))])
+    graph.add_edges_from((f"A{rng.randrange(25)}", f"A{rng.randrange(25)}") for _ in range(30))
+    graph.remove_edges_from(nx.selfloop_edges(graph))
+
+    return AnalysisSession(io.BytesIO("\n".join(nx.generate_gml(graph)).encode()))
+
+
+def label(session, node):
+    return session.G.nodes[node]["label"]
+
+
+def centrality(session, node):
+    return 0.6 * session.degree_centrality.get(node, 0) + 0.4 * session.betweenness.get(node, 0)
+
+
+def expected_collaborators(session, node):
+    """Scores of every author sharing a topic with node and not yet connected to it."""
+    topics = session.topic_map[node]
+    scores = {}
+    for other in session.G.nodes():
+        shared = topics & session.topic_map[other]
+        if other == node or not shared or session.G.has_edge(node, other):
+            continue
+        similarity = len(shared) / len(topics | session.topic_map[other])
+        network_score = (centrality(session, node) + centrality(session, other)) / 2
+        scores[label(session, other)] = 0.7 * similarity + 0.3 * network_score
+    return scores
+
+
+def test_collaborators_match_direct_scores(index_module, session):
+    index_module.build_index(session, BUCKET, GRAPH, version="v1")
+    index = index_module.RecommendationIndex.download(BUCKET, GRAPH, index_module.latest_version(BUCKET, GRAPH))
+
+    for node in session.G.nodes():
+        expected = expected_collaborators(session, node)
+        recommendations = index.recommend_collaborators(label(session, node), k=len(session.G))
+
+        assert {r["id"]: r["combined_score"] for r in recommendations} == pytest.approx(
+            {author: round(score, 3) for author, score in expected.items()}, abs=1e-3)
+        scores = [r["combined_score"] for r in recommendations]
+        assert scores == sorted(scores, reverse=True)
+        assert index.recommend_collaborators(label(session, node), k=2) == recommendations[:2]
+
+    with pytest.raises(KeyError):
+        index.recommend_collaborators("A999")
+
+
+def test_top_authors_by_topic(index_module, session):
+    index_module.build_index(session, BUCKET, GRAPH, version="v1")
+    index = index_module.RecommendationIndex.download(BUCKET, GRAPH, "v1")
+
+    for topic in index.topics:
+        short_id = topic["id"].rsplit("/", 1)[-1]
+        authors = [node for node in session.G.nodes() if topic["id"] in session.topic_map[node]]
+        expected = sorted(authors, key=lambda node: -centrality(session, node))
+
+        top = index.top_authors(short_id, k=3)
+        assert [a["centrality"] for a in top] == pytest.approx(
+            [centrality(session, node) for node in expected[:3]], abs=1e-6)
+        assert {a["id"] for a in index.top_authors(topic["display_name"].upper(), k=len(session.G))} == {
+            label(session, node) for node in authors}
+        assert index.topic(topic["id"]) == topic
+
+
+def test_rebuilt_version_is_downloaded_again(index_module, session):
+    index_module.build_index(session, BUCKET, GRAPH, version="v1")
+    first = index_module.RecommendationIndex.download(BUCKET, GRAPH, "v1")
+    cached = index_module.RecommendationIndex.download(BUCKET, GRAPH, "v1")
+
+    # Rebuilding a version under the same name writes a new manifest generation
+    session.G.add_edge(0, 1)  # Nodes of a parsed graph are keyed by GML id
+    index_module.build_index(session, BUCKET, GRAPH, version="v1")
+    rebuilt = index_module.RecommendationIndex.download(BUCKET, GRAPH, "v1")
+
+    assert list(cached.neighbors) == list(first.neighbors)
+    assert list(rebuilt.neighbors) != list(first.neighbors)
+    assert 1 in rebuilt._row(rebuilt.neighbors_indptr, rebuilt.neighbors, 0).tolist()
+
+
+def test_query_function(index_module, session, monkeypatch):
+    index_module.build_index(session, BUCKET, GRAPH, version="v1")
+    query = load_function_module("recommendation_query/recommendation_query.py")
+    monkeypatch.setattr(query, "_latest", {"version": None, "checked_at": 0.0})
+    monkeypatch.setattr(query, "_indexes", index_module.IndexCache())
+
+    class Request:
+        def __init__(self, **args):
+            self.args = args
+
+    body, status, _ = query.query_recommendations(Request(author="A0", k="3"))
+    assert status == 200
+    assert json.loads(body)["index_version"] == "v1"
+    assert len(json.loads(body)["recommendations"]) <= 3
+
+    assert query.query_recommendations(Request(author="A999"))[1] == 404
+    assert query.query_recommendations(Request(author="A0", topic="T1"))[1] == 400
+    assert query.query_recommendations(Request(author="A0", k="x"))[1] == 400
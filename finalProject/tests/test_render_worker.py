@@ -0,0 +1,77 @@
+"""
+Render jobs (common/render_queue.py) are drawn by the render worker and moved
+from jobs/ to done/, or to failed/ with the error when rendering raises.
+"""
+import json
+
+import pytest
+
+from common import render_queue, storage_backend
+from pipeline.stages import load_function_module
+
+RESULTS_BUCKET = "results"
+RECOMMENDATIONS = [
+    {"author_1": {"id": f"A{i}"}, "author_2": {"id": f"A{i + 1}"}, "topic_similarity_score": i / 10,
+     "network_score": 1 - i / 10, "combined_score": 0.5 + i / 100}
+    for i in range(5)
+]
+
+
+@pytest.fixture
+def worker(local_storage):
+    module = load_function_module("render_worker/render_worker.py")
+    return module.RenderWorker(jobs_bucket=render_queue.RENDER_JOBS_BUCKET)
+
+
+def job_blobs(prefix):
+    return sorted(blob.name for blob in storage_backend.get_client().list_blobs(render_queue.RENDER_JOBS_BUCKET,
+                                                                               prefix=prefix))
+
+
+def enqueue_collaboration(data_name, output_name="collaboration.png"):
+    return render_queue.enqueue_render(
+        "collaboration",
+        output=render_queue.blob_ref(RESULTS_BUCKET, output_name),
+        data=render_queue.blob_ref(RESULTS_BUCKET, data_name),
+        options={"dpi": 20, "preview_dpi": 10},
+    )
+
+
+def test_rendered_job_moves_to_done(worker):
+    storage_backend.write_bytes(RESULTS_BUCKET, "collaboration.json", json.dumps({"recommendations": RECOMMENDATIONS}))
+    job_path = enqueue_collaboration("collaboration.json")
+    assert job_blobs(render_queue.JOBS_PREFIX) == [job_path]
+
+    assert worker.process_job(job_path) is True
+
+    assert job_blobs(render_queue.JOBS_PREFIX) == []
+    [done] = job_blobs(render_queue.DONE_PREFIX)
+    assert done == render_queue.DONE_PREFIX + job_path[len(render_queue.JOBS_PREFIX):]
+    for name in ("collaboration.png", render_queue.preview_path("collaboration.png")):
+        assert storage_backend.read_bytes(RESULTS_BUCKET, name).startswith(b"\x89PNG")
+
+
+def test_failed_job_moves_to_failed_without_raising(worker):
+    job_path = enqueue_collaboration("missing.json")
+
+    assert worker.process_job(job_path) is False
+
+    assert job_blobs(render_queue.JOBS_PREFIX) == []
+    assert job_blobs(render_queue.DONE_PREFIX) == []
+    [failed] = job_blobs(render_queue.FAILED_PREFIX)
+    job = json.loads(storage_backend.read_bytes(render_queue.RENDER_JOBS_BUCKET, failed))
+    assert job["error"] and job["render_seconds"] >= 0
+
+
+def test_process_pending_renders_the_rest_and_reports_failures(worker):
+    storage_backend.write_bytes(RESULTS_BUCKET, "collaboration.json", json.dumps({"recommendations": RECOMMENDATIONS}))
+    enqueue_collaboration("collaboration.json", "first.png")
+    broken = enqueue_collaboration("missing.json")
+    enqueue_collaboration("collaboration.json", "last.png")
+
+    with pytest.raises(RuntimeError, match=f"1 of 3 render jobs failed: {broken}"):
+        worker.process_pending()
+
+    assert job_blobs(render_queue.JOBS_PREFIX) == []
+    assert len(job_blobs(render_queue.DONE_PREFIX)) == 2
+    assert storage_backend.read_bytes(RESULTS_BUCKET, "last.png").startswith(b"\x89PNG")
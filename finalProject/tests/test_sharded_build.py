@@ -0,0 +1,119 @@
+"""
+The sharded co-authorship build (build_shard/reduce_shards) yields the same
+graph as the single-process build_graph, and resumes from its checkpoints.
+"""
+import json
+from types import SimpleNamespace
+
+import networkx as nx
+import pytest
+
+from benchmarks import synthetic
+from common import storage_backend
+from pipeline.stages import load_function_module
+
+SOURCE_BUCKET = "processed"
+OUTPUT_BUCKET = "coauthorship"
+GML = "citation_graph.gml"
+SHARDS = 4
+
+
+@pytest.fixture
+def coauthorship(local_storage, monkeypatch):
+    module = load_function_module("co_authorship_graph/coauthorship.py")
+    # Start from a cold instance, offline: authors come from the 'authors' node attribute
+    monkeypatch.setattr(module, "_author_table", {})
+    monkeypatch.setattr(module, "_author_table_generations", {})
+    monkeypatch.setattr(module, "_topic_cache", module.LRUCache(module.TOPIC_CACHE_SIZE))
+    monkeypatch.setattr(module, "_topic_cache_versions", {})
+    monkeypatch.setenv("OPENALEX_OFFLINE", "1")
+    monkeypatch.setenv("RENDER_MODE", "queue")
+    return module
+
+
+@pytest.fixture(autouse=True)
+def citation_graph(coauthorship):
+    preprocess = load_function_module("preprocess_data/main.py")
+    graph = preprocess.create_detailed_citation_graph({"results": list(synthetic.generate_works(300, seed=5))})
+    preprocess.save_gml_to_gcs(graph, SOURCE_BUCKET, GML)
+    return graph
+
+
+def network(coauthorship):
+    return coauthorship.CoAuthorshipNetwork(GML, SOURCE_BUCKET, OUTPUT_BUCKET)
+
+
+def full_build(coauthorship):
+    full = network(coauthorship)
+    full.build_graph()
+    return full.graph
+
+
+def build_id(coauthorship):
+    return coauthorship.shard_build_id(SOURCE_BUCKET, GML, SHARDS)
+
+
+def input_generations(coauthorship, build):
+    return [storage_backend.get_blob(OUTPUT_BUCKET, coauthorship.shard_blob(build, "input", shard)).generation
+            for shard in range(SHARDS)]
+
+
+def assert_same_graph(graph, expected):
+    assert dict(graph.nodes(data=True)) == dict(expected.nodes(data=True))
+    assert ({tuple(sorted((u, v))): data["weight"] for u, v, data in graph.edges(data=True)}
+            == {tuple(sorted((u, v))): data["weight"] for u, v, data in expected.edges(data=True)})
+
+
+def test_sharded_build_matches_full_build(coauthorship):
+    expected = full_build(coauthorship)
+    assert expected.number_of_edges() > 0
+
+    planner = network(coauthorship)
+    assert planner.plan_shards(build_id(coauthorship), SHARDS) == list(range(SHARDS))
+    for shard in range(SHARDS):
+        network(coauthorship).build_shard(build_id(coauthorship), shard, SHARDS)
+
+    reduced = network(coauthorship)
+    reduced.reduce_shards(build_id(coauthorship), SHARDS)
+    assert_same_graph(reduced.graph, expected)
+
+
+def test_interrupted_build_resumes_missing_shards(coauthorship):
+    expected = full_build(coauthorship)
+    build = build_id(coauthorship)
+    network(coauthorship).plan_shards(build, SHARDS)
+    for shard in (0, 2):
+        network(coauthorship).build_shard(build, shard, SHARDS)
+
+    with pytest.raises(RuntimeError, match=r"Shards \[1, 3\]"):
+        network(coauthorship).reduce_shards(build, SHARDS)
+
+    # A re-run plans only the shards without a checkpoint and keeps their inputs
+    inputs = input_generations(coauthorship, build)
+    assert network(coauthorship).plan_shards(build, SHARDS) == [1, 3]
+    assert input_generations(coauthorship, build) == inputs
+
+    for shard in (1, 3):
+        network(coauthorship).build_shard(build, shard, SHARDS)
+    reduced = network(coauthorship)
+    reduced.reduce_shards(build, SHARDS)
+    assert_same_graph(reduced.graph, expected)
+
+
+def test_last_shard_worker_reduces_and_publishes(coauthorship):
+    expected = full_build(coauthorship)
+    build = build_id(coauthorship)
+    network(coauthorship).plan_shards(build, SHARDS, output_folder="sharded")
+
+    for shard in range(SHARDS):
+        task = coauthorship.shard_blob(build, "task", shard)
+        assert not storage_backend.get_blob(OUTPUT_BUCKET, "sharded/co_authorship_graph.gml").exists()
+        coauthorship.process_coauthorship_shard(SimpleNamespace(data={"bucket": OUTPUT_BUCKET, "name": task}))
+
+    # Only the worker that completed the build claimed the reduce step
+    assert not network(coauthorship).claim_reduce(build)
+    published = nx.parse_gml(storage_backend.read_bytes(OUTPUT_BUCKET, "sharded/co_authorship_graph.gml").decode())
+    assert sorted(published.nodes()) == sorted(expected.nodes())
+    assert published.number_of_edges() == expected.number_of_edges()
+    stats = json.loads(storage_backend.read_bytes(OUTPUT_BUCKET, "sharded/network_stats.json"))
+    assert stats["number_of_collaborations"] == expected.number_of_edges()
@@ -0,0 +1,85 @@
+"""
+The snapshot path (pipeline/snapshot.py) must feed preprocess_data the same
+works as the API path, so both build identical tables and graph files.
+"""
+import gzip
+import json
+import os
+
+import networkx as nx
+import pytest
+
+from benchmarks import synthetic
+from pipeline import snapshot
+from pipeline.stages import load_function_module
+
+
+def api_works(n_papers=40):
+    """Synthetic works with the fields an API response carries beyond those the pipeline reads."""
+    works = list(synthetic.generate_works(n_papers, seed=3))
+    for i, work in enumerate(works):
+        work["concepts"] = [{"id": f"https://openalex.org/C{i}", "display_name": f"Concept {i % 5}", "level": 1,
+                             "score": 0.5}]
+        work["abstract_inverted_index"] = {"Synthetic": [0]}
+        work["locations"] = [{"is_oa": False, "source": None}]
+        work["updated_date"] = "2025-06-01T00:00:00"
+    return works
+
+
+def write_partition(snapshot_dir, entity, updated_date, name, records):
+    directory = os.path.join(snapshot_dir, "data", entity, f"updated_date={updated_date}")
+    os.makedirs(directory, exist_ok=True)
+    with gzip.open(os.path.join(directory, name), "wt", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def preprocess():
+    return load_function_module("preprocess_data/main.py")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_snapshot_matches_api_path(tmp_path, preprocess, workers):
+    works = api_works()
+    write_partition(tmp_path, "works", "2025-06-01", "part_000.gz", works[:25])
+    write_partition(tmp_path, "works", "2025-06-01", "part_001.gz", works[25:])
+
+    from_api = {"meta": {"count": len(works)}, "results": works}
+    from_snapshot = snapshot.load_works(str(tmp_path), workers)
+
+    assert preprocess.process_works(from_snapshot).equals(preprocess.process_works(from_api))
+    assert (sorted(preprocess.create_citation_graph(from_snapshot).edges())
+            == sorted(preprocess.create_citation_graph(from_api).edges()))
+    assert (list(nx.generate_gml(preprocess.create_detailed_citation_graph(from_snapshot)))
+            == list(nx.generate_gml(preprocess.create_detailed_citation_graph(from_api))))
+
+
+def test_load_entities_keeps_latest_updated_date(tmp_path):
+    work = api_works(1)[0]
+    older = dict(work, title="Old title", updated_date="2025-01-01T00:00:00")
+    newer = dict(work, title="New title", updated_date="2025-06-01T00:00:00")
+    # Partitions are read in name order, so the newer record is seen first here
+    write_partition(tmp_path, "works", "2025-01-01", "part_000.gz", [newer])
+    write_partition(tmp_path, "works", "2025-06-01", "part_000.gz", [older])
+
+    records = snapshot.load_entities(str(tmp_path), "works", workers=1)
+
+    assert list(records) == [work["id"]]
+    assert records[work["id"]]["title"] == "New title"
+
+
+def test_author_table_keeps_latest_record(tmp_path):
+    author = {"id": "https://openalex.org/A5000000001", "display_name": "Author 1", "works_count": 3,
+              "last_known_institutions": [{"id": "https://openalex.org/I1", "display_name": "Old Institution"}],
+              "updated_date": "2025-01-01T00:00:00"}
+    moved = dict(author, last_known_institutions=[{"id": "https://openalex.org/I2", "display_name": "New Institution"}],
+                 updated_date="2025-06-01T00:00:00")
+    write_partition(tmp_path, "authors", "2025-01-01", "part_000.gz", [author])
+    write_partition(tmp_path, "authors", "2025-06-01", "part_000.gz", [moved])
+
+    table = snapshot.author_table(str(tmp_path), workers=2)
+
+    assert table == {"A5000000001": {"id": author["id"], "display_name": "Author 1",
+                                     "last_known_institutions": [{"display_name": "New Institution"}],
+                                     "updated_date": "2025-06-01T00:00:00"}}
@@ -0,0 +1,81 @@
+"""
+The local storage backend mirrors the GCS semantics the functions rely on:
+generation preconditions, missing blobs and composite uploads.
+"""
+import multiprocessing
+
+import pytest
+
+from common import storage_backend
+
+BUCKET = "bucket"
+
+
+def test_generation_preconditions(local_storage):
+    # 0 only matches a blob that does not exist yet
+    storage_backend.write_bytes(BUCKET, "claim.json", b"first", if_generation_match=0)
+    with pytest.raises(storage_backend.PreconditionFailed):
+        storage_backend.write_bytes(BUCKET, "claim.json", b"second", if_generation_match=0)
+
+    blob = storage_backend.get_client().bucket(BUCKET).get_blob("claim.json")
+    generation = blob.generation
+    storage_backend.write_bytes(BUCKET, "claim.json", b"third", if_generation_match=generation)
+    # As with GCS, a blob handle keeps the generation it loaded until it is reloaded
+    assert blob.generation == generation
+    blob.reload()
+    assert blob.generation != generation
+
+    # The generation read before the last write is stale now
+    with pytest.raises(storage_backend.PreconditionFailed):
+        storage_backend.write_bytes(BUCKET, "claim.json", b"fourth", if_generation_match=generation)
+    assert storage_backend.read_bytes(BUCKET, "claim.json") == b"third"
+
+
+def test_missing_blobs(local_storage):
+    bucket = storage_backend.get_client().bucket(BUCKET)
+
+    assert bucket.get_blob("missing.json") is None
+    assert storage_backend.get_blob(BUCKET, "missing.json").generation is None
+    with pytest.raises(storage_backend.NotFound):
+        storage_backend.read_bytes(BUCKET, "missing.json")
+    with pytest.raises(storage_backend.NotFound):
+        storage_backend.get_blob(BUCKET, "missing.json").reload()
+
+
+def test_composite_upload(local_storage, monkeypatch):
+    monkeypatch.setattr(storage_backend, "COMPOSITE_THRESHOLD", 1000)
+    monkeypatch.setattr(storage_backend, "COMPOSITE_MIN_PART_SIZE", 300)
+    data = bytes(range(256)) * 10
+
+    storage_backend.write_bytes(BUCKET, "large.bin", data)
+
+    assert storage_backend.read_bytes(BUCKET, "large.bin") == data
+    # The parts are deleted once composed
+    assert [blob.name for blob in storage_backend.get_client().list_blobs(BUCKET)] == ["large.bin"]
+
+
+def _claim(root, barrier, results):
+    import os
+
+    os.environ.update(STORAGE_BACKEND="local", LOCAL_STORAGE_ROOT=root)
+    barrier.wait()
+    try:
+        # A payload large enough that writing it outlasts the other processes' checks
+        storage_backend.write_bytes(BUCKET, "reduce.bin", os.urandom(8 << 20), if_generation_match=0)
+        results.put(True)
+    except storage_backend.PreconditionFailed:
+        results.put(False)
+
+
+def test_one_process_wins_a_claim(local_storage):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(6)
+    results = context.Queue()
+    processes = [context.Process(target=_claim, args=(str(local_storage), barrier, results)) for _ in range(6)]
+    for process in processes:
+        process.start()
+    claims = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    assert sorted(claims) == [False] * 5 + [True]